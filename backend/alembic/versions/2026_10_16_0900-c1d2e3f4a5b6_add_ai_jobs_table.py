@@ -0,0 +1,51 @@
+"""Add ai_jobs table for durable AI job queue
+
+Revision ID: c1d2e3f4a5b6
+Revises: a69ae931855c
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1d2e3f4a5b6'
+down_revision = 'a69ae931855c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('ai_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_type', sa.String(), nullable=False),
+    sa.Column('disclosure_id', sa.Integer(), nullable=True),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'COMPLETED', 'FAILED', name='aijobstatus'), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('run_after', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('locked_by', sa.String(), nullable=True),
+    sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['disclosure_id'], ['disclosures.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ai_jobs_id'), 'ai_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_ai_jobs_disclosure_id'), 'ai_jobs', ['disclosure_id'], unique=False)
+    op.create_index(op.f('ix_ai_jobs_status'), 'ai_jobs', ['status'], unique=False)
+    # Claim query: WHERE status = 'PENDING' AND run_after <= now() ORDER BY run_after
+    op.create_index('ix_ai_jobs_status_run_after', 'ai_jobs', ['status', 'run_after'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ai_jobs_status_run_after', table_name='ai_jobs')
+    op.drop_index(op.f('ix_ai_jobs_status'), table_name='ai_jobs')
+    op.drop_index(op.f('ix_ai_jobs_disclosure_id'), table_name='ai_jobs')
+    op.drop_index(op.f('ix_ai_jobs_id'), table_name='ai_jobs')
+    op.drop_table('ai_jobs')
+    sa.Enum(name='aijobstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,29 @@
+"""Add content_version and cancellation to ai_jobs
+
+Revision ID: e3f4a5b6c7d8
+Revises: d2e3f4a5b6c7
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3f4a5b6c7d8'
+down_revision = 'd2e3f4a5b6c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TYPE aijobstatus ADD VALUE IF NOT EXISTS 'CANCELLED'")
+    op.add_column('ai_jobs', sa.Column('content_version', sa.Integer(), nullable=True))
+    op.add_column('ai_jobs', sa.Column('cancel_requested', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    op.drop_column('ai_jobs', 'cancel_requested')
+    op.drop_column('ai_jobs', 'content_version')
+    # PostgreSQL cannot drop a single enum value; map it back to FAILED instead
+    op.execute("UPDATE ai_jobs SET status = 'FAILED' WHERE status = 'CANCELLED'")
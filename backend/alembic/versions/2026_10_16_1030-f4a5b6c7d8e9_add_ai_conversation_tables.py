@@ -0,0 +1,53 @@
+"""Add ai_conversations and ai_conversation_messages tables
+
+Revision ID: f4a5b6c7d8e9
+Revises: e3f4a5b6c7d8
+Create Date: 2026-10-16 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a5b6c7d8e9'
+down_revision = 'e3f4a5b6c7d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('ai_conversations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('disclosure_id', sa.Integer(), nullable=True),
+    sa.Column('summary', sa.Text(), nullable=True),
+    sa.Column('summarized_through_id', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['disclosure_id'], ['disclosures.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ai_conversations_id'), 'ai_conversations', ['id'], unique=False)
+    op.create_index('ix_ai_conversations_user_disclosure', 'ai_conversations', ['user_id', 'disclosure_id'], unique=False)
+    op.create_table('ai_conversation_messages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('conversation_id', sa.Integer(), nullable=False),
+    sa.Column('role', sa.String(length=20), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['conversation_id'], ['ai_conversations.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ai_conversation_messages_id'), 'ai_conversation_messages', ['id'], unique=False)
+    op.create_index(op.f('ix_ai_conversation_messages_conversation_id'), 'ai_conversation_messages', ['conversation_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_ai_conversation_messages_conversation_id'), table_name='ai_conversation_messages')
+    op.drop_index(op.f('ix_ai_conversation_messages_id'), table_name='ai_conversation_messages')
+    op.drop_table('ai_conversation_messages')
+    op.drop_index('ix_ai_conversations_user_disclosure', table_name='ai_conversations')
+    op.drop_index(op.f('ix_ai_conversations_id'), table_name='ai_conversations')
+    op.drop_table('ai_conversations')
@@ -0,0 +1,24 @@
+"""Add patent_index column to disclosures
+
+Revision ID: b6c7d8e9f0a1
+Revises: a5b6c7d8e9f0
+Create Date: 2026-10-16 11:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6c7d8e9f0a1'
+down_revision = 'a5b6c7d8e9f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('disclosures', sa.Column('patent_index', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('disclosures', 'patent_index')
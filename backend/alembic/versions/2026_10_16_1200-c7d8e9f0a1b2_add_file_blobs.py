@@ -0,0 +1,37 @@
+"""Add file_blobs table and files.blob_hash
+
+Revision ID: c7d8e9f0a1b2
+Revises: b6c7d8e9f0a1
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d8e9f0a1b2'
+down_revision = 'b6c7d8e9f0a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('file_blobs',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('bucket', sa.String(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+    op.add_column('files', sa.Column('blob_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_files_blob_hash'), 'files', ['blob_hash'], unique=False)
+    op.create_foreign_key('fk_files_blob_hash', 'files', 'file_blobs', ['blob_hash'], ['content_hash'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('fk_files_blob_hash', 'files', type_='foreignkey')
+    op.drop_index(op.f('ix_files_blob_hash'), table_name='files')
+    op.drop_column('files', 'blob_hash')
+    op.drop_table('file_blobs')
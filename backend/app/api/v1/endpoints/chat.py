@@ -1,20 +1,39 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import datetime
 from sqlalchemy.orm import Session
+import asyncio
 import json
-import os
 
+from app.core.config import settings
 from app.services.ai_service import ai_service
+from app.services.context_budget import ContextBudgeter, estimate_tokens
+from app.services.disclosure_context import DisclosureContextSnapshot, disclosure_context_cache
+from app.services.retrieval import retrieval_index
+from app.services.conversations import (
+    add_message,
+    compact_conversation,
+    discard_message,
+    get_conversation,
+    get_or_create_conversation,
+    needs_compaction,
+    recent_messages,
+    save_message,
+)
 from app.core.dependencies import get_current_active_user
 from app.core.database import get_db
 from app.models.user import User, UserRole
 from app.models.disclosure import Disclosure
-from app.models.patent_draft import PatentDraft
-from app.models.file import File
+from app.models.ai_conversation import AIConversationMessage
 
 router = APIRouter()
 
+# Characters of each attachment offered to the budgeter when there is no query
+FILE_EXCERPT_CHARS = 10000
+
 
 class ChatMessage(BaseModel):
     """Chat message model"""
@@ -34,74 +53,191 @@ class ChatResponse(BaseModel):
     response: str
 
 
-def extract_pdf_text(file_path: str) -> str:
-    """Extract text from PDF file using PyMuPDF (fitz)"""
-    try:
-        import fitz  # PyMuPDF
-        doc = fitz.open(file_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        doc.close()
-        return text[:10000]  # Limit to 10k chars to avoid token limits
-    except ImportError:
-        return "[PDF text extraction requires PyMuPDF. Install with: pip install pymupdf]"
-    except Exception as e:
-        return f"[Error extracting PDF: {str(e)}]"
+class ConversationMessageRequest(BaseModel):
+    """A new turn for a server-side conversation (history is stored on the server)"""
+    message: str
+    disclosure_id: Optional[int] = None
+
+
+class ConversationMessageResponse(BaseModel):
+    conversation_id: int
+    response: str
+
+
+class ConversationTurn(BaseModel):
+    role: str
+    content: str
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ConversationHistoryResponse(BaseModel):
+    conversation_id: Optional[int] = None
+    summary: Optional[str] = None
+    messages: List[ConversationTurn] = []
+
+
+def _retrieval_sources(snapshot: DisclosureContextSnapshot, include_content: bool) -> dict:
+    """Indexable sources for a disclosure, with fingerprints so unchanged ones are not re-read"""
+    sources = {}
+
+    if snapshot.draft_text:
+        draft_text = snapshot.draft_text
+        sources["draft"] = (snapshot.draft_fingerprint, lambda: draft_text, "Patent draft")
+
+    if include_content and snapshot.latest_version:
+        version_number, version_text = snapshot.latest_version
+        sources["content"] = (
+            str(version_number),
+            lambda: version_text,
+            f"Disclosure content (version {version_number})",
+        )
+
+    for f in snapshot.files:
+        # Uploaded files never change, so the id is a sufficient fingerprint
+        if f.has_text:
+            sources[f"file:{f.id}"] = (str(f.id), lambda file_id=f.id: snapshot.file_text(file_id), f.filename)
+
+    return sources
 
 
 def build_disclosure_context(
-    disclosure: Disclosure,
-    draft: Optional[PatentDraft],
-    files: List[File],
-    db: Session
+    snapshot: DisclosureContextSnapshot,
+    budget_tokens: Optional[int] = None,
+    query: Optional[str] = None,
 ) -> str:
-    """Build context string from disclosure, draft, and files"""
-    context_parts = []
+    """
+    Build context string from a disclosure's cached snapshot
+
+    Sources are packed into CHAT_CONTEXT_TOKEN_BUDGET tokens (for the chat
+    model) by priority: disclosure content first, then the draft, the file
+    list and finally file excerpts. Only what does not fit is truncated.
+
+    With a query (the latest user message), the draft and file text are not
+    included wholesale; instead the top RETRIEVAL_TOP_K chunks from the
+    disclosure's BM25 index are. Disclosure content too large for a fifth of
+    the budget is retrieved the same way.
+    """
+    budgeter = ContextBudgeter(
+        budget_tokens or settings.CHAT_CONTEXT_TOKEN_BUDGET,
+        model=ai_service.llm.model_for("fast"),
+    )
 
     # Add disclosure info
-    context_parts.append("=== CURRENT DISCLOSURE ===")
-    context_parts.append(f"Title: {disclosure.title}")
-    context_parts.append(f"Status: {disclosure.status.value}")
-    if disclosure.content:
-        context_parts.append(f"Content:\n{json.dumps(disclosure.content, indent=2)}")
-
-    # Add draft info
-    if draft:
-        context_parts.append("\n=== PATENT DRAFT ===")
-
-        # Include full_text if available (this is what the lawyer edits)
-        if draft.full_text:
-            context_parts.append("\n--- FULL DRAFT TEXT ---")
-            # Limit to 15k chars to avoid token limits
-            context_parts.append(draft.full_text[:15000])
-            if len(draft.full_text) > 15000:
-                context_parts.append("... [truncated]")
-
-        # Also include sections if available
-        elif draft.sections:
-            for section_name, section_content in draft.sections.items():
-                context_parts.append(f"\n--- {section_name.upper()} ---")
-                if isinstance(section_content, list):
-                    context_parts.append("\n".join(section_content))
-                else:
-                    context_parts.append(str(section_content))
+    budgeter.add("disclosure", snapshot.header, priority=0)
+    content_text = snapshot.content_text
+    content_fits = estimate_tokens(content_text or "", budgeter.model) <= budgeter.budget_tokens // 5
+    if content_text and (content_fits or not query):
+        budgeter.add("content", content_text, priority=1)
+
+    if query:
+        sources = _retrieval_sources(snapshot, include_content=not content_fits)
+        chunks = retrieval_index.search(snapshot.disclosure_id, sources, query)
+        if chunks:
+            budgeter.add("excerpts_heading", "\n=== RELEVANT EXCERPTS ===", priority=2)
+        for rank, chunk in enumerate(chunks):
+            budgeter.add(f"excerpt:{rank}", f"--- {chunk.label} ---\n{chunk.text}", priority=2 + rank)
+    elif snapshot.draft_text:
+        # Add draft info
+        budgeter.add(
+            "draft",
+            f"\n=== PATENT DRAFT ===\n{snapshot.draft_text}",
+            priority=2,
+            quota=budgeter.budget_tokens * 3 // 5,
+        )
 
     # Add files info
-    if files:
-        context_parts.append("\n=== UPLOADED FILES ===")
-        for f in files:
-            context_parts.append(f"- {f.original_filename} ({f.file_type.value}, {f.file_size} bytes)")
+    if snapshot.files:
+        file_list = ["\n=== UPLOADED FILES ==="]
+        for f in snapshot.files:
+            file_list.append(f"- {f.description}")
+        budgeter.add("files", "\n".join(file_list), priority=1)
+
+        if not query:
+            for f in snapshot.files:
+                # Stored text of PDF/DOCX attachments
+                if f.has_text:
+                    excerpt = snapshot.file_preview(f.id, FILE_EXCERPT_CHARS)
+                    if excerpt:
+                        budgeter.add(
+                            f"file:{f.id}",
+                            f"--- {f.filename} (excerpt) ---\n{excerpt}",
+                            priority=4,
+                            quota=budgeter.budget_tokens // 10,
+                        )
+
+    return budgeter.pack()
+
+
+ASSISTANT_BASE_PROMPT = """You are an expert patent drafting assistant with access to the current disclosure, draft, and uploaded files.
 
-            # Extract PDF content if it's a PDF
-            if f.file_extension.lower() == ".pdf":
-                file_path = os.path.join(os.getcwd(), "uploads", str(f.disclosure_id), f.s3_key)
-                if os.path.exists(file_path):
-                    pdf_text = extract_pdf_text(file_path)
-                    if pdf_text and not pdf_text.startswith("["):
-                        context_parts.append(f"  Content preview: {pdf_text[:2000]}...")
+You help attorneys and inventors with:
+- Answering questions about the current patent draft
+- Explaining technical details from uploaded documents
+- Patent drafting guidance and best practices
+- Legal terminology and claim structure
+- Prior art research suggestions
+- Technical writing improvements
+
+When answering questions:
+1. Reference specific parts of the draft or documents when relevant
+2. Provide clear, professional, and actionable advice
+3. If information is not in the provided context, say so clearly"""
+
+
+async def build_system_prompt(
+    disclosure_id: Optional[int],
+    query: Optional[str],
+    system_prompt: Optional[str],
+    db: Session,
+    current_user: User,
+) -> str:
+    """
+    Build the assistant system prompt, including disclosure context if requested
+
+    Args:
+        disclosure_id: Disclosure to ground the answer in (optional)
+        query: Latest user message, used to retrieve the relevant draft/file chunks
+        system_prompt: Client-supplied prompt, used when there is no disclosure context
+
+    Raises:
+        HTTPException: 403 if the user cannot access the disclosure
+    """
+    # Build context if disclosure_id is provided
+    disclosure_context = ""
+    if disclosure_id:
+        # Get disclosure
+        disclosure = db.query(Disclosure).filter(Disclosure.id == disclosure_id).first()
+        if disclosure:
+            # Check permissions
+            if current_user.role == UserRole.INVENTOR and disclosure.inventor_id != current_user.id:
+                raise HTTPException(status_code=403, detail="Access denied to this disclosure")
+            elif current_user.role == UserRole.LAWYER and disclosure.assigned_lawyer_id != current_user.id:
+                raise HTTPException(status_code=403, detail="Access denied to this disclosure")
+
+            # Build context (snapshot rebuilds, text loading and indexing are blocking, keep them off the event loop)
+            def build():
+                snapshot = disclosure_context_cache.get(db, disclosure)
+                return build_disclosure_context(snapshot, None, query)
+
+            disclosure_context = await run_in_threadpool(build)
+
+    if disclosure_context:
+        return f"{ASSISTANT_BASE_PROMPT}\n\n{disclosure_context}"
+    return system_prompt or ASSISTANT_BASE_PROMPT
+
+
+def latest_user_message(messages: List[ChatMessage]) -> Optional[str]:
+    """Ground the answer in the chunks relevant to the latest user message"""
+    return next((msg.content for msg in reversed(messages) if msg.role == "user"), None)
 
-    return "\n".join(context_parts)
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Events message"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 
 @router.post("/assistant", response_model=ChatResponse)
@@ -120,54 +256,232 @@ async def chat_with_assistant(
         # Convert Pydantic models to dicts for ai_service
         messages_dict = [{"role": msg.role, "content": msg.content} for msg in request.messages]
 
-        # Build context if disclosure_id is provided
-        disclosure_context = ""
-        if request.disclosure_id:
-            # Get disclosure
-            disclosure = db.query(Disclosure).filter(Disclosure.id == request.disclosure_id).first()
-            if disclosure:
-                # Check permissions
-                if current_user.role == UserRole.INVENTOR and disclosure.inventor_id != current_user.id:
-                    raise HTTPException(status_code=403, detail="Access denied to this disclosure")
-                elif current_user.role == UserRole.LAWYER and disclosure.assigned_lawyer_id != current_user.id:
-                    raise HTTPException(status_code=403, detail="Access denied to this disclosure")
+        system_prompt = await build_system_prompt(
+            request.disclosure_id, latest_user_message(request.messages), request.system_prompt, db, current_user
+        )
 
-                # Get draft
-                draft = db.query(PatentDraft).filter(PatentDraft.disclosure_id == request.disclosure_id).first()
+        # Get AI response
+        response_text = await ai_service.chat_async(messages_dict, system_prompt)
 
-                # Get files
-                files = db.query(File).filter(File.disclosure_id == request.disclosure_id).all()
+        return ChatResponse(response=response_text)
 
-                # Build context
-                disclosure_context = build_disclosure_context(disclosure, draft, files, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
-        # Build system prompt with context
-        base_prompt = """You are an expert patent drafting assistant with access to the current disclosure, draft, and uploaded files.
 
-You help attorneys and inventors with:
-- Answering questions about the current patent draft
-- Explaining technical details from uploaded documents
-- Patent drafting guidance and best practices
-- Legal terminology and claim structure
-- Prior art research suggestions
-- Technical writing improvements
+@router.post("/assistant/stream")
+async def chat_with_assistant_stream(
+    request: ChatRequest,
+    http_request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Streaming variant of /assistant using Server-Sent Events
 
-When answering questions:
-1. Reference specific parts of the draft or documents when relevant
-2. Provide clear, professional, and actionable advice
-3. If information is not in the provided context, say so clearly"""
+    Emits `data: {"delta": "..."}` events as tokens arrive, then a final
+    `event: done`. On failure an `event: error` with `{"detail": ...}` is sent.
+    Generation stops as soon as the client disconnects.
+    """
+    messages_dict = [{"role": msg.role, "content": msg.content} for msg in request.messages]
 
-        if disclosure_context:
-            system_prompt = f"{base_prompt}\n\n{disclosure_context}"
-        else:
-            system_prompt = request.system_prompt or base_prompt
+    # Resolve context and permissions before the stream starts so errors map to HTTP status codes
+    try:
+        system_prompt = await build_system_prompt(
+            request.disclosure_id, latest_user_message(request.messages), request.system_prompt, db, current_user
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
-        # Get AI response
-        response_text = ai_service.chat(messages_dict, system_prompt)
+    async def event_stream():
+        deltas = ai_service.chat_stream_async(messages_dict, system_prompt)
+        try:
+            async for delta in deltas:
+                if await http_request.is_disconnected():
+                    break
+                yield sse_event({"delta": delta})
+            else:
+                yield sse_event({}, event="done")
+        except Exception as e:
+            yield sse_event({"detail": f"Chat failed: {str(e)}"}, event="error")
+        finally:
+            # Closes the provider stream if we stopped early
+            await deltas.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Disable proxy buffering so tokens flush immediately
+        },
+    )
+
+
+async def start_conversation_turn(request: ConversationMessageRequest, db: Session, current_user: User):
+    """
+    Store the user's message and assemble the prompt for the reply
 
-        return ChatResponse(response=response_text)
+    The caller must discard the stored message (discard_message) if no reply
+    is stored, so the history keeps alternating user/assistant turns.
+
+    Returns:
+        (conversation, stored user message id, history messages, system prompt)
+    """
+    if not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message is empty")
+
+    # The conversation references the disclosure, so it must exist
+    if request.disclosure_id is not None and not db.query(Disclosure.id).filter(Disclosure.id == request.disclosure_id).first():
+        raise HTTPException(status_code=404, detail="Disclosure not found")
+
+    # Resolves permissions before anything is stored
+    system_prompt = await build_system_prompt(request.disclosure_id, request.message, None, db, current_user)
+
+    conversation = get_or_create_conversation(db, current_user.id, request.disclosure_id)
+    user_message = add_message(db, conversation.id, "user", request.message)
+    if conversation.summary:
+        system_prompt = f"{system_prompt}\n\n=== EARLIER IN THIS CONVERSATION (summary) ===\n{conversation.summary}"
+
+    return conversation, user_message.id, recent_messages(db, conversation), system_prompt
+
+
+async def discard_turn(user_message_id: int):
+    """
+    Remove the user's message of a turn that produced no reply
+
+    Runs in the threadpool, shielded so the delete still completes when the
+    request is being cancelled (client gone).
+    """
+    await asyncio.shield(run_in_threadpool(discard_message, user_message_id))
+
+
+@router.post("/conversation/message", response_model=ConversationMessageResponse)
+async def send_conversation_message(
+    request: ConversationMessageRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Send one message in the user's stored conversation
+
+    Unlike /assistant, only the new message is uploaded; earlier turns are
+    loaded from the server (recent ones verbatim, older ones as a summary).
+    """
+    try:
+        conversation, user_message_id, messages_dict, system_prompt = await start_conversation_turn(request, db, current_user)
+
+        try:
+            response_text = await ai_service.chat_async(messages_dict, system_prompt)
+        except BaseException:
+            # Also on cancellation (client gone)
+            await discard_turn(user_message_id)
+            raise
+        add_message(db, conversation.id, "assistant", response_text)
+
+        if needs_compaction(db, conversation):
+            background_tasks.add_task(compact_conversation, conversation.id)
+
+        return ConversationMessageResponse(conversation_id=conversation.id, response=response_text)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
+
+@router.post("/conversation/message/stream")
+async def send_conversation_message_stream(
+    request: ConversationMessageRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Streaming variant of /conversation/message (same events as /assistant/stream)
+
+    The reply is stored once generation ends; if the client disconnects, the
+    part that was generated is stored. If nothing was generated (error or
+    disconnect before the first token), the user's message is removed again.
+    """
+    try:
+        conversation, user_message_id, messages_dict, system_prompt = await start_conversation_turn(request, db, current_user)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
+
+    conversation_id = conversation.id
+    if needs_compaction(db, conversation):
+        background_tasks.add_task(compact_conversation, conversation_id)
+
+    async def event_stream():
+        deltas = ai_service.chat_stream_async(messages_dict, system_prompt)
+        reply = []
+        try:
+            async for delta in deltas:
+                if await http_request.is_disconnected():
+                    break
+                reply.append(delta)
+                yield sse_event({"delta": delta})
+            else:
+                yield sse_event({"conversation_id": conversation_id}, event="done")
+        except Exception as e:
+            yield sse_event({"detail": f"Chat failed: {str(e)}"}, event="error")
+        finally:
+            await deltas.aclose()
+            # The request's session is closed by now; save with a fresh one
+            if reply:
+                await run_in_threadpool(save_message, conversation_id, "assistant", "".join(reply))
+            else:
+                await discard_turn(user_message_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@router.get("/conversation", response_model=ConversationHistoryResponse)
+def get_conversation_history(
+    disclosure_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Stored conversation for a disclosure (or the general assistant), for display"""
+    conversation = get_conversation(db, current_user.id, disclosure_id)
+    if not conversation:
+        return ConversationHistoryResponse()
+
+    messages = db.query(AIConversationMessage).filter(
+        AIConversationMessage.conversation_id == conversation.id
+    ).order_by(AIConversationMessage.id.asc()).all()
+    return ConversationHistoryResponse(
+        conversation_id=conversation.id,
+        summary=conversation.summary,
+        messages=messages,
+    )
+
+
+@router.delete("/conversation", status_code=204)
+def clear_conversation(
+    disclosure_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Start over: delete the stored conversation"""
+    conversation = get_conversation(db, current_user.id, disclosure_id)
+    if conversation:
+        db.delete(conversation)
+        db.commit()
+    return None
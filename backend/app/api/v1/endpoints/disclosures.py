@@ -16,7 +16,13 @@ from app.schemas import (
     DisclosureVersionResponse,
 )
 from app.services.ai_service import ai_service
-import os
+from app.services.blobs import release_file_content
+from app.services.disclosure_context import disclosure_context_cache
+from app.services.disclosure_diff import affected_sections
+from app.services.document_text import get_file_text
+from app.services.retrieval import retrieval_index
+from app.utils.patent_parser import parse_patent
+from app.tasks.ai_processing import enqueue_disclosure_processing, unfinished_draft_sections
 
 router = APIRouter()
 
@@ -46,7 +52,6 @@ def list_disclosures(
 @router.post("/", response_model=DisclosureResponse, status_code=status.HTTP_201_CREATED)
 def create_disclosure(
     disclosure_data: DisclosureCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(RoleChecker([UserRole.INVENTOR, UserRole.ADMIN])),
 ):
@@ -55,7 +60,7 @@ def create_disclosure(
 
     Only INVENTOR and ADMIN can create disclosures.
     Optionally assign a lawyer upon creation.
-    Triggers AI processing in the background.
+    Queues AI processing for the worker pool.
     """
     # Verify lawyer exists if assigned
     if disclosure_data.assigned_lawyer_id:
@@ -96,10 +101,9 @@ def create_disclosure(
     db.add(initial_version)
     db.commit()
 
-    # Trigger AI processing if disclosure has content
+    # Queue AI processing if disclosure has content
     if disclosure_data.content:
-        from app.tasks.ai_processing import process_disclosure_async
-        background_tasks.add_task(process_disclosure_async, new_disclosure.id, db)
+        enqueue_disclosure_processing(db, new_disclosure.id, content_version=1, debounce=False)
 
     return new_disclosure
 
@@ -136,7 +140,6 @@ def get_disclosure(
 def update_disclosure(
     disclosure_id: int,
     update_data: DisclosureUpdate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ):
@@ -144,7 +147,8 @@ def update_disclosure(
     Update disclosure content
 
     Only the inventor (or admin) can edit disclosure content.
-    Creates a new version on update.
+    Creates a new version on update and regenerates only the draft
+    sections affected by the changed content fields.
     """
     disclosure = db.query(Disclosure).filter(Disclosure.id == disclosure_id).first()
 
@@ -158,14 +162,21 @@ def update_disclosure(
     # Update fields
     if update_data.title is not None:
         disclosure.title = update_data.title
-    if update_data.content is not None:
-        disclosure.content = update_data.content
 
-        # Create new version
+    sections_to_regenerate = []
+    new_version_number = None
+    if update_data.content is not None:
         latest_version = db.query(DisclosureVersion).filter(
             DisclosureVersion.disclosure_id == disclosure_id
         ).order_by(DisclosureVersion.version_number.desc()).first()
 
+        # Only the draft sections fed by changed fields need regenerating
+        previous_content = latest_version.content_snapshot if latest_version else disclosure.content
+        sections_to_regenerate = affected_sections(previous_content, update_data.content)
+
+        disclosure.content = update_data.content
+
+        # Create new version
         new_version_number = (latest_version.version_number + 1) if latest_version else 1
 
         new_version = DisclosureVersion(
@@ -178,11 +189,18 @@ def update_disclosure(
 
     db.commit()
     db.refresh(disclosure)
-
-    # Re-trigger AI processing if content changed significantly
-    if update_data.content and disclosure.status != DisclosureStatus.APPROVED:
-        from app.tasks.ai_processing import process_disclosure_async
-        background_tasks.add_task(process_disclosure_async, disclosure.id, db)
+    disclosure_context_cache.invalidate(disclosure.id)
+
+    # Re-queue AI processing for the affected sections only (plus any an
+    # earlier failed or cancelled job left stale; enqueue folds those in)
+    if (
+        new_version_number is not None
+        and disclosure.status != DisclosureStatus.APPROVED
+        and (sections_to_regenerate or unfinished_draft_sections(db, disclosure.id) != [])
+    ):
+        enqueue_disclosure_processing(
+            db, disclosure.id, sections=sections_to_regenerate, content_version=new_version_number
+        )
 
     return disclosure
 
@@ -207,6 +225,7 @@ def update_disclosure_status(
     disclosure.status = status_update.status
     db.commit()
     db.refresh(disclosure)
+    disclosure_context_cache.invalidate(disclosure.id)
 
     return disclosure
 
@@ -237,6 +256,7 @@ def assign_lawyer(
     disclosure.status = DisclosureStatus.IN_REVIEW
     db.commit()
     db.refresh(disclosure)
+    disclosure_context_cache.invalidate(disclosure.id)
 
     return disclosure
 
@@ -284,8 +304,15 @@ def delete_disclosure(
     if not disclosure:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Disclosure not found")
 
+    # Files are deleted with the disclosure; release their stored content afterwards
+    files = list(disclosure.files)
     db.delete(disclosure)
+    db.flush()
+    for f in files:
+        release_file_content(db, f)
     db.commit()
+    disclosure_context_cache.drop(disclosure_id)
+    retrieval_index.drop(disclosure_id)
 
     return None
 
@@ -317,6 +344,7 @@ def set_patent_file(
     disclosure.patent_file_id = file_id
     db.commit()
     db.refresh(disclosure)
+    disclosure_context_cache.invalidate(disclosure.id)
 
     return disclosure
 
@@ -364,30 +392,28 @@ def analyze_patent(
     if not patent_file:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patent file not found")
 
-    # Extract text from PDF
-    file_path = os.path.join(os.getcwd(), "uploads", str(disclosure_id), patent_file.s3_key)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patent file not found on server")
-
+    # Text is stored at upload by the ingestion job (extracted now if it has not run yet)
     try:
-        import fitz  # PyMuPDF
-        doc = fitz.open(file_path)
-        patent_text = ""
-        for page in doc:
-            patent_text += page.get_text()
-        doc.close()
+        patent_text = get_file_text(db, patent_file)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to extract text from PDF: {str(e)}"
         )
+    if patent_text is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patent file not found on server")
+
+    # Index sections and claims locally; the analysis only gets the sections it needs
+    patent_index = parse_patent(patent_text)
+    disclosure.patent_index = patent_index
 
     # Run AI analysis
     try:
-        analysis_result = ai_service.analyze_patent(patent_text, disclosure.patent_number)
+        analysis_result = ai_service.analyze_patent(patent_text, disclosure.patent_number, patent_index=patent_index)
         disclosure.ai_analysis = analysis_result
         db.commit()
         db.refresh(disclosure)
+        disclosure_context_cache.invalidate(disclosure.id)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -5,6 +5,7 @@ from app.core.dependencies import get_current_active_user, RoleChecker
 from app.models.user import User, UserRole
 from app.models.disclosure import Disclosure, DisclosureStatus
 from app.models.patent_draft import PatentDraft, AIProcessingStatus
+from app.services.disclosure_context import disclosure_context_cache
 from app.schemas import PatentDraftResponse, DraftSectionUpdate, DraftFullTextUpdate, DraftApproval, RevisionRequest
 
 router = APIRouter()
@@ -45,6 +46,7 @@ def get_patent_draft(
         db.add(draft)
         db.commit()
         db.refresh(draft)
+        disclosure_context_cache.invalidate(disclosure_id)
 
     return draft
 
@@ -70,14 +72,14 @@ def update_draft_section(
     if current_user.role == UserRole.LAWYER and disclosure.assigned_lawyer_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not assigned to this disclosure")
 
-    # Update the section
-    if not isinstance(draft.sections, dict):
-        draft.sections = {}
-
-    draft.sections[section_update.section_name] = section_update.content
+    # Update the section (assign a new dict: in-place changes to a JSON column are not detected)
+    sections = dict(draft.sections) if isinstance(draft.sections, dict) else {}
+    sections[section_update.section_name] = section_update.content
+    draft.sections = sections
 
     db.commit()
     db.refresh(draft)
+    disclosure_context_cache.invalidate(draft.disclosure_id)
 
     return draft
 
@@ -108,6 +110,7 @@ def update_draft_full_text(
 
     db.commit()
     db.refresh(draft)
+    disclosure_context_cache.invalidate(draft.disclosure_id)
 
     return draft
 
@@ -131,6 +134,7 @@ def approve_draft(
 
     disclosure.status = DisclosureStatus.APPROVED
     db.commit()
+    disclosure_context_cache.invalidate(disclosure_id)
 
     # TODO: Send notification to inventor
 
@@ -156,6 +160,7 @@ def request_revision(
 
     disclosure.status = DisclosureStatus.REVISION_REQUESTED
     db.commit()
+    disclosure_context_cache.invalidate(disclosure_id)
 
     # TODO: Create comment with revision feedback
     # TODO: Send notification to inventor
@@ -1,18 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File as FastAPIFile
+from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, File as FastAPIFile
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import timedelta
+from urllib.parse import quote
 import os
+import time
 import uuid
 from app.core.database import get_db
 from app.core.dependencies import get_current_active_user
 from app.core.config import settings
+from app.core.security import create_preview_token, create_upload_token, decode_token
 from app.models.user import User, UserRole
 from app.models.disclosure import Disclosure
 from app.models.file import File, FileType
-from app.schemas import FileResponse
+from app.schemas import FileResponse, DirectUploadRequest, DirectUploadComplete, DirectUploadResponse, PreviewUrlResponse
+from app.services.disclosure_context import disclosure_context_cache
+from app.services.blobs import adopt_upload, release_file_content
+from app.services.storage import Storage, file_key, file_key_is_final, get_storage, object_key, storage_for, storage_for_bucket
+from app.services.uploads import UploadTooLarge, save_upload
+from app.tasks.ingestion import enqueue_file_ingestion
+from app.utils.http_ranges import RangeNotSatisfiable, etag_matches, make_etag, parse_range
 
 router = APIRouter()
 
+# Stored files are never modified (a new upload gets a new key), so clients may cache them indefinitely
+FILE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
 
 def get_file_type(extension: str) -> FileType:
     """Determine file type from extension"""
@@ -27,6 +41,79 @@ def get_file_type(extension: str) -> FileType:
         return FileType.IMAGE  # Default
 
 
+def _content_disposition(disposition: str, filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f"{disposition}; filename=\"{filename}\""
+
+
+def _preview_media_type(extension: str) -> str:
+    return "application/pdf" if extension.lower() == ".pdf" else "application/octet-stream"
+
+
+def _stored_file_response(
+    request: Request,
+    storage: Storage,
+    key: str,
+    filename: str,
+    content_hash: Optional[str],
+    media_type: str,
+    disposition: str,
+):
+    """
+    Send a stored file: from disk for local storage, streamed from the bucket for S3
+
+    Stored files never change, so they carry a strong ETag (the content hash)
+    and a long-lived Cache-Control. Supports If-None-Match (304) and single
+    byte ranges (206), so PDF viewers can load large files page by page.
+    With X_ACCEL_REDIRECT_PREFIX set, local files are handed to nginx instead.
+    """
+    from fastapi.responses import FileResponse, Response, StreamingResponse
+    try:
+        size = storage.size(key)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found on server")
+
+    etag = make_etag(content_hash)
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": FILE_CACHE_CONTROL}
+    if etag:
+        headers["ETag"] = etag
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    headers["Content-Disposition"] = _content_disposition(disposition, filename)
+    path = storage.local_path(key)
+    if path and settings.X_ACCEL_REDIRECT_PREFIX:
+        # nginx sends the file itself (sendfile, ranges included)
+        headers["X-Accel-Redirect"] = settings.X_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(key)
+        return Response(media_type=media_type, headers=headers)
+
+    try:
+        byte_range = parse_range(request.headers.get("range"), size, request.headers.get("if-range"), etag)
+    except RangeNotSatisfiable:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}", "Accept-Ranges": "bytes"},
+        )
+
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        headers["Content-Length"] = str(end - start)
+        return StreamingResponse(
+            storage.iter_bytes(key, start, end),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type=media_type,
+            headers=headers,
+        )
+
+    if path:
+        return FileResponse(path=path, media_type=media_type, headers=headers)
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(storage.iter_bytes(key), media_type=media_type, headers=headers)
+
+
 @router.post("/upload/{disclosure_id}", response_model=FileResponse, status_code=status.HTTP_201_CREATED)
 async def upload_file(
     disclosure_id: int,
@@ -37,7 +124,7 @@ async def upload_file(
     """
     Upload a file to a disclosure
 
-    For MVP, files are stored locally. In production, use S3.
+    Stored in the STORAGE_BACKEND (local disk or S3).
     """
     # Check disclosure exists and user has access
     disclosure = db.query(Disclosure).filter(Disclosure.id == disclosure_id).first()
@@ -56,41 +143,181 @@ async def upload_file(
             detail=f"File type not allowed. Allowed: {settings.ALLOWED_FILE_EXTENSIONS}"
         )
 
+    # Generate unique filename
+    unique_filename = f"{uuid.uuid4()}{file_extension}"
+
+    # Stream to storage in chunks, validating file size as it arrives
+    storage = get_storage()
+    staging_key = f"incoming/{unique_filename}"
+    writer = await run_in_threadpool(storage.open_writer, staging_key)
+    try:
+        saved = await save_upload(file, writer, settings.max_file_size_bytes)
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File too large. Max size: {settings.MAX_FILE_SIZE_MB}MB"
+        )
+
+    def store() -> File:
+        # Store the content once: identical files share one blob
+        try:
+            blob = adopt_upload(db, storage, staging_key, saved.content_hash, saved.size)
+
+            # Create file record
+            file_type = get_file_type(file_extension)
+            new_file = File(
+                disclosure_id=disclosure_id,
+                file_type=file_type,
+                original_filename=file.filename,
+                file_extension=file_extension,
+                file_size=saved.size,
+                s3_key=unique_filename,
+                s3_bucket=blob.bucket,
+                content_hash=saved.content_hash,
+                blob_hash=blob.content_hash,
+            )
+
+            db.add(new_file)
+            # Committing also removes the staged upload from storage (see app.services.blobs)
+            db.commit()
+        except BaseException:
+            # Nothing references the staged upload now (a blob copy is reused by the next upload of the same bytes)
+            db.rollback()
+            storage.delete(staging_key)
+            raise
+
+        db.refresh(new_file)
+        disclosure_context_cache.invalidate(disclosure_id)
+
+        # Extract text once in the background; readers use the stored text
+        enqueue_file_ingestion(db, new_file)
+        return new_file
+
+    # Database and storage calls block, so keep them off the event loop
+    return await run_in_threadpool(store)
+
+
+@router.post("/upload-url/{disclosure_id}", response_model=DirectUploadResponse)
+def create_upload_url(
+    disclosure_id: int,
+    upload: DirectUploadRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Get a presigned POST for uploading a file straight to storage
+
+    The browser sends the file to upload_url with the returned fields, then calls
+    /files/upload-complete with upload_token. Returns 501 when storage does not
+    accept direct uploads (local storage); use /files/upload/{disclosure_id} instead.
+    """
+    disclosure = db.query(Disclosure).filter(Disclosure.id == disclosure_id).first()
+    if not disclosure:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Disclosure not found")
+
+    # Only inventor or admin can upload files
+    if current_user.role == UserRole.INVENTOR and disclosure.inventor_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+
+    # Validate file extension
+    file_extension = os.path.splitext(upload.filename)[1]
+    if file_extension not in settings.allowed_extensions_list:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File type not allowed. Allowed: {settings.ALLOWED_FILE_EXTENSIONS}"
+        )
+
     # Validate file size
-    file_content = await file.read()
-    file_size = len(file_content)
-    if file_size > settings.max_file_size_bytes:
+    if upload.file_size > settings.max_file_size_bytes:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"File too large. Max size: {settings.MAX_FILE_SIZE_MB}MB"
         )
 
-    # Generate unique filename
+    storage = get_storage()
     unique_filename = f"{uuid.uuid4()}{file_extension}"
+    expires_in = settings.DIRECT_UPLOAD_EXPIRE_SECONDS
+    presigned = storage.presigned_post(
+        object_key(disclosure_id, unique_filename), upload.content_type, upload.file_size, expires_in,
+    )
+    if presigned is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Direct uploads are not available with this storage backend"
+        )
+
+    upload_token = create_upload_token(
+        {
+            "sub": str(current_user.id),
+            "disclosure_id": disclosure_id,
+            "s3_key": unique_filename,
+            "s3_bucket": storage.bucket,
+            "filename": upload.filename,
+            "file_size": upload.file_size,
+        },
+        timedelta(seconds=expires_in),
+    )
+    return DirectUploadResponse(
+        upload_url=presigned["url"],
+        fields=presigned["fields"],
+        upload_token=upload_token,
+        expires_in=expires_in,
+    )
+
 
-    # For MVP: Save locally (in production, upload to S3)
-    upload_dir = os.path.join(os.getcwd(), "uploads", str(disclosure_id))
-    os.makedirs(upload_dir, exist_ok=True)
+@router.post("/upload-complete", response_model=FileResponse, status_code=status.HTTP_201_CREATED)
+def complete_direct_upload(
+    completion: DirectUploadComplete,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Register a file uploaded with /files/upload-url and start its ingestion
+
+    Calling this again for the same upload returns the already registered file.
+    """
+    payload = decode_token(completion.upload_token)
+    if not payload or payload.get("type") != "upload" or payload.get("sub") != str(current_user.id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired upload token")
+
+    disclosure_id = payload["disclosure_id"]
+    disclosure = db.query(Disclosure).filter(Disclosure.id == disclosure_id).first()
+    if not disclosure:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Disclosure not found")
+    if current_user.role == UserRole.INVENTOR and disclosure.inventor_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
-    file_path = os.path.join(upload_dir, unique_filename)
-    with open(file_path, "wb") as f:
-        f.write(file_content)
+    existing = db.query(File).filter(
+        File.disclosure_id == disclosure_id, File.s3_key == payload["s3_key"]
+    ).first()
+    if existing:
+        return existing
 
-    # Create file record
-    file_type = get_file_type(file_extension)
     new_file = File(
         disclosure_id=disclosure_id,
-        file_type=file_type,
-        original_filename=file.filename,
-        file_extension=file_extension,
-        file_size=file_size,
-        s3_key=unique_filename,  # For MVP, just the filename
-        s3_bucket="local",  # Placeholder
+        file_type=get_file_type(os.path.splitext(payload["filename"])[1]),
+        original_filename=payload["filename"],
+        file_extension=os.path.splitext(payload["filename"])[1],
+        file_size=payload["file_size"],
+        s3_key=payload["s3_key"],
+        s3_bucket=payload["s3_bucket"],
     )
+    # The presigned POST pins the size, but check the object actually arrived
+    storage = storage_for(new_file)
+    key = file_key(new_file)
+    if not storage.exists(key):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload not found in storage")
+    if storage.size(key) != new_file.file_size:
+        storage.delete(key)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Uploaded file size does not match")
 
     db.add(new_file)
     db.commit()
     db.refresh(new_file)
+    disclosure_context_cache.invalidate(disclosure_id)
+
+    # Hash and extract text in the background (the bytes never passed through the API)
+    enqueue_file_ingestion(db, new_file)
 
     return new_file
 
@@ -122,13 +349,12 @@ def get_disclosure_files(
 @router.get("/{file_id}/download")
 def download_file(
     file_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ):
     """
     Download a file
-
-    For MVP, returns local file path. In production, return S3 signed URL.
     """
     file_record = db.query(File).filter(File.id == file_id).first()
     if not file_record:
@@ -141,17 +367,9 @@ def download_file(
     elif current_user.role == UserRole.LAWYER and disclosure.assigned_lawyer_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
-    # For MVP: Return file from local storage
-    from fastapi.responses import FileResponse
-    file_path = os.path.join(os.getcwd(), "uploads", str(file_record.disclosure_id), file_record.s3_key)
-
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found on server")
-
-    return FileResponse(
-        path=file_path,
-        filename=file_record.original_filename,
-        media_type="application/octet-stream"
+    return _stored_file_response(
+        request, storage_for(file_record), file_key(file_record), file_record.original_filename,
+        file_record.content_hash, "application/octet-stream", "attachment",
     )
 
 
@@ -173,14 +391,12 @@ def delete_file(
     if current_user.role not in [UserRole.ADMIN] and disclosure.inventor_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
-    # Delete file from storage
-    file_path = os.path.join(os.getcwd(), "uploads", str(file_record.disclosure_id), file_record.s3_key)
-    if os.path.exists(file_path):
-        os.remove(file_path)
-
-    # Delete database record
+    # Delete database record, then its stored content (shared blobs only when no other file uses them)
     db.delete(file_record)
+    db.flush()
+    release_file_content(db, file_record)
     db.commit()
+    disclosure_context_cache.invalidate(file_record.disclosure_id)
 
     return None
 
@@ -188,32 +404,98 @@ def delete_file(
 @router.get("/{file_id}/preview")
 def preview_file(
     file_id: int,
+    request: Request,
     db: Session = Depends(get_db),
-    # Note: No auth for now to allow iframe embedding
-    # In production, use signed URLs or session-based auth
+    current_user: User = Depends(get_current_active_user),
 ):
     """
-    Preview a PDF file inline (for embedding in iframe)
+    Preview a file inline
+
+    For iframes (which cannot send the Authorization header) use /files/{file_id}/preview-url.
     """
     file_record = db.query(File).filter(File.id == file_id).first()
     if not file_record:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
 
-    # For MVP: Return file from local storage
-    from fastapi.responses import FileResponse
-    file_path = os.path.join(os.getcwd(), "uploads", str(file_record.disclosure_id), file_record.s3_key)
+    # Check permissions
+    disclosure = db.query(Disclosure).filter(Disclosure.id == file_record.disclosure_id).first()
+    if current_user.role == UserRole.INVENTOR and disclosure.inventor_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+    elif current_user.role == UserRole.LAWYER and disclosure.assigned_lawyer_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found on server")
+    return _stored_file_response(
+        request, storage_for(file_record), file_key(file_record), file_record.original_filename,
+        file_record.content_hash, _preview_media_type(file_record.file_extension), "inline",
+    )
 
-    # Determine media type
-    media_type = "application/pdf" if file_record.file_extension.lower() == ".pdf" else "application/octet-stream"
 
-    return FileResponse(
-        path=file_path,
-        filename=file_record.original_filename,
-        media_type=media_type,
-        headers={
-            "Content-Disposition": f"inline; filename=\"{file_record.original_filename}\""
-        }
+@router.get("/{file_id}/preview-url", response_model=PreviewUrlResponse)
+def get_preview_url(
+    file_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Get a signed, expiring link for previewing a file inline (e.g. in an iframe)
+
+    The link carries everything needed to serve the file, so opening it needs
+    neither authentication nor a database lookup. Until a direct upload has
+    been hashed and stored as its blob this returns 409 (retry shortly).
+    """
+    file_record = db.query(File).filter(File.id == file_id).first()
+    if not file_record:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
+    # Check permissions
+    disclosure = db.query(Disclosure).filter(Disclosure.id == file_record.disclosure_id).first()
+    if current_user.role == UserRole.INVENTOR and disclosure.inventor_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+    elif current_user.role == UserRole.LAWYER and disclosure.assigned_lawyer_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+
+    # The link pins the storage key, so wait until a direct upload has its final one
+    if not file_key_is_final(file_record):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="File is still being processed",
+            headers={"Retry-After": "2"},
+        )
+
+    expires_in = settings.PREVIEW_URL_EXPIRE_SECONDS
+    token = create_preview_token(
+        {
+            "bucket": file_record.s3_bucket,
+            "key": file_key(file_record),
+            "filename": file_record.original_filename,
+            "media_type": _preview_media_type(file_record.file_extension),
+            "content_hash": file_record.content_hash,
+        },
+        timedelta(seconds=expires_in),
+    )
+    return PreviewUrlResponse(path=f"/files/signed/{token}", expires_in=expires_in)
+
+
+@router.get("/signed/{token}")
+def serve_signed_file(token: str, request: Request):
+    """
+    Serve a file from a link made by /files/{file_id}/preview-url (no auth, no database)
+
+    S3 files redirect to a presigned GET valid for the rest of the link's lifetime.
+    """
+    payload = decode_token(token)
+    if not payload or payload.get("type") != "preview":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired link")
+
+    storage = storage_for_bucket(payload["bucket"])
+    disposition = _content_disposition("inline", payload["filename"])
+    expires_in = max(int(payload["exp"] - time.time()), 1)
+    url = storage.presigned_get(payload["key"], expires_in, payload["media_type"], disposition)
+    if url:
+        from fastapi.responses import RedirectResponse
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+    return _stored_file_response(
+        request, storage, payload["key"], payload["filename"],
+        payload.get("content_hash"), payload["media_type"], "inline",
     )
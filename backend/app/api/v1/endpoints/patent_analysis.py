@@ -1,39 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File as FastAPIFile
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-import os
-import uuid
-import pdfplumber
 from typing import Dict, Any
 from app.core.database import get_db
 from app.core.dependencies import get_current_active_user
 from app.models.user import User
 from app.services.ai_service import ai_service
+from app.services.document_text import compute_content_hash, extract_pdf_preview, get_document_text, read_document_text
+from app.utils.patent_parser import parse_patent
 
 router = APIRouter()
 
+# Characters from the start of the patent used for /quick-summary
+QUICK_SUMMARY_CHARS = 5000
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """
-    Extract text from PDF file using pdfplumber
-
-    Args:
-        pdf_path: Path to the PDF file
-
-    Returns:
-        Extracted text as string
-    """
-    text_content = []
-
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    text_content.append(text)
-
-        return "\n\n".join(text_content)
-    except Exception as e:
-        raise Exception(f"Failed to extract text from PDF: {str(e)}")
+MAX_PATENT_SIZE_BYTES = 50 * 1024 * 1024
 
 
 @router.post("/analyze", status_code=status.HTTP_200_OK)
@@ -62,76 +43,64 @@ async def analyze_patent_pdf(
             detail="Only PDF files are supported"
         )
 
-    # Read file content
+    # Check file size before reading (limit to 50MB for patents)
+    if file.size is not None and file.size > MAX_PATENT_SIZE_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File too large. Maximum size is 50MB"
+        )
+
+    # Read file content (parsed from memory, never written to disk)
     file_content = await file.read()
     file_size = len(file_content)
-
-    # Check file size (limit to 50MB for patents)
-    if file_size > 50 * 1024 * 1024:
+    if file_size > MAX_PATENT_SIZE_BYTES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="File too large. Maximum size is 50MB"
         )
 
-    # Save file temporarily
-    temp_dir = os.path.join(os.getcwd(), "temp_uploads")
-    os.makedirs(temp_dir, exist_ok=True)
-
-    temp_filename = f"{uuid.uuid4()}.pdf"
-    temp_path = os.path.join(temp_dir, temp_filename)
-
+    # Extract text from PDF (reuses the stored text if it was uploaded as an attachment; nothing is stored)
     try:
-        # Write file to disk
-        with open(temp_path, "wb") as f:
-            f.write(file_content)
-
-        # Extract text from PDF
-        try:
-            patent_text = extract_text_from_pdf(temp_path)
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to extract text from PDF: {str(e)}"
-            )
-
-        if not patent_text or len(patent_text.strip()) < 100:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Could not extract sufficient text from PDF. Please ensure the PDF contains readable text."
-            )
+        patent_text = await run_in_threadpool(read_document_text, db, file_content, ".pdf")
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to extract text from PDF: {str(e)}"
+        )
 
-        # Analyze patent using AI
-        try:
-            analysis = ai_service.analyze_patent(patent_text, patent_number)
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"AI analysis failed: {str(e)}"
-            )
+    if not patent_text or len(patent_text.strip()) < 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Could not extract sufficient text from PDF. Please ensure the PDF contains readable text."
+        )
 
-        # Add metadata
-        result = {
-            "filename": file.filename,
-            "patent_number": patent_number,
-            "file_size": file_size,
-            "extracted_text_length": len(patent_text),
-            "analysis": analysis,
-        }
+    # Analyze patent using AI
+    try:
+        analysis = await ai_service.analyze_patent_async(
+            patent_text, patent_number, patent_index=parse_patent(patent_text)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"AI analysis failed: {str(e)}"
+        )
 
-        return result
+    # Add metadata
+    result = {
+        "filename": file.filename,
+        "patent_number": patent_number,
+        "file_size": file_size,
+        "extracted_text_length": len(patent_text),
+        "analysis": analysis,
+    }
 
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except Exception:
-                pass  # Ignore cleanup errors
+    return result
 
 
 @router.post("/quick-summary", status_code=status.HTTP_200_OK)
 async def quick_patent_summary(
     file: UploadFile = FastAPIFile(...),
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ) -> Dict[str, str]:
     """
@@ -151,51 +120,41 @@ async def quick_patent_summary(
             detail="Only PDF files are supported"
         )
 
-    # Read file content
-    file_content = await file.read()
-
-    # Save file temporarily
-    temp_dir = os.path.join(os.getcwd(), "temp_uploads")
-    os.makedirs(temp_dir, exist_ok=True)
-
-    temp_filename = f"{uuid.uuid4()}.pdf"
-    temp_path = os.path.join(temp_dir, temp_filename)
-
-    try:
-        # Write file to disk
-        with open(temp_path, "wb") as f:
-            f.write(file_content)
-
-        # Extract text from PDF (first 5 pages only for speed)
-        patent_text = []
-        with pdfplumber.open(temp_path) as pdf:
-            for i, page in enumerate(pdf.pages[:5]):  # Only first 5 pages
-                text = page.extract_text()
-                if text:
-                    patent_text.append(text)
+    if file.size is not None and file.size > MAX_PATENT_SIZE_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File too large. Maximum size is 50MB"
+        )
 
-        text_content = "\n\n".join(patent_text)
+    # Read file content (parsed from memory, never written to disk)
+    file_content = await file.read()
 
-        if not text_content or len(text_content.strip()) < 100:
+    # Only the beginning is summarized: use stored text if this PDF was seen before,
+    # otherwise parse pages until QUICK_SUMMARY_CHARS are collected
+    document = await run_in_threadpool(get_document_text, db, compute_content_hash(file_content))
+    if document:
+        text_content = document.text[:QUICK_SUMMARY_CHARS]
+    else:
+        try:
+            text_content = await run_in_threadpool(extract_pdf_preview, file_content, QUICK_SUMMARY_CHARS)
+        except Exception as e:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Could not extract text from PDF"
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to extract text from PDF: {str(e)}"
             )
 
-        # Generate quick summary
-        summary = ai_service.summarize_video_transcript(
-            f"Patent Document:\n\n{text_content[:5000]}"
+    if not text_content or len(text_content.strip()) < 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Could not extract text from PDF"
         )
 
-        return {
-            "filename": file.filename,
-            "summary": summary,
-        }
-
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except Exception:
-                pass
+    # Generate quick summary
+    summary = await ai_service.summarize_video_transcript_async(
+        f"Patent Document:\n\n{text_content}"
+    )
+
+    return {
+        "filename": file.filename,
+        "summary": summary,
+    }
@@ -27,9 +27,73 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: Optional[str] = None
     ANTHROPIC_API_KEY: Optional[str] = None
     GEMINI_API_KEY: Optional[str] = None
-    PRIMARY_LLM_PROVIDER: str = "openai"  # openai, anthropic, or gemini
+    PRIMARY_LLM_PROVIDER: str = "openai"  # openai, anthropic, gemini, or fake (offline)
+    LLM_PROVIDERS: str = ""  # Comma-separated providers to route between; empty = every provider with an API key
+    LLM_ROUTER_WINDOW: int = 50  # Recent calls per provider used for latency percentiles and error rate
+    LLM_ROUTER_MIN_SAMPLES: int = 5  # Providers with fewer samples are tried first so they get measured
+    LLM_ROUTER_MAX_ERROR_RATE: float = 0.5  # Above this a provider is taken out of rotation
+    LLM_ROUTER_MAX_CONSECUTIVE_ERRORS: int = 3
+    LLM_ROUTER_COOLDOWN_SECONDS: float = 30.0  # How long an unhealthy provider is skipped
+    LLM_HEDGE_CHAT: bool = True  # Fire a backup chat request on the next provider if the first is slow
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 2.0  # Hedge after max(this, p95 latency of the first provider)
+    LLM_MAX_CONCURRENCY_PER_PROVIDER: int = 32  # In-flight calls per provider (per process)
+    LLM_MAX_CONCURRENCY_PER_MODEL: int = 16  # In-flight calls per provider model; halved on 429, regrown on success
+    LLM_REQUESTS_PER_MINUTE: int = 500  # Request budget per provider model
+    LLM_TOKENS_PER_MINUTE: int = 200000  # Token budget per provider model (prompt estimate + max_tokens)
+    LLM_RATE_LIMIT_MAX_RETRIES: int = 5  # 429s retried after Retry-After / backoff before failing over
+    LLM_RATE_LIMIT_MAX_BACKOFF_SECONDS: float = 60.0
+    LLM_FAKE_LATENCY_SECONDS: float = 0.0
+    LLM_FAKE_ERROR_RATE: float = 0.0
+    LLM_REQUEST_TIMEOUT_SECONDS: float = 120.0
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    LLM_MAX_CONNECTIONS: int = 100  # Shared HTTP connection pool per provider client
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+
+    # Chat assistant
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 6000  # Tokens of disclosure/draft/file context packed into each chat prompt
+    CHAT_COMPACT_AFTER_MESSAGES: int = 16  # Stored turns sent verbatim before older ones are summarized
+    CHAT_KEEP_RECENT_MESSAGES: int = 6  # Turns kept verbatim when the rest is folded into the summary
+    RETRIEVAL_TOP_K: int = 8  # Draft/file chunks retrieved per chat turn
+    RETRIEVAL_CHUNK_CHARS: int = 1500
+    RETRIEVAL_MAX_INDEXES: int = 200  # Per-disclosure indexes kept in memory (least recently used dropped)
+    CHAT_CONTEXT_CACHE_SIZE: int = 200  # Disclosure context snapshots kept in memory
+
+    # Patent Analysis (map-reduce over the full document)
+    PATENT_ANALYSIS_CHUNK_CHARS: int = 12000  # Documents longer than this are analyzed chunk by chunk
+    PATENT_ANALYSIS_MAX_PARALLEL: int = 4  # Chunks analyzed concurrently per document
+
+    # PDF Extraction (process pool, see app.services.pdf_extraction)
+    PDF_EXTRACTION_BACKENDS: str = "pymupdf,pdfplumber"  # Tried in order per page range
+    PDF_EXTRACTION_PROCESSES: int = 0  # Pool size; 0 = one per CPU core
+    PDF_EXTRACTION_PAGES_PER_TASK: int = 16
+    PDF_EXTRACTION_TIMEOUT_SECONDS: float = 120.0  # Per document
+
+    # LLM Response Cache (drafting and patent analysis)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    LLM_CACHE_MAX_ENTRIES: int = 5000
+    LLM_CACHE_MAX_MB: int = 200
+
+    # AI Job Queue
+    AI_WORKER_IN_PROCESS: bool = True  # Run a worker inside the API process (disable when running app.tasks.worker)
+    AI_WORKER_CONCURRENCY: int = 4  # Max jobs executed at once per worker process
+    AI_WORKER_POLL_INTERVAL_SECONDS: float = 2.0
+    AI_WORKER_SHUTDOWN_TIMEOUT_SECONDS: float = 10.0  # How long shutdown waits for running jobs to be cancelled
+    AI_JOB_MAX_ATTEMPTS: int = 3
+    AI_JOB_HEARTBEAT_SECONDS: int = 30
+    AI_JOB_STALE_AFTER_SECONDS: int = 300  # RUNNING jobs without a heartbeat for this long are requeued
+    AI_JOB_RECOVERY_INTERVAL_SECONDS: int = 120  # How often each worker scans for jobs from dead workers
+    AI_DRAFT_PARALLEL_SECTIONS: bool = True  # Generate draft sections as concurrent LLM calls
+    AI_REPROCESS_DEBOUNCE_SECONDS: float = 20.0  # Edits within this window are merged into one draft job
+    AI_JOB_CANCEL_POLL_SECONDS: float = 2.0  # How often running jobs check whether they were superseded
 
     # File Storage
+    STORAGE_BACKEND: str = "local"  # local or s3 (where new uploads go)
+    LOCAL_STORAGE_DIR: str = "uploads"
+    S3_MULTIPART_CHUNK_MB: int = 8  # Part size for multipart uploads (S3 minimum is 5)
+    DIRECT_UPLOAD_EXPIRE_SECONDS: int = 900  # Lifetime of presigned browser uploads (S3 only)
+    PREVIEW_URL_EXPIRE_SECONDS: int = 900  # Lifetime of signed file preview links
+    X_ACCEL_REDIRECT_PREFIX: Optional[str] = None  # e.g. /protected-uploads/: let nginx send local files
     AWS_ACCESS_KEY_ID: Optional[str] = None
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
     AWS_REGION: str = "us-east-1"
@@ -38,8 +102,13 @@ class Settings(BaseSettings):
 
     # File Upload
     MAX_FILE_SIZE_MB: int = 10
+    UPLOAD_CHUNK_SIZE_KB: int = 1024  # Uploads are written and hashed this much at a time
     ALLOWED_FILE_EXTENSIONS: str = ".pdf,.png,.jpg,.jpeg,.docx"
 
+    # Operational metrics (/metrics)
+    METRICS_ENABLED: bool = True  # Served to admins and to METRICS_ALLOWED_IPS; 404 when disabled
+    METRICS_ALLOWED_IPS: str = ""  # Comma-separated client IPs (e.g. a scraper) allowed without a token
+
     # Video/Transcription
     ENABLE_VIDEO_CHAT: bool = True
     TRANSCRIPTION_SERVICE: str = "whisper"  # whisper or deepgram
@@ -54,6 +123,11 @@ class Settings(BaseSettings):
         """Convert comma-separated extensions to list"""
         return [ext.strip() for ext in self.ALLOWED_FILE_EXTENSIONS.split(",")]
 
+    @property
+    def metrics_allowed_ips_list(self) -> list[str]:
+        """Convert comma-separated metrics IPs to list"""
+        return [ip.strip() for ip in self.METRICS_ALLOWED_IPS.split(",") if ip.strip()]
+
     @property
     def max_file_size_bytes(self) -> int:
         """Convert MB to bytes"""
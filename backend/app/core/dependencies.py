@@ -1,13 +1,15 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import Optional
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import decode_token
-from app.models.user import User
+from app.models.user import User, UserRole
 
 # HTTP Bearer token authentication scheme
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
 def get_current_user(
@@ -90,3 +92,29 @@ class RoleChecker:
                 detail=f"Insufficient permissions. Required roles: {self.allowed_roles}, user has: {user_role_str}",
             )
         return user
+
+
+def require_metrics_access(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_db),
+) -> None:
+    """
+    Dependency guarding /metrics
+
+    Allowed for clients in METRICS_ALLOWED_IPS (scrapers without a token)
+    and for admins; 404 when METRICS_ENABLED is off.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+    if request.client and request.client.host in settings.metrics_allowed_ips_list:
+        return
+
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    RoleChecker([UserRole.ADMIN])(get_current_user(credentials, db))
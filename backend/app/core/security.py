@@ -57,6 +57,38 @@ def create_refresh_token(data: dict) -> str:
     return encoded_jwt
 
 
+def create_upload_token(data: dict, expires_delta: timedelta) -> str:
+    """
+    Create a JWT describing a direct-to-storage upload (see /files/upload-url)
+
+    Args:
+        data: Upload details (disclosure, key, declared size, ...)
+        expires_delta: How long the upload may take to complete
+
+    Returns:
+        Encoded JWT token string
+    """
+    to_encode = data.copy()
+    to_encode.update({"exp": datetime.utcnow() + expires_delta, "type": "upload"})
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def create_preview_token(data: dict, expires_delta: timedelta) -> str:
+    """
+    Create a JWT that grants access to one stored file (see /files/signed/{token})
+
+    Args:
+        data: Everything needed to serve the file without a database lookup
+        expires_delta: How long the link stays valid
+
+    Returns:
+        Encoded JWT token string
+    """
+    to_encode = data.copy()
+    to_encode.update({"exp": datetime.utcnow() + expires_delta, "type": "preview"})
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
 def decode_token(token: str) -> Optional[dict]:
     """
     Decode and verify a JWT token
@@ -1,10 +1,11 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.database import engine, Base, SessionLocal
 from app.api.v1.router import api_router
 from app.models.user import User, UserRole
 from app.core.security import get_password_hash
+from app.core.dependencies import require_metrics_access
 
 # Database tables are managed by Alembic migrations
 # Run: alembic upgrade head
@@ -76,6 +77,60 @@ async def create_test_users():
 
 
 
+# AI job worker (when not running as a separate process via `python -m app.tasks.worker`)
+_ai_worker = None
+_ai_worker_task = None
+
+
+@app.on_event("startup")
+async def start_ai_worker():
+    """Start an in-process AI worker if enabled"""
+    global _ai_worker, _ai_worker_task
+    if not settings.AI_WORKER_IN_PROCESS:
+        return
+
+    import asyncio
+    from app.tasks.worker import JobWorker
+
+    _ai_worker = JobWorker()
+    # Keep a reference so the task is not garbage-collected and shutdown can await it
+    _ai_worker_task = asyncio.create_task(_ai_worker.run())
+
+
+@app.on_event("shutdown")
+async def stop_ai_worker():
+    """
+    Stop the in-process AI worker; unfinished jobs are recovered on next start
+
+    Registered before the LLM client and PDF pool shutdown hooks, which run
+    in order, so running jobs are cancelled before those close under them.
+    """
+    if not _ai_worker:
+        return
+
+    import asyncio
+
+    _ai_worker.stop()
+    try:
+        await asyncio.wait_for(_ai_worker_task, timeout=settings.AI_WORKER_SHUTDOWN_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        print("⚠️  AI worker did not stop in time")
+
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    """Close the LLM providers' async connection pools"""
+    from app.services.llm_router import llm_router
+    await llm_router.aclose()
+
+
+@app.on_event("shutdown")
+async def stop_pdf_extraction():
+    """Stop the PDF extraction process pool"""
+    from app.services.pdf_extraction import pdf_extraction_engine
+    pdf_extraction_engine.shutdown()
+
+
 @app.get("/")
 def root():
     """Root endpoint"""
@@ -92,6 +147,21 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", dependencies=[Depends(require_metrics_access)])
+def metrics():
+    """AI pipeline counters (LLM response cache hit/miss, per-provider latency and health, rate limiter queues, chat context cache)"""
+    from app.services.disclosure_context import disclosure_context_cache
+    from app.services.llm_cache import llm_cache
+    from app.services.llm_limiter import llm_limiter
+    from app.services.llm_router import llm_router
+    return {
+        "llm_cache": llm_cache.stats(),
+        "llm_router": llm_router.snapshot(),
+        "llm_limiter": llm_limiter.snapshot(),
+        "chat_context_cache": disclosure_context_cache.stats(),
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=settings.DEBUG)
@@ -3,10 +3,15 @@ from app.models.user import User
 from app.models.disclosure import Disclosure, DisclosureVersion, DisclosureStatus, DisclosureType
 from app.models.patent_draft import PatentDraft
 from app.models.file import File
+from app.models.file_blob import FileBlob
 from app.models.comment import Comment
 from app.models.message import Message
 from app.models.notification import Notification
 from app.models.video_session import VideoSession
+from app.models.ai_job import AIJob, AIJobStatus, AIJobType
+from app.models.llm_cache import LLMCacheEntry
+from app.models.ai_conversation import AIConversation, AIConversationMessage
+from app.models.document_text import DocumentText
 
 # Export all models for Alembic to detect
 __all__ = [
@@ -18,8 +23,16 @@ __all__ = [
     "DisclosureType",
     "PatentDraft",
     "File",
+    "FileBlob",
     "Comment",
     "Message",
     "Notification",
     "VideoSession",
+    "AIJob",
+    "AIJobStatus",
+    "AIJobType",
+    "LLMCacheEntry",
+    "AIConversation",
+    "AIConversationMessage",
+    "DocumentText",
 ]
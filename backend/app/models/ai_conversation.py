@@ -0,0 +1,57 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class AIConversation(Base):
+    """A user's AI assistant conversation, optionally about one disclosure"""
+    __tablename__ = "ai_conversations"
+    __table_args__ = (
+        Index("ix_ai_conversations_user_disclosure", "user_id", "disclosure_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    disclosure_id = Column(Integer, ForeignKey("disclosures.id"), nullable=True)
+
+    # Rolling summary of the turns that are no longer sent verbatim
+    summary = Column(Text, nullable=True)
+    # Highest message id folded into the summary
+    summarized_through_id = Column(Integer, default=0, nullable=False)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Relationships
+    user = relationship("User")
+    disclosure = relationship("Disclosure", back_populates="ai_conversations")
+    messages = relationship(
+        "AIConversationMessage",
+        back_populates="conversation",
+        cascade="all, delete-orphan",
+        order_by="AIConversationMessage.id",
+    )
+
+    def __repr__(self):
+        return f"<AIConversation(id={self.id}, user_id={self.user_id}, disclosure_id={self.disclosure_id})>"
+
+
+class AIConversationMessage(Base):
+    """One turn of an AI assistant conversation"""
+    __tablename__ = "ai_conversation_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer, ForeignKey("ai_conversations.id"), nullable=False, index=True)
+
+    role = Column(String(20), nullable=False)  # "user" or "assistant"
+    content = Column(Text, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    conversation = relationship("AIConversation", back_populates="messages")
+
+    def __repr__(self):
+        return f"<AIConversationMessage(id={self.id}, conversation_id={self.conversation_id}, role={self.role})>"
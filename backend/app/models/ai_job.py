@@ -0,0 +1,63 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Enum as SQLEnum, JSON, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+import enum
+from app.core.database import Base
+
+
+class AIJobStatus(str, enum.Enum):
+    """Lifecycle of a queued AI job"""
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+    CANCELLED = "CANCELLED"  # Superseded by a newer job for the same content
+
+
+class AIJobType:
+    """Job type identifiers (stored as plain strings so new types need no enum migration)"""
+    GENERATE_DRAFT = "GENERATE_DRAFT"
+    EXTRACT_TEXT = "EXTRACT_TEXT"  # payload: {"file_id": ...}
+
+
+class AIJob(Base):
+    """Durable queue entry for work executed by the AI worker pool"""
+    __tablename__ = "ai_jobs"
+    __table_args__ = (
+        # Claim query: WHERE status = 'PENDING' AND run_after <= now() ORDER BY run_after
+        Index("ix_ai_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String, nullable=False)
+    disclosure_id = Column(Integer, ForeignKey("disclosures.id"), nullable=True, index=True)
+
+    # Job-specific arguments
+    # Example: {"sections": ["summary", "claims"]}
+    payload = Column(JSON, nullable=False, default={})
+
+    # DisclosureVersion.version_number the job was queued for; results are
+    # discarded if the disclosure has moved on by the time they are ready
+    content_version = Column(Integer, nullable=True)
+    cancel_requested = Column(Boolean, default=False, nullable=False)
+
+    status = Column(SQLEnum(AIJobStatus), default=AIJobStatus.PENDING, nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    last_error = Column(Text, nullable=True)
+
+    # Scheduling and claiming
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    locked_by = Column(String, nullable=True)  # Worker id holding the job
+    locked_at = Column(DateTime(timezone=True), nullable=True)  # Refreshed by worker heartbeats
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Relationships
+    disclosure = relationship("Disclosure", back_populates="ai_jobs")
+
+    def __repr__(self):
+        return f"<AIJob(id={self.id}, type={self.job_type}, status={self.status})>"
@@ -55,6 +55,7 @@ class Disclosure(Base):
     patent_number = Column(String, nullable=True)  # e.g., "US10,123,456"
     patent_file_id = Column(Integer, ForeignKey("files.id"), nullable=True)  # Reference to uploaded PDF
     ai_analysis = Column(JSON, nullable=True)  # AI analysis results
+    patent_index = Column(JSON, nullable=True)  # Section/claim offsets into the patent text (app.utils.patent_parser)
 
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -69,6 +70,8 @@ class Disclosure(Base):
     comments = relationship("Comment", back_populates="disclosure", cascade="all, delete-orphan")
     messages = relationship("Message", back_populates="disclosure", cascade="all, delete-orphan")
     video_sessions = relationship("VideoSession", back_populates="disclosure", cascade="all, delete-orphan")
+    ai_jobs = relationship("AIJob", back_populates="disclosure", cascade="all, delete-orphan")
+    ai_conversations = relationship("AIConversation", back_populates="disclosure", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<Disclosure(id={self.id}, title={self.title}, status={self.status})>"
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class DocumentText(Base):
+    """Text extracted from an uploaded document, shared by every file with the same content"""
+    __tablename__ = "document_texts"
+
+    # SHA-256 hex digest of the file bytes (File.content_hash)
+    content_hash = Column(String(64), primary_key=True)
+
+    text = Column(Text, nullable=False)
+    # Character offset in `text` where each page starts
+    # Example: [0, 2814, 5120]
+    page_offsets = Column(JSON, nullable=False, default=[])
+    page_count = Column(Integer, nullable=False, default=0)
+    extractor = Column(String, nullable=False)  # "pymupdf", "pdfplumber", "pymupdf+pdfplumber", "docx"
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def page_range(self, start: int, end: int) -> str:
+        """Text of pages [start, end)"""
+        offsets = list(self.page_offsets or [0])
+        if start >= len(offsets):
+            return ""
+        end_offset = offsets[end] if end < len(offsets) else len(self.text)
+        return self.text[offsets[start]:end_offset]
+
+    def __repr__(self):
+        return f"<DocumentText(hash={self.content_hash[:12]}, pages={self.page_count}, chars={len(self.text or '')})>"
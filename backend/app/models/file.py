@@ -26,9 +26,16 @@ class File(Base):
     file_size = Column(Integer, nullable=False)  # in bytes
 
     # S3 storage
-    s3_key = Column(String, nullable=False, unique=True)  # S3 object key
+    s3_key = Column(String, nullable=False, unique=True)  # S3 object key (per-file name; see blob_hash)
     s3_bucket = Column(String, nullable=False)  # S3 bucket name
 
+    # Shared stored content (file_blobs); files uploaded before blobs existed have none
+    # and are stored under their own s3_key
+    blob_hash = Column(String(64), ForeignKey("file_blobs.content_hash"), nullable=True, index=True)
+
+    # SHA-256 of the file bytes; extracted text is stored under it in document_texts
+    content_hash = Column(String(64), nullable=True, index=True)
+
     # Additional metadata (optional)
     # Example: {"width": 1920, "height": 1080, "dpi": 300}
     file_metadata = Column(JSON, nullable=True, default={})
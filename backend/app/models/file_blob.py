@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class FileBlob(Base):
+    """Stored file content, shared by every File with the same bytes"""
+    __tablename__ = "file_blobs"
+
+    # SHA-256 hex digest of the bytes (File.content_hash); the object lives at storage.blob_key(content_hash)
+    content_hash = Column(String(64), primary_key=True)
+
+    bucket = Column(String, nullable=False)  # "local" or the S3 bucket name
+    size = Column(Integer, nullable=False)  # in bytes
+
+    # Number of File rows pointing at this blob; the object is deleted when it reaches 0
+    ref_count = Column(Integer, nullable=False, default=0)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<FileBlob(hash={self.content_hash[:12]}, refs={self.ref_count}, size={self.size})>"
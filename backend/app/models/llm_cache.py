@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class LLMCacheEntry(Base):
+    """Cached LLM completion, addressed by a hash of provider, model, temperature and prompt"""
+    __tablename__ = "llm_cache_entries"
+
+    # SHA-256 hex digest of the request (see LLMCache.make_key)
+    cache_key = Column(String(64), primary_key=True)
+
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    hit_count = Column(Integer, default=0, nullable=False)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_accessed_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # LRU order
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<LLMCacheEntry(key={self.cache_key[:12]}, model={self.model}, hits={self.hit_count})>"
@@ -17,7 +17,15 @@ from app.schemas.patent_draft import (
 )
 from app.schemas.comment import CommentCreate, CommentUpdate, CommentResponse, CommentThreadResponse
 from app.schemas.message import MessageCreate, MessageUpdate, MessageResponse
-from app.schemas.file import FileResponse, FileUploadResponse, FileDownloadResponse
+from app.schemas.file import (
+    FileResponse,
+    FileUploadResponse,
+    FileDownloadResponse,
+    DirectUploadRequest,
+    DirectUploadComplete,
+    DirectUploadResponse,
+    PreviewUrlResponse,
+)
 from app.schemas.notification import NotificationResponse, NotificationMarkRead
 
 __all__ = [
@@ -48,6 +56,10 @@ __all__ = [
     "FileResponse",
     "FileUploadResponse",
     "FileDownloadResponse",
+    "DirectUploadRequest",
+    "DirectUploadComplete",
+    "DirectUploadResponse",
+    "PreviewUrlResponse",
     "NotificationResponse",
     "NotificationMarkRead",
 ]
@@ -55,6 +55,7 @@ class DisclosureResponse(BaseModel):
     patent_number: Optional[str] = None
     patent_file_id: Optional[int] = None
     ai_analysis: Optional[Dict[str, Any]] = None
+    patent_index: Optional[Dict[str, Any]] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -1,9 +1,22 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional, Dict, Any
 from app.models.file import FileType
 
 
+# Request schemas
+class DirectUploadRequest(BaseModel):
+    """Schema for requesting a direct-to-storage upload"""
+    filename: str = Field(..., min_length=1, max_length=500)
+    file_size: int = Field(..., gt=0)
+    content_type: str = Field("application/octet-stream", max_length=255)
+
+
+class DirectUploadComplete(BaseModel):
+    """Schema for registering a finished direct upload"""
+    upload_token: str
+
+
 # Response schemas
 class FileResponse(BaseModel):
     """File metadata response"""
@@ -31,3 +44,17 @@ class FileDownloadResponse(BaseModel):
     """File download URL response"""
     download_url: str
     expires_in: int = 3600  # seconds
+
+
+class DirectUploadResponse(BaseModel):
+    """Presigned POST for uploading straight to storage"""
+    upload_url: str
+    fields: Dict[str, str]  # Form fields to send before the file
+    upload_token: str  # Pass to /files/upload-complete afterwards
+    expires_in: int  # seconds
+
+
+class PreviewUrlResponse(BaseModel):
+    """Signed link for embedding a file (e.g. in an iframe)"""
+    path: str  # Relative to the API prefix, e.g. /files/signed/<token>
+    expires_in: int  # seconds
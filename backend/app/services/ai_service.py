@@ -1,29 +1,179 @@
-from typing import Dict, Any, Optional
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, List, Optional, Tuple
 from app.core.config import settings
+from app.services.llm_cache import llm_cache
+from app.services.llm_router import RoutedCompletion, llm_router
+from app.utils.patent_parser import SECTION_ORDER, claim_tree, section_text
+from app.utils.text_chunking import TextChunk, chunk_text
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import json
 
+DRAFT_SYSTEM_PROMPT = "You are an expert patent attorney. Generate structured, professional patent draft sections from technical disclosures."
+SUMMARY_SYSTEM_PROMPT = "You are a technical note-taker for patent discussions."
+CHAT_SYSTEM_PROMPT = "You are a helpful patent drafting assistant."
+CONVERSATION_SUMMARY_SYSTEM_PROMPT = "You maintain a running summary of a conversation between a user and a patent drafting assistant."
+ANALYSIS_SYSTEM_PROMPT = "You are an expert patent analyst with deep expertise in technology assessment, IP valuation, and strategic patent analysis. Provide thorough, objective analysis."
+
+# Output format for analyze_patent()
+ANALYSIS_JSON_SCHEMA = """{
+  "summary": "A concise 2-3 sentence summary of what this patent covers",
+  "technical_assessment": {
+    "innovation_level": "Revolutionary/Significant/Incremental/Minimal",
+    "technical_complexity": "High/Medium/Low",
+    "key_innovations": ["innovation 1", "innovation 2", "..."],
+    "technical_field": "Primary field of technology",
+    "implementation_difficulty": "High/Medium/Low"
+  },
+  "commercial_value": {
+    "market_potential": "High/Medium/Low",
+    "potential_applications": ["application 1", "application 2", "..."],
+    "competitive_advantage": "Description of competitive advantages",
+    "estimated_value_assessment": "Undervalued/Fairly Valued/Overvalued",
+    "reasoning": "Why this patent might be undervalued or overvalued"
+  },
+  "prior_art_landscape": {
+    "novelty_assessment": "Highly Novel/Moderately Novel/Incremental",
+    "similar_technologies": ["technology 1", "technology 2", "..."],
+    "differentiation_factors": ["factor 1", "factor 2", "..."]
+  },
+  "strategic_insights": {
+    "licensing_potential": "High/Medium/Low",
+    "enforcement_strength": "Strong/Moderate/Weak",
+    "portfolio_fit": "Core Patent/Supporting Patent/Peripheral",
+    "recommended_actions": ["action 1", "action 2", "..."]
+  },
+  "claims_analysis": {
+    "total_claims": 0,
+    "independent_claims": 0,
+    "claim_scope": "Broad/Moderate/Narrow",
+    "key_limitations": ["limitation 1", "limitation 2", "..."]
+  },
+  "risk_assessment": {
+    "invalidation_risk": "High/Medium/Low",
+    "design_around_difficulty": "Hard/Moderate/Easy",
+    "potential_challenges": ["challenge 1", "challenge 2", "..."]
+  }
+}"""
+
+# Output format for the per-chunk map step of analyze_patent()
+ANALYSIS_NOTES_SCHEMA = """{
+  "key_points": ["fact 1", "..."],
+  "technical_field": "Field of technology, or null",
+  "innovations": ["innovation 1", "..."],
+  "applications": ["application 1", "..."],
+  "prior_art": ["prior art or existing solution mentioned", "..."],
+  "claims": [{"number": 1, "independent": true, "depends_on": null, "summary": "...", "key_limitations": ["..."]}]
+}"""
+
+# Sections sent for analysis, with the headings chunk_text() recognizes (drawing descriptions add little)
+ANALYSIS_SECTION_HEADINGS = {
+    "abstract": "ABSTRACT",
+    "claims": "CLAIMS",
+    "summary": "SUMMARY",
+    "field": "TECHNICAL FIELD",
+    "background": "BACKGROUND",
+    "detailed_description": "DETAILED DESCRIPTION",
+}
+
+# Patent draft sections, in document order (keys of PatentDraft.sections)
+DRAFT_SECTIONS = ["background", "summary", "detailed_description", "claims", "abstract"]
+
+# Per-section instructions used when sections are generated in parallel
+DRAFT_SECTION_INSTRUCTIONS = {
+    "background": """Write the BACKGROUND OF THE INVENTION section.
+- Describe the technical field
+- Explain the problem being solved
+- Mention any relevant prior art or existing solutions""",
+    "summary": """Write the SUMMARY OF THE INVENTION section.
+- Provide a concise overview of the invention
+- Highlight key features and advantages""",
+    "detailed_description": """Write the DETAILED DESCRIPTION section.
+- Explain the invention in technical detail
+- Describe how it works step-by-step
+- Reference any drawings or figures mentioned""",
+    "claims": """Write the CLAIMS (Basic) section.
+- Draft 3-5 basic patent claims
+- Start with a broad independent claim
+- Add dependent claims for specific features
+
+Return ONLY a JSON array of strings: ["Claim 1: ...", "Claim 2: ...", "Claim 3: ..."]""",
+    "abstract": """Write the ABSTRACT.
+- A single paragraph of at most 150 words summarizing the invention""",
+}
+
 
 class AIService:
-    """Service for AI-powered patent draft generation"""
+    """
+    Service for AI-powered patent draft generation
+
+    Every operation has a sync method (for threadpool endpoints and the
+    worker pool) and an `*_async` twin built on the providers' native async
+    clients, for use from `async def` endpoints. Calls go through the LLM
+    router, which picks the fastest healthy provider for the model tier
+    ("quality" for drafting/analysis, "fast" for chat and summaries).
+    """
 
     def __init__(self):
-        self.provider = settings.PRIMARY_LLM_PROVIDER
-
-        if self.provider == "openai":
-            import openai
-            self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-            self.model = "gpt-4-turbo-preview"
-        elif self.provider == "anthropic":
-            import anthropic
-            self.client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
-            self.model = "claude-3-opus-20240229"
-        elif self.provider == "gemini":
-            import google.generativeai as genai
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.client = genai.GenerativeModel('gemini-2.5-flash')
-            self.model = "gemini-2.5-flash"
-        else:
-            raise ValueError(f"Unsupported LLM provider: {self.provider}")
+        self.llm = llm_router
+        self.provider = self.llm.primary
+        self.model = self.llm.model_for("quality")
+
+    def _cache_key(self, messages: list[Dict[str, str]], system: str, tier: str, temperature: float, **options) -> str:
+        # Every provider/model the tier can be routed to, so a config or model change misses
+        return llm_cache.make_key("router", tier, temperature, system, messages, route=self.llm.route(tier), **options)
+
+    def _cacheable(self, result: RoutedCompletion) -> bool:
+        # Placeholder text from the fake provider is only worth keeping when it is the configured primary
+        return result.provider != "fake" or self.llm.primary == "fake"
+
+    def _complete_cached_routed(
+        self, messages: list[Dict[str, str]], system: str, tier: str, temperature: float, **options
+    ) -> RoutedCompletion:
+        """
+        Completion backed by the LLM response cache
+
+        Used for deterministic, expensive work (drafting, analysis) where an
+        identical prompt should return the stored result instead of re-billing tokens.
+        A result is reused whichever provider the router picked, as long as the
+        tier's providers and models are unchanged. Returns the text with the
+        provider/model that produced it (also on a cache hit).
+        """
+        key = self._cache_key(messages, system, tier, temperature, **options)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return RoutedCompletion(cached.text, cached.provider, cached.model)
+
+        result = self.llm.complete_routed(messages, system=system, tier=tier, temperature=temperature, **options)
+        if self._cacheable(result):
+            llm_cache.set(key, result.provider, result.model, result.text)
+        return result
+
+    async def _complete_cached_routed_async(
+        self, messages: list[Dict[str, str]], system: str, tier: str, temperature: float, **options
+    ) -> RoutedCompletion:
+        """Async version of _complete_cached_routed()"""
+        key = self._cache_key(messages, system, tier, temperature, **options)
+        cached = await llm_cache.get_async(key)
+        if cached is not None:
+            return RoutedCompletion(cached.text, cached.provider, cached.model)
+
+        result = await self.llm.complete_routed_async(
+            messages, system=system, tier=tier, temperature=temperature, **options
+        )
+        if self._cacheable(result):
+            await llm_cache.set_async(key, result.provider, result.model, result.text)
+        return result
+
+    def _complete_cached(self, messages: list[Dict[str, str]], system: str, tier: str, temperature: float, **options) -> str:
+        """Text of _complete_cached_routed()"""
+        return self._complete_cached_routed(messages, system, tier, temperature, **options).text
+
+    async def _complete_cached_async(
+        self, messages: list[Dict[str, str]], system: str, tier: str, temperature: float, **options
+    ) -> str:
+        """Text of _complete_cached_routed_async()"""
+        result = await self._complete_cached_routed_async(messages, system, tier, temperature, **options)
+        return result.text
 
     def generate_patent_draft(self, disclosure_content: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -38,38 +188,138 @@ class AIService:
         prompt = self._build_patent_prompt(disclosure_content)
 
         try:
-            if self.provider == "openai":
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are an expert patent attorney. Generate structured, professional patent draft sections from technical disclosures."
-                        },
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3,  # Lower temperature for more consistent output
-                )
-                draft_text = response.choices[0].message.content
-
-            elif self.provider == "anthropic":
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=4096,
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3,
-                )
-                draft_text = response.content[0].text
-
+            draft_text = self._complete_cached(
+                [{"role": "user", "content": prompt}],
+                system=DRAFT_SYSTEM_PROMPT,
+                tier="quality",
+                temperature=0.3,  # Lower temperature for more consistent output
+            )
             # Parse AI response into structured sections
-            sections = self._parse_draft_response(draft_text)
-            return sections
+            return self._parse_draft_response(draft_text)
+
+        except Exception as e:
+            raise Exception(f"AI generation failed: {str(e)}")
+
+    async def generate_patent_draft_async(
+        self, disclosure_content: Dict[str, Any], models_used: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Async version of generate_patent_draft()
+
+        Args:
+            models_used: Filled with section name -> model that wrote it
+        """
+        prompt = self._build_patent_prompt(disclosure_content)
+
+        try:
+            result = await self._complete_cached_routed_async(
+                [{"role": "user", "content": prompt}],
+                system=DRAFT_SYSTEM_PROMPT,
+                tier="quality",
+                temperature=0.3,
+            )
+            draft = self._parse_draft_response(result.text)
+            if models_used is not None:
+                models_used.update({section: result.model for section in draft})
+            return draft
 
         except Exception as e:
             raise Exception(f"AI generation failed: {str(e)}")
 
+    async def generate_patent_draft_sections_async(
+        self,
+        disclosure_content: Dict[str, Any],
+        sections: Optional[List[str]] = None,
+        on_section: Optional[Callable[[str, Any], Awaitable[None]]] = None,
+        models_used: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Generate patent draft sections as concurrent LLM calls
+
+        Every call shares the same system prompt and disclosure context (only the
+        trailing section instruction differs), so wall-clock time is that of the
+        slowest section rather than the sum of all of them.
+
+        Args:
+            disclosure_content: Dictionary with keys like "problem", "solution", etc.
+            sections: Section names to generate (defaults to all DRAFT_SECTIONS)
+            on_section: Awaited with (section_name, content) as each section completes
+            models_used: Filled with section name -> model that wrote it (the
+                router may fail over or hedge to another provider per section)
+
+        Returns:
+            Dictionary in the same format as generate_patent_draft()
+        """
+        sections = sections or DRAFT_SECTIONS
+
+        async def generate(section: str):
+            content, model = await self._generate_section_async(disclosure_content, section)
+            if models_used is not None:
+                models_used[section] = model
+            return section, content
+
+        tasks = [asyncio.create_task(generate(section)) for section in sections]
+        results: Dict[str, Any] = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    section, content = await next_done
+                except Exception as e:
+                    raise Exception(f"AI generation failed: {str(e)}")
+                results[section] = content
+                if on_section:
+                    # Errors from the callback (e.g. results no longer wanted) propagate unchanged
+                    await on_section(section, content)
+        finally:
+            # Stop outstanding LLM calls on failure or cancellation, and wait for
+            # them so their limiter slots are released and their errors retrieved
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Keep document order regardless of completion order
+        return {section: results[section] for section in sections}
+
+    async def _generate_section_async(self, disclosure_content: Dict[str, Any], section: str) -> Tuple[Any, str]:
+        """Generate one draft section and return it with the model used; claims are a list, other sections text"""
+        prompt = f"""{self._build_disclosure_block(disclosure_content)}
+
+{DRAFT_SECTION_INSTRUCTIONS[section]}
+
+Return only the section content, without a heading."""
+
+        result = await self._complete_cached_routed_async(
+            [{"role": "user", "content": prompt}],
+            system=DRAFT_SYSTEM_PROMPT,
+            tier="quality",
+            temperature=0.3,
+        )
+
+        if section == "claims":
+            return self._parse_claims_response(result.text), result.model
+        return result.text.strip(), result.model
+
+    def _build_disclosure_block(self, disclosure: Dict[str, Any]) -> str:
+        """Shared disclosure context prefix for per-section prompts"""
+        return f"""Generate part of a patent application draft from the following technical disclosure.
+
+DISCLOSURE CONTENT:
+{json.dumps(disclosure, indent=2)}"""
+
+    def _parse_claims_response(self, response_text: str) -> list[str]:
+        """Parse a JSON array of claims, falling back to numbered-claim extraction"""
+        try:
+            start = response_text.find("[")
+            end = response_text.rfind("]") + 1
+            if start >= 0 and end > start:
+                claims = json.loads(response_text[start:end])
+                if isinstance(claims, list):
+                    return [str(claim) for claim in claims]
+        except json.JSONDecodeError:
+            pass
+
+        return self._extract_claims(f"# CLAIMS\n{response_text}")
+
     def _build_patent_prompt(self, disclosure: Dict[str, Any]) -> str:
         """Build prompt for patent draft generation"""
         return f"""
@@ -165,7 +415,33 @@ Return the response in this EXACT JSON format:
         Returns:
             Structured summary of invention discussion
         """
-        prompt = f"""
+        try:
+            return self.llm.complete(
+                [{"role": "user", "content": self._build_summary_prompt(transcript)}],
+                system=SUMMARY_SYSTEM_PROMPT,
+                tier="fast",  # Cheaper model for summaries
+                temperature=0.3,
+                max_tokens=1024,
+            )
+        except Exception as e:
+            return f"Error generating summary: {str(e)}"
+
+    async def summarize_video_transcript_async(self, transcript: str) -> str:
+        """Async version of summarize_video_transcript()"""
+        try:
+            return await self.llm.complete_async(
+                [{"role": "user", "content": self._build_summary_prompt(transcript)}],
+                system=SUMMARY_SYSTEM_PROMPT,
+                tier="fast",
+                temperature=0.3,
+                max_tokens=1024,
+            )
+        except Exception as e:
+            return f"Error generating summary: {str(e)}"
+
+    def _build_summary_prompt(self, transcript: str) -> str:
+        """Build prompt for transcript summarization"""
+        return f"""
 Summarize the following invention discussion transcript. Focus on:
 - Key technical points discussed
 - New invention details revealed
@@ -178,29 +454,6 @@ TRANSCRIPT:
 Provide a concise, structured summary in markdown format.
 """
 
-        try:
-            if self.provider == "openai":
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",  # Cheaper model for summaries
-                    messages=[
-                        {"role": "system", "content": "You are a technical note-taker for patent discussions."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3,
-                )
-                return response.choices[0].message.content
-
-            elif self.provider == "anthropic":
-                response = self.client.messages.create(
-                    model="claude-3-haiku-20240307",  # Cheaper model
-                    max_tokens=1024,
-                    messages=[{"role": "user", "content": prompt}],
-                )
-                return response.content[0].text
-
-        except Exception as e:
-            return f"Error generating summary: {str(e)}"
-
     def chat(self, messages: list[Dict[str, str]], system_prompt: Optional[str] = None) -> str:
         """
         Generate AI chat response from conversation history
@@ -212,175 +465,407 @@ Provide a concise, structured summary in markdown format.
         Returns:
             AI response string
         """
+        if not messages:
+            return "No message provided"
+
         try:
-            if self.provider == "openai":
-                chat_messages = []
-                if system_prompt:
-                    chat_messages.append({"role": "system", "content": system_prompt})
-                chat_messages.extend(messages)
-
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",  # Faster for chat
-                    messages=chat_messages,
-                    temperature=0.7,
-                )
-                return response.choices[0].message.content
-
-            elif self.provider == "anthropic":
-                response = self.client.messages.create(
-                    model="claude-3-haiku-20240307",  # Faster for chat
-                    max_tokens=1024,
-                    system=system_prompt or "You are a helpful patent drafting assistant.",
-                    messages=messages,
-                )
-                return response.content[0].text
-
-            elif self.provider == "gemini":
-                # Gemini uses a different format - need to convert messages
-                # For Gemini, we need to create a new model instance with system instruction
-                import google.generativeai as genai
-
-                # Create model with system instruction if provided
-                if system_prompt:
-                    model = genai.GenerativeModel(
-                        'gemini-2.0-flash',
-                        system_instruction=system_prompt
-                    )
-                else:
-                    model = self.client
-
-                # Build conversation history in Gemini format
-                history = []
-                for msg in messages[:-1]:  # All but the last message
-                    history.append({
-                        "role": "user" if msg["role"] == "user" else "model",
-                        "parts": [msg["content"]]
-                    })
-
-                # Start chat with history
-                chat = model.start_chat(history=history)
-
-                # Send the latest message and get response
-                if messages:
-                    latest_message = messages[-1]["content"]
-                    response = chat.send_message(latest_message)
-                    return response.text
-                else:
-                    return "No message provided"
+            return self.llm.complete(
+                messages,
+                system=system_prompt or CHAT_SYSTEM_PROMPT,
+                tier="fast",  # Faster for chat
+                temperature=0.7,
+                max_tokens=1024,
+            )
+        except Exception as e:
+            raise Exception(f"Chat generation failed: {str(e)}")
+
+    async def chat_async(self, messages: list[Dict[str, str]], system_prompt: Optional[str] = None) -> str:
+        """Async version of chat(); does not block the event loop during the LLM round trip"""
+        if not messages:
+            return "No message provided"
+
+        try:
+            return await self.llm.complete_async(
+                messages,
+                system=system_prompt or CHAT_SYSTEM_PROMPT,
+                tier="fast",
+                temperature=0.7,
+                max_tokens=1024,
+                hedge=settings.LLM_HEDGE_CHAT,  # Interactive: race a backup provider if slow
+            )
+        except Exception as e:
+            raise Exception(f"Chat generation failed: {str(e)}")
+
+    async def chat_stream_async(
+        self, messages: list[Dict[str, str]], system_prompt: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream an AI chat response as text deltas
+
+        Same inputs as chat(). Stop iterating to abort generation.
+        """
+        if not messages:
+            yield "No message provided"
+            return
 
+        try:
+            async for delta in self.llm.stream_async(
+                messages,
+                system=system_prompt or CHAT_SYSTEM_PROMPT,
+                tier="fast",
+                temperature=0.7,
+                max_tokens=1024,
+            ):
+                yield delta
         except Exception as e:
             raise Exception(f"Chat generation failed: {str(e)}")
 
-    def analyze_patent(self, patent_text: str, patent_number: Optional[str] = None) -> Dict[str, Any]:
+    def summarize_conversation(self, previous_summary: Optional[str], messages: list[Dict[str, str]]) -> str:
+        """
+        Fold conversation turns into a rolling summary
+
+        Args:
+            previous_summary: Summary of everything before `messages` (None at first)
+            messages: Turns to fold in, oldest first
+
+        Returns:
+            Updated summary
+        """
+        try:
+            return self.llm.complete(
+                [{"role": "user", "content": self._build_conversation_summary_prompt(previous_summary, messages)}],
+                system=CONVERSATION_SUMMARY_SYSTEM_PROMPT,
+                tier="fast",
+                temperature=0.2,
+                max_tokens=800,
+            ).strip()
+        except Exception as e:
+            raise Exception(f"Conversation summary failed: {str(e)}")
+
+    async def summarize_conversation_async(self, previous_summary: Optional[str], messages: list[Dict[str, str]]) -> str:
+        """Async version of summarize_conversation()"""
+        try:
+            text = await self.llm.complete_async(
+                [{"role": "user", "content": self._build_conversation_summary_prompt(previous_summary, messages)}],
+                system=CONVERSATION_SUMMARY_SYSTEM_PROMPT,
+                tier="fast",
+                temperature=0.2,
+                max_tokens=800,
+            )
+            return text.strip()
+        except Exception as e:
+            raise Exception(f"Conversation summary failed: {str(e)}")
+
+    def _build_conversation_summary_prompt(self, previous_summary: Optional[str], messages: list[Dict[str, str]]) -> str:
+        """Build prompt for rolling conversation summaries"""
+        turns = "\n\n".join(f"{msg['role'].upper()}: {msg['content']}" for msg in messages)
+        return f"""
+Update the summary of this conversation with the new turns below.
+Keep decisions, facts about the invention, requested changes, open questions and anything the user asked the
+assistant to remember. Drop pleasantries. Stay under 300 words.
+
+CURRENT SUMMARY:
+{previous_summary or "(none yet)"}
+
+NEW TURNS:
+{turns}
+
+Return only the updated summary.
+"""
+
+    def analyze_patent(
+        self,
+        patent_text: str,
+        patent_number: Optional[str] = None,
+        patent_index: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
         """
         Analyze a patent document and provide comprehensive insights
 
+        Short documents are analyzed in one call. Longer ones go through a
+        map-reduce pipeline so the whole document is covered: the text is
+        split on section/paragraph boundaries, each chunk is condensed into
+        notes (up to PATENT_ANALYSIS_MAX_PARALLEL at once), and the notes are
+        combined into the final analysis.
+
+        With a patent index (app.utils.patent_parser.parse_patent), only the
+        recognized sections are sent, claims first, and the claim counts in
+        claims_analysis come from the index rather than the model.
+
         Args:
             patent_text: Full text extracted from patent PDF
             patent_number: Optional patent number for reference
+            patent_index: Section/claim index of patent_text (optional)
 
         Returns:
             Dictionary with analysis results including summary, technical assessment,
             commercial value, and recommendations
         """
-        prompt = f"""
+        source_text = self._analysis_source(patent_text, patent_index)
+        chunks = self._analysis_chunks(source_text)
+        try:
+            if len(chunks) <= 1:
+                analysis_source = source_text
+            else:
+                with ThreadPoolExecutor(max_workers=settings.PATENT_ANALYSIS_MAX_PARALLEL) as executor:
+                    notes = list(executor.map(
+                        lambda chunk: self._extract_chunk_notes(chunk, len(chunks), patent_number), chunks
+                    ))
+                    batches = self._batch_notes(notes)
+                    while len(batches) > 1:
+                        notes = list(executor.map(self._merge_notes, batches))
+                        batches = self._batch_notes(notes)
+                analysis_source = self._format_notes(notes)
+
+            analysis_text = self._complete_cached(
+                [{"role": "user", "content": self._build_analysis_prompt(
+                    analysis_source, patent_number, from_notes=len(chunks) > 1, patent_index=patent_index
+                )}],
+                system=ANALYSIS_SYSTEM_PROMPT,
+                tier="quality",  # Use the strongest model for complex analysis
+                temperature=0.3,
+                json_mode=True,
+            )
+        except Exception as e:
+            raise Exception(f"Patent analysis failed: {str(e)}")
+
+        return self._apply_claim_counts(self._parse_analysis_response(analysis_text), patent_index)
+
+    async def analyze_patent_async(
+        self,
+        patent_text: str,
+        patent_number: Optional[str] = None,
+        patent_index: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Async version of analyze_patent()"""
+        source_text = self._analysis_source(patent_text, patent_index)
+        chunks = self._analysis_chunks(source_text)
+        try:
+            if len(chunks) <= 1:
+                analysis_source = source_text
+            else:
+                semaphore = asyncio.Semaphore(settings.PATENT_ANALYSIS_MAX_PARALLEL)
+
+                async def bounded(coro):
+                    async with semaphore:
+                        return await coro
+
+                notes = await asyncio.gather(*[
+                    bounded(self._extract_chunk_notes_async(chunk, len(chunks), patent_number)) for chunk in chunks
+                ])
+                batches = self._batch_notes(notes)
+                while len(batches) > 1:
+                    notes = await asyncio.gather(*[bounded(self._merge_notes_async(batch)) for batch in batches])
+                    batches = self._batch_notes(notes)
+                analysis_source = self._format_notes(notes)
+
+            analysis_text = await self._complete_cached_async(
+                [{"role": "user", "content": self._build_analysis_prompt(
+                    analysis_source, patent_number, from_notes=len(chunks) > 1, patent_index=patent_index
+                )}],
+                system=ANALYSIS_SYSTEM_PROMPT,
+                tier="quality",
+                temperature=0.3,
+                json_mode=True,
+            )
+        except Exception as e:
+            raise Exception(f"Patent analysis failed: {str(e)}")
+
+        return self._apply_claim_counts(self._parse_analysis_response(analysis_text), patent_index)
+
+    def _analysis_chunks(self, source_text: str) -> List[TextChunk]:
+        """Map-step chunks, or none when the text fits one call (chunks never span sections, so even a short text can split)"""
+        if len(source_text) <= settings.PATENT_ANALYSIS_CHUNK_CHARS:
+            return []
+        return chunk_text(source_text, settings.PATENT_ANALYSIS_CHUNK_CHARS)
+
+    def _analysis_source(self, patent_text: str, patent_index: Optional[Dict[str, Any]]) -> str:
+        """
+        The parts of the patent worth analyzing, claims first
+
+        Front matter (bibliographic data, citations) and drawing descriptions
+        are left out. Without a usable index the full text is used.
+        """
+        if not patent_index or not patent_index.get("sections"):
+            return patent_text
+
+        parts = []
+        for key in SECTION_ORDER:
+            heading = ANALYSIS_SECTION_HEADINGS.get(key)
+            text = section_text(patent_text, patent_index, key) if heading else None
+            if text:
+                parts.append(f"{heading}\n{text}")
+        return "\n\n".join(parts) if parts else patent_text
+
+    def _apply_claim_counts(self, analysis: Dict[str, Any], patent_index: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Replace the model's claim counts with the ones parsed from the document"""
+        counts = (patent_index or {}).get("claim_counts") or {}
+        if counts.get("total"):
+            claims_analysis = analysis.setdefault("claims_analysis", {})
+            if isinstance(claims_analysis, dict):
+                claims_analysis["total_claims"] = counts["total"]
+                claims_analysis["independent_claims"] = counts["independent"]
+        return analysis
+
+    def _build_chunk_notes_prompt(self, chunk: TextChunk, total_chunks: int, patent_number: Optional[str]) -> str:
+        """Map step: condense one chunk of the patent into notes"""
+        section = f" (section: {chunk.section})" if chunk.section else ""
+        return f"""
+You are reading part {chunk.index + 1} of {total_chunks} of patent {patent_number or "(number not provided)"}{section}.
+Extract notes from this excerpt only; a later step combines the notes from all parts into a full analysis.
+
+EXCERPT:
+{chunk.text}
+
+Return JSON in this format (use empty lists for anything not present in the excerpt):
+{ANALYSIS_NOTES_SCHEMA}
+"""
+
+    def _extract_chunk_notes(self, chunk: TextChunk, total_chunks: int, patent_number: Optional[str]) -> Dict[str, Any]:
+        text = self._complete_cached(
+            [{"role": "user", "content": self._build_chunk_notes_prompt(chunk, total_chunks, patent_number)}],
+            system=ANALYSIS_SYSTEM_PROMPT,
+            tier="fast",  # Extraction only; the reduce step uses the quality tier
+            temperature=0.2,
+            json_mode=True,
+        )
+        return self._parse_notes(text, chunk)
+
+    async def _extract_chunk_notes_async(
+        self, chunk: TextChunk, total_chunks: int, patent_number: Optional[str]
+    ) -> Dict[str, Any]:
+        text = await self._complete_cached_async(
+            [{"role": "user", "content": self._build_chunk_notes_prompt(chunk, total_chunks, patent_number)}],
+            system=ANALYSIS_SYSTEM_PROMPT,
+            tier="fast",
+            temperature=0.2,
+            json_mode=True,
+        )
+        return self._parse_notes(text, chunk)
+
+    def _build_merge_notes_prompt(self, notes: List[Dict[str, Any]]) -> str:
+        """Intermediate reduce step for documents whose notes are too long for one call"""
+        return f"""
+Merge the following notes, taken from consecutive parts of one patent, into a single set of notes.
+Remove duplicates but keep every distinct fact, innovation and claim.
+
+NOTES:
+{self._format_notes(notes)}
+
+Return JSON in this format:
+{ANALYSIS_NOTES_SCHEMA}
+"""
+
+    def _merge_notes(self, notes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        text = self._complete_cached(
+            [{"role": "user", "content": self._build_merge_notes_prompt(notes)}],
+            system=ANALYSIS_SYSTEM_PROMPT,
+            tier="fast",
+            temperature=0.2,
+            json_mode=True,
+        )
+        return self._parse_notes(text)
+
+    async def _merge_notes_async(self, notes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        text = await self._complete_cached_async(
+            [{"role": "user", "content": self._build_merge_notes_prompt(notes)}],
+            system=ANALYSIS_SYSTEM_PROMPT,
+            tier="fast",
+            temperature=0.2,
+            json_mode=True,
+        )
+        return self._parse_notes(text)
+
+    def _parse_notes(self, text: str, chunk: Optional[TextChunk] = None) -> Dict[str, Any]:
+        """Parse map/merge output; unparseable output is kept as raw text so nothing is lost"""
+        try:
+            notes = json.loads(text[text.find("{"):text.rfind("}") + 1])
+            if not isinstance(notes, dict):
+                raise ValueError
+        except ValueError:
+            notes = {"key_points": [text.strip()]}
+        if chunk is not None and chunk.section:
+            notes["section"] = chunk.section
+        return notes
+
+    def _format_notes(self, notes: List[Dict[str, Any]]) -> str:
+        return "\n".join(json.dumps(note, ensure_ascii=False, separators=(",", ":")) for note in notes)
+
+    def _batch_notes(self, notes: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Group notes so each group fits in one reduce call
+
+        Every group of a multi-group split holds at least two notes, so each
+        merge round strictly reduces the number of notes.
+        """
+        limit = settings.PATENT_ANALYSIS_CHUNK_CHARS
+        if len(self._format_notes(notes)) <= limit or len(notes) <= 1:
+            return [notes]
+
+        batches: List[List[Dict[str, Any]]] = []
+        current: List[Dict[str, Any]] = []
+        for note in notes:
+            if len(current) >= 2 and len(self._format_notes(current + [note])) > limit:
+                batches.append(current)
+                current = []
+            current.append(note)
+        if len(current) == 1 and batches:
+            batches[-1].append(current[0])
+        elif current:
+            batches.append(current)
+        return batches
+
+    def _build_analysis_prompt(
+        self,
+        patent_text: str,
+        patent_number: Optional[str] = None,
+        from_notes: bool = False,
+        patent_index: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Build prompt for patent analysis (from the full text, or from map-step notes covering all of it)"""
+        if from_notes:
+            source = "PATENT NOTES (extracted from every part of the document, in order; one JSON object per line)"
+        else:
+            source = "PATENT TEXT"
+
+        claim_structure = ""
+        counts = (patent_index or {}).get("claim_counts") or {}
+        if counts.get("total"):
+            claim_structure = (
+                f"\nCLAIM STRUCTURE (parsed from the document; use these counts as given):\n"
+                f"{counts['total']} claims, {counts['independent']} independent\n{claim_tree(patent_index)}\n"
+            )
+        return f"""
 Analyze the following patent document and provide a comprehensive analysis.
 
 PATENT NUMBER: {patent_number or "Not provided"}
-
-PATENT TEXT:
-{patent_text[:15000]}  # Limit to ~15k chars to avoid token limits
+{claim_structure}
+{source}:
+{patent_text}
 
 Please provide a detailed analysis in the following JSON format:
-{{
-  "summary": "A concise 2-3 sentence summary of what this patent covers",
-  "technical_assessment": {{
-    "innovation_level": "Revolutionary/Significant/Incremental/Minimal",
-    "technical_complexity": "High/Medium/Low",
-    "key_innovations": ["innovation 1", "innovation 2", "..."],
-    "technical_field": "Primary field of technology",
-    "implementation_difficulty": "High/Medium/Low"
-  }},
-  "commercial_value": {{
-    "market_potential": "High/Medium/Low",
-    "potential_applications": ["application 1", "application 2", "..."],
-    "competitive_advantage": "Description of competitive advantages",
-    "estimated_value_assessment": "Undervalued/Fairly Valued/Overvalued",
-    "reasoning": "Why this patent might be undervalued or overvalued"
-  }},
-  "prior_art_landscape": {{
-    "novelty_assessment": "Highly Novel/Moderately Novel/Incremental",
-    "similar_technologies": ["technology 1", "technology 2", "..."],
-    "differentiation_factors": ["factor 1", "factor 2", "..."]
-  }},
-  "strategic_insights": {{
-    "licensing_potential": "High/Medium/Low",
-    "enforcement_strength": "Strong/Moderate/Weak",
-    "portfolio_fit": "Core Patent/Supporting Patent/Peripheral",
-    "recommended_actions": ["action 1", "action 2", "..."]
-  }},
-  "claims_analysis": {{
-    "total_claims": 0,
-    "independent_claims": 0,
-    "claim_scope": "Broad/Moderate/Narrow",
-    "key_limitations": ["limitation 1", "limitation 2", "..."]
-  }},
-  "risk_assessment": {{
-    "invalidation_risk": "High/Medium/Low",
-    "design_around_difficulty": "Hard/Moderate/Easy",
-    "potential_challenges": ["challenge 1", "challenge 2", "..."]
-  }}
-}}
+{ANALYSIS_JSON_SCHEMA}
 
 Be objective and analytical. If the patent appears undervalued, explain why specifically.
 """
 
+    def _parse_analysis_response(self, analysis_text: str) -> Dict[str, Any]:
+        """Parse JSON analysis, falling back to the raw text if it is not valid JSON"""
         try:
-            if self.provider == "openai":
-                response = self.client.chat.completions.create(
-                    model="gpt-4-turbo-preview",  # Use GPT-4 for complex analysis
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are an expert patent analyst with deep expertise in technology assessment, IP valuation, and strategic patent analysis. Provide thorough, objective analysis."
-                        },
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3,
-                    response_format={"type": "json_object"}
-                )
-                analysis_text = response.choices[0].message.content
-
-            elif self.provider == "anthropic":
-                response = self.client.messages.create(
-                    model="claude-3-opus-20240229",  # Use Opus for complex analysis
-                    max_tokens=4096,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.3,
-                )
-                analysis_text = response.content[0].text
-
-            elif self.provider == "gemini":
-                response = self.client.generate_content(prompt)
-                analysis_text = response.text
-
-            # Parse JSON response
-            try:
-                start = analysis_text.find("{")
-                end = analysis_text.rfind("}") + 1
-                if start >= 0 and end > start:
-                    json_str = analysis_text[start:end]
-                    return json.loads(json_str)
-            except json.JSONDecodeError:
-                # Return raw text if JSON parsing fails
-                return {
-                    "summary": analysis_text[:500],
-                    "raw_analysis": analysis_text,
-                    "error": "Failed to parse structured analysis"
-                }
+            start = analysis_text.find("{")
+            end = analysis_text.rfind("}") + 1
+            if start >= 0 and end > start:
+                json_str = analysis_text[start:end]
+                return json.loads(json_str)
+        except json.JSONDecodeError:
+            pass
 
-        except Exception as e:
-            raise Exception(f"Patent analysis failed: {str(e)}")
+        # Return raw text if JSON parsing fails
+        return {
+            "summary": analysis_text[:500],
+            "raw_analysis": analysis_text,
+            "error": "Failed to parse structured analysis"
+        }
 
 
 # Global AI service instance
@@ -0,0 +1,142 @@
+"""
+Content-addressed attachment storage with reference counting
+
+Every upload is first written under its own key, hashed on the way in, and
+then adopted: if a blob with the same SHA-256 already exists its ref_count
+goes up, otherwise the object is copied to blob_key(hash) and becomes a new
+blob. File rows point at their blob through File.blob_hash, and releasing the
+last reference deletes the object. Text extraction (document_texts) is keyed
+by the same hash, so duplicates share it too.
+
+Both adopt_upload() and release_blob() leave the commit to the caller, so the
+reference change lands in the same transaction as the File row it belongs to.
+Storage changes cannot be rolled back, so nothing is removed before that
+commit: deleting the uploaded copy (or a released blob) is queued on the
+session and runs only once the transaction has committed. If it rolls back,
+the uploaded object is still where the old rows point; at worst a blob
+object is left without a row, which a later upload of the same bytes reuses.
+"""
+from typing import Callable, Optional
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.file import File
+from app.models.file_blob import FileBlob
+from app.services.storage import Storage, blob_key, file_key, storage_for, storage_for_bucket
+
+# Session.info key of the storage deletes waiting for the commit
+_PENDING_KEY = "blobs_after_commit"
+
+
+def _after_commit(db: Session, action: Callable[[], None]):
+    """Run a storage change once db's transaction commits (dropped if it rolls back)"""
+    db.info.setdefault(_PENDING_KEY, []).append(action)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_pending(session: Session):
+    # Also fired when a savepoint is released; only the outermost commit counts
+    if session.in_nested_transaction():
+        return
+    for action in session.info.pop(_PENDING_KEY, []):
+        try:
+            action()
+        except Exception as e:
+            # Only leaves an unreferenced object behind
+            print(f"⚠️  Storage cleanup after commit failed: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session):
+    # A savepoint rollback (e.g. adopt_upload's IntegrityError) keeps the outer transaction's deletes
+    if session.in_nested_transaction():
+        return
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _lock_content(db: Session, content_hash: str):
+    """
+    Hold a lock on one content hash until db's transaction ends
+
+    Taken by adopt_upload() and by the deferred blob delete, so an upload can
+    never re-create a blob between the delete's "no row" check and the object
+    removal (a row lock cannot do this, the row is gone). Postgres advisory
+    lock; no-op on SQLite.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # First 60 bits of the hash fit the signed 64-bit lock key
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": int(content_hash[:15], 16)})
+
+
+def _locked_blob(db: Session, content_hash: str) -> Optional[FileBlob]:
+    # Row lock so concurrent adopt/release of the same content serialize (no-op on SQLite)
+    return db.query(FileBlob).filter(FileBlob.content_hash == content_hash).with_for_update().first()
+
+
+def adopt_upload(db: Session, storage: Storage, key: str, content_hash: str, size: int) -> FileBlob:
+    """
+    Take a reference to the blob for an object just uploaded to key
+
+    Args:
+        storage: Backend holding the uploaded object
+        key: Where the object was uploaded (deleted once the caller commits)
+        content_hash: SHA-256 of its bytes
+        size: Its size in bytes
+
+    Returns:
+        The blob (ref_count already incremented; the caller commits)
+    """
+    _lock_content(db, content_hash)
+    blob = _locked_blob(db, content_hash)
+    if blob:
+        blob.ref_count += 1
+        _after_commit(db, lambda: storage.delete(key))
+        return blob
+
+    storage.copy(key, blob_key(content_hash))
+    blob = FileBlob(content_hash=content_hash, bucket=storage.bucket, size=size, ref_count=1)
+    try:
+        with db.begin_nested():
+            db.add(blob)
+    except IntegrityError:
+        # An identical upload created the blob first; our copy was the same bytes
+        blob = _locked_blob(db, content_hash)
+        if blob.bucket != storage.bucket:
+            _after_commit(db, lambda: storage.delete(blob_key(content_hash)))
+        blob.ref_count += 1
+    _after_commit(db, lambda: storage.delete(key))
+    return blob
+
+
+def _delete_unused_blob(db: Session, bucket: str, content_hash: str):
+    # Skip if an identical upload re-created the blob after our commit. The
+    # content lock is held across the check and the delete (released by close())
+    check = Session(bind=db.get_bind())
+    try:
+        _lock_content(check, content_hash)
+        if check.query(FileBlob.content_hash).filter(FileBlob.content_hash == content_hash).first():
+            return
+        storage_for_bucket(bucket).delete(blob_key(content_hash))
+    finally:
+        check.close()
+
+
+def release_blob(db: Session, content_hash: str):
+    """Drop one reference; the last one deletes the stored object once the caller commits"""
+    blob = _locked_blob(db, content_hash)
+    if not blob:
+        return
+    blob.ref_count -= 1
+    if blob.ref_count <= 0:
+        bucket = blob.bucket
+        db.delete(blob)
+        _after_commit(db, lambda: _delete_unused_blob(db, bucket, content_hash))
+
+
+def release_file_content(db: Session, f: File):
+    """Release what a deleted File row stored (call after the delete is flushed, so no row still references a dropped blob)"""
+    if f.blob_hash:
+        release_blob(db, f.blob_hash)
+    else:
+        storage, key = storage_for(f), file_key(f)
+        _after_commit(db, lambda: storage.delete(key))
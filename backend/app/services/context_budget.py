@@ -0,0 +1,165 @@
+"""
+Token-aware context packing for LLM prompts
+
+Context sources (disclosure content, draft text, file excerpts, ...) are
+registered with a priority and an optional quota. pack() fits them into a
+token budget: each source first gets up to its quota in priority order, then
+leftover budget goes to sources that were cut short, again by priority.
+Sources are emitted in the order they were added so the prompt reads
+naturally regardless of priority.
+
+Token counts use tiktoken for OpenAI models when it is installed and a
+character heuristic otherwise (CJK characters count as roughly one token
+each, other text as roughly four characters per token).
+"""
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+TRUNCATION_MARKER = "\n... [truncated]"
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to the heuristic
+    tiktoken = None
+
+_encodings: Dict[str, Any] = {}
+
+
+def _encoding_for(model: Optional[str]):
+    if tiktoken is None or not model or not model.startswith("gpt"):
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+
+def estimate_tokens(text: str, model: Optional[str] = None) -> int:
+    """Estimate how many tokens `text` uses for `model`"""
+    if not text:
+        return 0
+    encoding = _encoding_for(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    wide = sum(1 for char in text if ord(char) > 0x2E7F)
+    return wide + (len(text) - wide + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Cut text to at most `max_tokens` (marker included), preferring a line or sentence break"""
+    if estimate_tokens(text, model) <= max_tokens:
+        return text
+    budget = max_tokens - estimate_tokens(TRUNCATION_MARKER, model)
+    if budget <= 0:
+        return ""
+
+    # Binary search on character length, since tokens per character vary
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid], model) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    cut = text[:low]
+
+    # Back off to a natural boundary if one is reasonably close
+    boundary = max(cut.rfind("\n"), cut.rfind(". "), cut.rfind("。"))
+    if boundary > len(cut) * 0.8:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+def compact_json(value: Any) -> str:
+    """JSON without indentation or ASCII escaping (fewer tokens than indent=2)"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def format_fields(content: Dict[str, Any]) -> str:
+    """Render a flat dict as `key: value` lines; non-string values as compact JSON"""
+    lines = []
+    for key, value in content.items():
+        if value in (None, "", [], {}):
+            continue
+        lines.append(f"{key}: {value if isinstance(value, str) else compact_json(value)}")
+    return "\n".join(lines)
+
+
+@dataclass
+class ContextSource:
+    name: str
+    text: str
+    priority: int  # Lower is more important
+    quota: Optional[int] = None  # Max tokens in the first allocation pass
+    tokens: int = 0
+    allocated: int = 0
+
+
+class ContextBudgeter:
+    """
+    Packs prioritized context sources into a token budget
+
+    Usage:
+        budgeter = ContextBudgeter(6000, model="gpt-3.5-turbo")
+        budgeter.add("content", text, priority=0)
+        budgeter.add("draft", draft_text, priority=1, quota=3000)
+        context = budgeter.pack()
+    """
+
+    def __init__(self, budget_tokens: int, model: Optional[str] = None):
+        self.budget_tokens = budget_tokens
+        self.model = model
+        self.sources: List[ContextSource] = []
+
+    def add(self, name: str, text: Optional[str], priority: int, quota: Optional[int] = None):
+        """Register a source; empty text is ignored"""
+        if not text:
+            return
+        self.sources.append(ContextSource(
+            name=name,
+            text=text,
+            priority=priority,
+            quota=quota,
+            tokens=estimate_tokens(text, self.model) + 1,  # +1 for the joining newline
+        ))
+
+    def _allocate(self):
+        remaining = self.budget_tokens
+        by_priority = sorted(self.sources, key=lambda source: source.priority)
+
+        # First pass: everyone up to their quota, most important first
+        for source in by_priority:
+            want = min(source.tokens, source.quota or source.tokens)
+            source.allocated = min(want, remaining)
+            remaining -= source.allocated
+
+        # Second pass: leftover budget to sources that were cut short
+        for source in by_priority:
+            if remaining <= 0:
+                break
+            extra = min(source.tokens - source.allocated, remaining)
+            source.allocated += extra
+            remaining -= extra
+
+    def pack(self) -> str:
+        """Return the packed context, sources in insertion order"""
+        self._allocate()
+        parts = []
+        for source in self.sources:
+            if source.allocated >= source.tokens:
+                parts.append(source.text)
+            elif source.allocated > 0:
+                text = truncate_to_tokens(source.text, source.allocated - 1, self.model)
+                if text:
+                    parts.append(text)
+        return "\n".join(parts)
+
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        """Tokens wanted vs. allocated per source (after pack())"""
+        return {
+            source.name: {"tokens": source.tokens, "allocated": source.allocated}
+            for source in self.sources
+        }
@@ -0,0 +1,147 @@
+"""
+Server-side AI assistant conversations
+
+Clients send only the new message; history lives in ai_conversations /
+ai_conversation_messages. Only the most recent turns are sent verbatim: once
+more than CHAT_COMPACT_AFTER_MESSAGES turns are unsummarized, all but the
+last CHAT_KEEP_RECENT_MESSAGES are folded into the conversation's rolling
+summary, which is sent in the system prompt instead.
+"""
+from typing import Dict, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.ai_conversation import AIConversation, AIConversationMessage
+from app.services.ai_service import ai_service
+
+
+def get_conversation(db: Session, user_id: int, disclosure_id: Optional[int]) -> Optional[AIConversation]:
+    """The user's conversation for a disclosure (or their general one when disclosure_id is None)"""
+    return db.query(AIConversation).filter(
+        AIConversation.user_id == user_id,
+        AIConversation.disclosure_id == disclosure_id if disclosure_id is not None else AIConversation.disclosure_id.is_(None),
+    ).order_by(AIConversation.id.desc()).first()
+
+
+def get_or_create_conversation(db: Session, user_id: int, disclosure_id: Optional[int]) -> AIConversation:
+    conversation = get_conversation(db, user_id, disclosure_id)
+    if conversation is None:
+        conversation = AIConversation(user_id=user_id, disclosure_id=disclosure_id, summarized_through_id=0)
+        db.add(conversation)
+        db.commit()
+        db.refresh(conversation)
+    return conversation
+
+
+def add_message(db: Session, conversation_id: int, role: str, content: str) -> AIConversationMessage:
+    message = AIConversationMessage(conversation_id=conversation_id, role=role, content=content)
+    db.add(message)
+    db.commit()
+    db.refresh(message)
+    return message
+
+
+def save_message(conversation_id: int, role: str, content: str):
+    """add_message() with its own session (for use after the request session is gone, e.g. in a stream)"""
+    db = SessionLocal()
+    try:
+        add_message(db, conversation_id, role, content)
+    finally:
+        db.close()
+
+
+def discard_message(message_id: int):
+    """
+    Remove a stored turn (e.g. the user's message when no reply was produced)
+
+    Uses its own session so it can run after the request session is gone.
+    """
+    db = SessionLocal()
+    try:
+        db.query(AIConversationMessage).filter(AIConversationMessage.id == message_id).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def recent_messages(db: Session, conversation: AIConversation) -> List[Dict[str, str]]:
+    """Turns not yet folded into the summary, capped at CHAT_COMPACT_AFTER_MESSAGES, as LLM messages"""
+    rows = db.query(AIConversationMessage).filter(
+        AIConversationMessage.conversation_id == conversation.id,
+        AIConversationMessage.id > conversation.summarized_through_id,
+    ).order_by(AIConversationMessage.id.desc()).limit(settings.CHAT_COMPACT_AFTER_MESSAGES).all()
+    messages = [{"role": row.role, "content": row.content} for row in reversed(rows)]
+
+    # Providers expect the conversation to open with a user turn
+    while messages and messages[0]["role"] != "user":
+        messages.pop(0)
+
+    # ...and to alternate roles: merge runs of the same role (e.g. a user turn
+    # stored by an older version whose reply was never saved)
+    merged: List[Dict[str, str]] = []
+    for message in messages:
+        if merged and merged[-1]["role"] == message["role"]:
+            merged[-1]["content"] = f"{merged[-1]['content']}\n\n{message['content']}"
+        else:
+            merged.append(message)
+    return merged
+
+
+def needs_compaction(db: Session, conversation: AIConversation) -> bool:
+    unsummarized = db.query(AIConversationMessage).filter(
+        AIConversationMessage.conversation_id == conversation.id,
+        AIConversationMessage.id > conversation.summarized_through_id,
+    ).count()
+    return unsummarized > settings.CHAT_COMPACT_AFTER_MESSAGES
+
+
+def _turns_to_fold(conversation_id: int):
+    """(summary, summarized_through_id, last folded message id, turns) for everything but the most recent turns"""
+    db = SessionLocal()
+    try:
+        conversation = db.query(AIConversation).filter(AIConversation.id == conversation_id).first()
+        if not conversation:
+            return None
+        rows = db.query(AIConversationMessage).filter(
+            AIConversationMessage.conversation_id == conversation_id,
+            AIConversationMessage.id > conversation.summarized_through_id,
+        ).order_by(AIConversationMessage.id.asc()).all()
+        fold = rows[:-settings.CHAT_KEEP_RECENT_MESSAGES] if settings.CHAT_KEEP_RECENT_MESSAGES else rows
+        if not fold:
+            return None
+        turns = [{"role": row.role, "content": row.content} for row in fold]
+        return conversation.summary, conversation.summarized_through_id, fold[-1].id, turns
+    finally:
+        db.close()
+
+
+def _store_summary(conversation_id: int, expected_through_id: int, through_id: int, summary: str):
+    db = SessionLocal()
+    try:
+        # Only apply if no concurrent compaction got there first
+        db.query(AIConversation).filter(
+            AIConversation.id == conversation_id,
+            AIConversation.summarized_through_id == expected_through_id,
+        ).update(
+            {AIConversation.summary: summary, AIConversation.summarized_through_id: through_id},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def compact_conversation(conversation_id: int):
+    """Fold older turns into the rolling summary (run as a background task after responding)"""
+    state = await run_in_threadpool(_turns_to_fold, conversation_id)
+    if state is None:
+        return
+    previous_summary, expected_through_id, through_id, turns = state
+    try:
+        summary = await ai_service.summarize_conversation_async(previous_summary, turns)
+    except Exception as e:
+        # Try again after the next turn; recent_messages() caps the prompt meanwhile
+        print(f"⚠️  Conversation {conversation_id} compaction failed: {e}")
+        return
+    await run_in_threadpool(_store_summary, conversation_id, expected_through_id, through_id, summary)
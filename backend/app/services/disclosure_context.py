@@ -0,0 +1,235 @@
+"""
+Cached disclosure context snapshots for the chat assistant
+
+A snapshot holds everything the assistant prompt is built from (rendered
+header and content, draft text, file list, attachment text) so follow-up
+chat turns do not re-query the draft, files or stored document text.
+
+Snapshots are keyed by the disclosure id plus a version key made of
+Disclosure.updated_at, the draft's id/updated_at and the count and highest
+id of the disclosure's files. Writes can come from other processes (e.g. the
+AI worker saving draft sections), so every hit is checked: updated_at against
+the disclosure the caller already loaded, the rest with one column-only
+query, and the snapshot is rebuilt only if something changed. Endpoints that
+write also call invalidate(), which forces a rebuild even if a write left
+the key unchanged.
+
+Attachment text is carried over between snapshots since uploaded files
+never change.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.disclosure import Disclosure, DisclosureVersion
+from app.models.file import File
+from app.models.patent_draft import PatentDraft
+from app.services.context_budget import format_fields
+from app.services.document_text import get_file_preview, get_file_text, is_extractable
+
+
+def draft_as_text(draft: Optional[PatentDraft]) -> Optional[str]:
+    """Draft as plain text: full_text if available (this is what the lawyer edits), else the sections"""
+    if not draft:
+        return None
+    if draft.full_text:
+        return draft.full_text
+    if draft.sections:
+        section_parts = []
+        for section_name, section_content in draft.sections.items():
+            section_parts.append(f"--- {section_name.upper()} ---")
+            if isinstance(section_content, list):
+                section_parts.append("\n".join(section_content))
+            else:
+                section_parts.append(str(section_content))
+        return "\n".join(section_parts)
+    return None
+
+
+@dataclass
+class FileInfo:
+    id: int
+    filename: str
+    description: str  # "name (type, size bytes)"
+    has_text: bool  # PDF/DOCX whose text can be extracted
+
+
+@dataclass
+class DisclosureContextSnapshot:
+    """Pre-rendered context sources for one version of a disclosure"""
+    disclosure_id: int
+    version_key: tuple
+    header: str
+    content_text: Optional[str]
+    draft_text: Optional[str]
+    draft_fingerprint: Optional[str]
+    files: List[FileInfo]
+    latest_version: Optional[Tuple[int, str]]  # (version number, rendered content snapshot)
+    stale: bool = False  # Set by invalidate()
+    _file_texts: Dict[int, Optional[str]] = field(default_factory=dict)
+    _file_previews: Dict[Tuple[int, int], Optional[str]] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def file_text(self, file_id: int) -> Optional[str]:
+        """Full text of a PDF/DOCX attachment (loaded from document_texts once, then kept)"""
+        with self._lock:
+            if file_id in self._file_texts:
+                return self._file_texts[file_id]
+        text = None
+        info = next((f for f in self.files if f.id == file_id), None)
+        if info and info.has_text:
+            db = SessionLocal()
+            try:
+                f = db.query(File).filter(File.id == file_id).first()
+                text = get_file_text(db, f) if f else None
+            except Exception as e:
+                print(f"⚠️  Could not extract text from file {file_id}: {e}")
+            finally:
+                db.close()
+        with self._lock:
+            self._file_texts[file_id] = text
+        return text
+
+    def file_preview(self, file_id: int, max_chars: int) -> Optional[str]:
+        """First `max_chars` of an attachment's text, without parsing the rest of the document"""
+        key = (file_id, max_chars)
+        with self._lock:
+            if file_id in self._file_texts:
+                text = self._file_texts[file_id]
+                return text[:max_chars] if text else text
+            if key in self._file_previews:
+                return self._file_previews[key]
+        preview = None
+        info = next((f for f in self.files if f.id == file_id), None)
+        if info and info.has_text:
+            db = SessionLocal()
+            try:
+                f = db.query(File).filter(File.id == file_id).first()
+                preview = get_file_preview(db, f, max_chars=max_chars) if f else None
+            except Exception as e:
+                print(f"⚠️  Could not extract text from file {file_id}: {e}")
+            finally:
+                db.close()
+        with self._lock:
+            self._file_previews[key] = preview
+        return preview
+
+
+def _version_key(db: Session, disclosure: Disclosure) -> tuple:
+    """(Disclosure.updated_at, draft id, draft updated_at, file count, highest file id), in one query"""
+    of_draft = PatentDraft.disclosure_id == disclosure.id
+    of_files = File.disclosure_id == disclosure.id
+    # Files are only ever added (with a higher id) or deleted, so count + max id detects any change
+    row = db.execute(select(
+        select(PatentDraft.id).where(of_draft).scalar_subquery(),
+        select(PatentDraft.updated_at).where(of_draft).scalar_subquery(),
+        select(func.count(File.id)).where(of_files).scalar_subquery(),
+        select(func.max(File.id)).where(of_files).scalar_subquery(),
+    )).one()
+    return (disclosure.updated_at, *row)
+
+
+def _build_snapshot(db: Session, disclosure: Disclosure, version_key: tuple) -> DisclosureContextSnapshot:
+    draft = db.query(PatentDraft).filter(PatentDraft.disclosure_id == disclosure.id).first()
+    files = db.query(File).filter(File.disclosure_id == disclosure.id).order_by(File.id).all()
+    latest_version = db.query(DisclosureVersion).filter(
+        DisclosureVersion.disclosure_id == disclosure.id
+    ).order_by(DisclosureVersion.version_number.desc()).first()
+
+    draft_text = draft_as_text(draft)
+    return DisclosureContextSnapshot(
+        disclosure_id=disclosure.id,
+        version_key=version_key,
+        header=f"=== CURRENT DISCLOSURE ===\nTitle: {disclosure.title}\nStatus: {disclosure.status.value}",
+        content_text=f"Content:\n{format_fields(disclosure.content)}" if disclosure.content else None,
+        draft_text=draft_text,
+        draft_fingerprint=hashlib.sha1(draft_text.encode("utf-8")).hexdigest() if draft_text else None,
+        files=[
+            FileInfo(
+                id=f.id,
+                filename=f.original_filename,
+                description=f"{f.original_filename} ({f.file_type.value}, {f.file_size} bytes)",
+                has_text=is_extractable(f.file_extension),
+            )
+            for f in files
+        ],
+        latest_version=(
+            (latest_version.version_number, format_fields(latest_version.content_snapshot or {}))
+            if latest_version else None
+        ),
+    )
+
+
+class DisclosureContextCache:
+    """LRU of context snapshots, at most CHAT_CONTEXT_CACHE_SIZE disclosures"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[int, DisclosureContextSnapshot]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, disclosure: Disclosure) -> DisclosureContextSnapshot:
+        """
+        Snapshot for the disclosure's current version (built if missing or stale)
+
+        The caller has already loaded (and permission-checked) the disclosure.
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(disclosure.id)
+            if snapshot:
+                self._snapshots.move_to_end(disclosure.id)
+
+        version_key = None
+        # A changed disclosure needs no query to detect; the draft and files take one
+        if snapshot and not snapshot.stale and snapshot.version_key[0] == disclosure.updated_at:
+            version_key = _version_key(db, disclosure)
+            if snapshot.version_key == version_key:
+                self.hits += 1
+                return snapshot
+        version_key = version_key or _version_key(db, disclosure)
+
+        self.misses += 1
+        fresh = _build_snapshot(db, disclosure, version_key)
+        if snapshot:
+            # Attachments are immutable: keep text already loaded
+            kept_ids = {f.id for f in fresh.files}
+            fresh._file_texts.update({
+                file_id: text for file_id, text in snapshot._file_texts.items() if file_id in kept_ids
+            })
+
+        with self._lock:
+            self._snapshots[disclosure.id] = fresh
+            self._snapshots.move_to_end(disclosure.id)
+            while len(self._snapshots) > settings.CHAT_CONTEXT_CACHE_SIZE:
+                self._snapshots.popitem(last=False)
+        return fresh
+
+    def invalidate(self, disclosure_id: int):
+        """
+        Force the next get() to rebuild the snapshot
+
+        The snapshot is kept (marked stale rather than dropped) so loaded
+        attachment text survives edits to the disclosure or draft.
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(disclosure_id)
+            if snapshot:
+                snapshot.stale = True
+
+    def drop(self, disclosure_id: int):
+        """Forget a disclosure entirely (e.g. when it is deleted)"""
+        with self._lock:
+            self._snapshots.pop(disclosure_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"snapshots": len(self._snapshots), "hits": self.hits, "misses": self.misses}
+
+
+# Global cache instance
+disclosure_context_cache = DisclosureContextCache()
@@ -0,0 +1,38 @@
+"""
+Disclosure content diffing
+
+Maps edits to disclosure content fields onto the patent draft sections they
+feed, so an update only regenerates the affected sections.
+"""
+from typing import Any, Dict, List, Optional
+from app.services.ai_service import DRAFT_SECTIONS
+
+# Disclosure content field -> draft sections that depend on it
+FIELD_SECTION_MAP: Dict[str, List[str]] = {
+    "problem": ["background", "summary", "abstract"],
+    "solution": ["summary", "detailed_description", "claims", "abstract"],
+    "technical_details": ["detailed_description", "claims"],
+    "advantages": ["summary"],
+    "prior_art": ["background"],
+}
+
+
+def changed_fields(old_content: Optional[Dict[str, Any]], new_content: Optional[Dict[str, Any]]) -> List[str]:
+    """Return the content fields whose values differ between two snapshots"""
+    old_content = old_content or {}
+    new_content = new_content or {}
+    fields = set(old_content) | set(new_content)
+    return sorted(field for field in fields if old_content.get(field) != new_content.get(field))
+
+
+def affected_sections(old_content: Optional[Dict[str, Any]], new_content: Optional[Dict[str, Any]]) -> List[str]:
+    """
+    Return the draft sections that must be regenerated after a content edit
+
+    Fields without a known mapping affect every section. The result is in
+    document order and empty if nothing changed.
+    """
+    sections = set()
+    for field in changed_fields(old_content, new_content):
+        sections.update(FIELD_SECTION_MAP.get(field, DRAFT_SECTIONS))
+    return [section for section in DRAFT_SECTIONS if section in sections]
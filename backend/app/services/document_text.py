@@ -0,0 +1,267 @@
+"""
+Extracted document text, stored once per file content
+
+Uploaded PDFs and DOCX files are parsed by an EXTRACT_TEXT job after upload
+and the text is stored in document_texts under the SHA-256 of the file bytes
+(File.content_hash), with the character offset of every page. Chat context,
+anything else that needs an attachment's text reads the stored row instead
+of parsing the file again; identical uploads share one row. Documents that
+are not attachments (patent analysis) reuse a stored row when there is one
+but are never stored.
+
+Files uploaded before ingestion existed (or read before their job has run)
+are extracted on first use and stored the same way. Callers that only need
+the beginning of a document use the *_preview functions, which stop parsing
+once their character or token budget is filled.
+"""
+import hashlib
+import io
+import zipfile
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+from xml.etree import ElementTree
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.document_text import DocumentText
+from app.models.file import File
+from app.services.context_budget import estimate_tokens
+from app.services.pdf_extraction import iter_pdf_pages, pdf_extraction_engine
+from app.services.storage import file_key, storage_for
+
+# Extensions we can extract text from
+EXTRACTABLE_EXTENSIONS = {".pdf", ".docx"}
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+@dataclass
+class ExtractedText:
+    """Text of a document with the offset where each page starts"""
+    text: str
+    extractor: str
+    page_offsets: List[int] = field(default_factory=lambda: [0])
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_offsets)
+
+
+def compute_content_hash(data: bytes) -> str:
+    """SHA-256 hex digest used as File.content_hash"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_extractable(extension: str) -> bool:
+    return extension.lower() in EXTRACTABLE_EXTENSIONS
+
+
+def extract_pdf(source: Union[str, bytes], max_pages: Optional[int] = None) -> ExtractedText:
+    """
+    Extract text from a PDF in the extraction process pool
+
+    Args:
+        source: File path or the PDF bytes
+        max_pages: Only read the first N pages (all pages if None)
+    """
+    pages, extractor = pdf_extraction_engine.extract_pages(source, max_pages)
+    offsets, length = [], 0
+    for page_text in pages:
+        offsets.append(length)
+        length += len(page_text)
+    return ExtractedText(text="".join(pages), extractor=extractor, page_offsets=offsets or [0])
+
+
+def _clip(text: str, max_chars: Optional[int], max_tokens: Optional[int]) -> str:
+    if max_chars is not None:
+        text = text[:max_chars]
+    if max_tokens is not None and estimate_tokens(text) > max_tokens:
+        # Heuristic tokens are at least a character each, so this cut is never too short
+        text = text[:max_tokens * 4]
+        while text and estimate_tokens(text) > max_tokens:
+            text = text[:int(len(text) * 0.9)]
+    return text
+
+
+def extract_pdf_preview(
+    source: Union[str, bytes],
+    max_chars: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> str:
+    """
+    Text from the start of a PDF, parsing only as many pages as the budget needs
+
+    Args:
+        source: File path or the PDF bytes
+        max_chars: Stop once this many characters are collected
+        max_tokens: Stop once this many tokens (estimated) are collected
+    """
+    parts, chars, tokens = [], 0, 0
+    for page_text in iter_pdf_pages(source):
+        parts.append(page_text)
+        chars += len(page_text)
+        if max_tokens is not None:
+            tokens += estimate_tokens(page_text)
+        if (max_chars is not None and chars >= max_chars) or (max_tokens is not None and tokens >= max_tokens):
+            break
+    return _clip("".join(parts), max_chars, max_tokens)
+
+
+def extract_docx(source: Union[str, bytes]) -> ExtractedText:
+    """
+    Extract paragraph text from a DOCX (no external dependencies)
+
+    Explicit page breaks become page boundaries; otherwise the document is one page.
+    """
+    with zipfile.ZipFile(io.BytesIO(source) if isinstance(source, bytes) else source) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+
+    parts, offsets, length = [], [0], 0
+    for paragraph in root.iter(f"{_WORD_NS}p"):
+        line = []
+        for node in paragraph.iter():
+            if node.tag == f"{_WORD_NS}t" and node.text:
+                line.append(node.text)
+            elif node.tag == f"{_WORD_NS}tab":
+                line.append("\t")
+            elif node.tag == f"{_WORD_NS}br":
+                if node.get(f"{_WORD_NS}type") == "page":
+                    text = "".join(line)
+                    parts.append(text + "\n")
+                    length += len(text) + 1
+                    offsets.append(length)
+                    line = []
+                else:
+                    line.append("\n")
+        text = "".join(line) + "\n"
+        parts.append(text)
+        length += len(text)
+
+    return ExtractedText(text="".join(parts), extractor="docx", page_offsets=offsets)
+
+
+def extract_document(source: Union[str, bytes], extension: str) -> ExtractedText:
+    """
+    Extract text from a PDF or DOCX
+
+    Raises:
+        ValueError: If the extension is not supported
+    """
+    extension = extension.lower()
+    if extension == ".pdf":
+        return extract_pdf(source)
+    if extension == ".docx":
+        return extract_docx(source)
+    raise ValueError(f"Text extraction not supported for {extension} files")
+
+
+def get_document_text(db: Session, content_hash: Optional[str]) -> Optional[DocumentText]:
+    if not content_hash:
+        return None
+    return db.query(DocumentText).filter(DocumentText.content_hash == content_hash).first()
+
+
+def store_document_text(db: Session, content_hash: str, extracted: ExtractedText) -> DocumentText:
+    """Insert the extracted text (a concurrent insert of the same content wins)"""
+    document = DocumentText(
+        content_hash=content_hash,
+        text=extracted.text,
+        page_offsets=extracted.page_offsets,
+        page_count=extracted.page_count,
+        extractor=extracted.extractor,
+    )
+    db.add(document)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return get_document_text(db, content_hash)
+    return document
+
+
+def ingest_bytes(db: Session, data: bytes, extension: str, source: Union[str, bytes, None] = None) -> DocumentText:
+    """
+    Stored text for a document, extracting it only if this content is new
+
+    Args:
+        data: File bytes (hashed to find an existing extraction, and parsed in memory)
+        extension: File extension, e.g. ".pdf"
+        source: Path to parse instead of `data` (optional, e.g. a file already on disk)
+    """
+    content_hash = compute_content_hash(data)
+    document = get_document_text(db, content_hash)
+    if document:
+        return document
+    return store_document_text(db, content_hash, extract_document(source or data, extension))
+
+
+def read_document_text(db: Session, data: bytes, extension: str) -> str:
+    """
+    Text of a document that is not an attachment (e.g. a PDF sent for analysis)
+
+    Uses the stored text if this content was ingested as an attachment, but
+    never stores anything: rows for such documents would have no File
+    referencing them and would never be cleaned up.
+    """
+    document = get_document_text(db, compute_content_hash(data))
+    if document:
+        return document.text
+    return extract_document(data, extension).text
+
+
+def ingest_file(db: Session, f: File) -> Optional[DocumentText]:
+    """
+    Extract and store the text of an uploaded file (no-op if already stored)
+
+    Also fills in File.content_hash for files uploaded before it existed.
+
+    Returns:
+        The stored text, or None if the file type is not extractable or the file is missing
+    """
+    if not is_extractable(f.file_extension):
+        return None
+
+    document = get_document_text(db, f.content_hash)
+    if document:
+        return document
+
+    storage, key = storage_for(f), file_key(f)
+    if not storage.exists(key):
+        return None
+    data = storage.read(key)
+
+    if not f.content_hash:
+        f.content_hash = compute_content_hash(data)
+        db.commit()
+    return ingest_bytes(db, data, f.file_extension, source=storage.local_path(key))
+
+
+def get_file_text(db: Session, f: File) -> Optional[str]:
+    """Text of an uploaded file, extracted now if ingestion has not stored it yet"""
+    document = get_document_text(db, f.content_hash) or ingest_file(db, f)
+    return document.text if document else None
+
+
+def get_file_preview(
+    db: Session,
+    f: File,
+    max_chars: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> Optional[str]:
+    """
+    Beginning of an uploaded file's text within a character/token budget
+
+    Uses the stored text when ingestion has run; otherwise reads only the
+    first pages of a PDF (the ingestion job still stores the full text).
+    """
+    if not is_extractable(f.file_extension):
+        return None
+    document = get_document_text(db, f.content_hash)
+    if document:
+        return _clip(document.text, max_chars, max_tokens)
+
+    if f.file_extension.lower() == ".pdf":
+        storage, key = storage_for(f), file_key(f)
+        if storage.exists(key):
+            return extract_pdf_preview(storage.local_path(key) or storage.read(key), max_chars, max_tokens)
+    text = get_file_text(db, f)
+    return _clip(text, max_chars, max_tokens) if text is not None else None
@@ -0,0 +1,194 @@
+"""
+Content-addressed LLM response cache
+
+Completions are stored in the database under a SHA-256 of everything that
+determines the output (provider, model, temperature, system prompt, messages),
+so byte-identical requests are answered without calling the provider. Routed
+calls key on every (provider, model) pair the tier can be routed to, so a
+provider or model change starts a fresh cache. Hits report the provider and
+model that originally produced the text. Entries
+expire after LLM_CACHE_TTL_SECONDS and the least recently used ones are evicted
+once the table exceeds LLM_CACHE_MAX_ENTRIES or LLM_CACHE_MAX_MB.
+
+Cache failures never fail a request; they are treated as misses.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql import func
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.llm_cache import LLMCacheEntry
+
+
+@dataclass
+class CachedResponse:
+    """A cached completion and the provider/model that produced it"""
+    text: str
+    provider: str
+    model: str
+
+
+class LLMCache:
+    """Database-backed LLM response cache with TTL and LRU eviction"""
+
+    def __init__(self):
+        self.enabled = settings.LLM_CACHE_ENABLED
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @staticmethod
+    def make_key(
+        provider: str,
+        model: str,
+        temperature: float,
+        system: Optional[str],
+        messages: List[Dict[str, str]],
+        **options: Any,
+    ) -> str:
+        """Hash the fully rendered request into a cache key"""
+        request = {
+            "provider": provider,
+            "model": model,
+            "temperature": temperature,
+            "system": system,
+            "messages": messages,
+            "options": options,
+        }
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Return the cached response, or None on miss"""
+        if not self.enabled:
+            return None
+
+        db = SessionLocal()
+        try:
+            entry = (
+                db.query(LLMCacheEntry)
+                .filter(LLMCacheEntry.cache_key == key, LLMCacheEntry.expires_at > func.now())
+                .first()
+            )
+            if entry is None:
+                self._count("misses")
+                return None
+
+            response = CachedResponse(entry.response, entry.provider, entry.model)
+            entry.hit_count += 1
+            entry.last_accessed_at = func.now()
+            db.commit()
+            self._count("hits")
+            return response
+        except SQLAlchemyError:
+            db.rollback()
+            self._count("errors")
+            return None
+        finally:
+            db.close()
+
+    def set(self, key: str, provider: str, model: str, response: str):
+        """Store a response and evict expired / least recently used entries if over limits"""
+        if not self.enabled or response is None:
+            return
+
+        db = SessionLocal()
+        try:
+            db.merge(LLMCacheEntry(
+                cache_key=key,
+                provider=provider,
+                model=model,
+                response=response,
+                size_bytes=len(response.encode("utf-8")),
+                hit_count=0,
+                last_accessed_at=func.now(),
+                expires_at=func.now() + timedelta(seconds=settings.LLM_CACHE_TTL_SECONDS),
+            ))
+            db.commit()
+            self._evict(db)
+        except SQLAlchemyError:
+            # e.g. a concurrent writer inserted the same key first
+            db.rollback()
+            self._count("errors")
+        finally:
+            db.close()
+
+    def _evict(self, db):
+        """Drop expired entries, then least recently used ones until under the size limits"""
+        db.query(LLMCacheEntry).filter(LLMCacheEntry.expires_at <= func.now()).delete(synchronize_session=False)
+        db.commit()
+
+        entry_count, total_bytes = db.query(
+            func.count(LLMCacheEntry.cache_key), func.coalesce(func.sum(LLMCacheEntry.size_bytes), 0)
+        ).one()
+        max_bytes = settings.LLM_CACHE_MAX_MB * 1024 * 1024
+        if entry_count <= settings.LLM_CACHE_MAX_ENTRIES and total_bytes <= max_bytes:
+            return
+
+        evict_keys = []
+        for cache_key, size_bytes in (
+            db.query(LLMCacheEntry.cache_key, LLMCacheEntry.size_bytes)
+            .order_by(LLMCacheEntry.last_accessed_at.asc())
+            .all()
+        ):
+            if entry_count <= settings.LLM_CACHE_MAX_ENTRIES and total_bytes <= max_bytes:
+                break
+            evict_keys.append(cache_key)
+            entry_count -= 1
+            total_bytes -= size_bytes
+
+        if evict_keys:
+            db.query(LLMCacheEntry).filter(LLMCacheEntry.cache_key.in_(evict_keys)).delete(synchronize_session=False)
+            db.commit()
+
+    async def get_async(self, key: str) -> Optional[CachedResponse]:
+        """get() without blocking the event loop"""
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, provider: str, model: str, response: str):
+        """set() without blocking the event loop"""
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self.set, key, provider, model, response)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus current table size"""
+        lookups = self.hits + self.misses
+        stats = {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+        db = SessionLocal()
+        try:
+            entry_count, total_bytes = db.query(
+                func.count(LLMCacheEntry.cache_key), func.coalesce(func.sum(LLMCacheEntry.size_bytes), 0)
+            ).one()
+            stats["entries"] = entry_count
+            stats["size_bytes"] = int(total_bytes)
+        except SQLAlchemyError:
+            pass
+        finally:
+            db.close()
+
+        return stats
+
+
+# Global cache instance
+llm_cache = LLMCache()
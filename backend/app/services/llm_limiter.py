@@ -0,0 +1,376 @@
+"""
+LLM concurrency and rate limiting
+
+Every provider call made by the router passes through one shared limiter:
+
+- concurrency caps per provider and per provider model
+- request and token budgets per provider model (token buckets refilled per minute)
+- adaptive backoff on 429s: the model is paused for the provider's
+  Retry-After (or an exponential delay) and its concurrency is halved, then
+  grown back one slot at a time as calls succeed
+
+Callers over a limit wait in line instead of failing, and rate-limited calls
+are retried after the backoff. The line is first come, first served per
+provider: a caller cannot overtake an earlier one for the same model, or one
+waiting for a provider slot, so a long-waiting drafting call is not starved
+by a stream of chat calls. Releases wake the waiters directly. Waits are
+recorded for /metrics.
+
+The core is guarded by a thread lock so sync callers (threads) and async
+callers (event loops) share the same budgets.
+"""
+import asyncio
+import math
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.core.config import settings
+
+# Longest a queued caller sleeps before re-checking on its own (a safety
+# net; releases and budget-timed waiters wake the line directly)
+_MAX_WAIT_SECONDS = 1.0
+
+
+def estimate_tokens(messages: List[Dict[str, str]], system: Optional[str], max_tokens: int) -> int:
+    """Rough request size for the token budget (~4 characters per token, plus the output cap)"""
+    chars = len(system or "") + sum(len(msg.get("content") or "") for msg in messages)
+    return chars // 4 + max_tokens
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Recognize 429 / quota errors from any provider SDK"""
+    if getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429:
+        return True
+    return type(error).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests")
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry-After from the provider response, if it sent one"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class _TokenBucket:
+    """Refills `per_minute` units per minute, up to one minute's worth"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def take(self, amount: float):
+        self.available -= min(amount, self.capacity)
+
+
+class _Limit:
+    """State for one limiter key (a provider, or a provider model)"""
+
+    def __init__(self, max_concurrency: int, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency  # Current (adaptive) cap
+        self.in_flight = 0
+        self.requests = _TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = _TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.blocked_until = 0.0
+        self.consecutive_rate_limits = 0
+        self.successes_since_cut = 0
+        # Metrics
+        self.queued = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.rate_limited = 0
+
+    def wait_for(self, tokens: int, now: float) -> float:
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.in_flight >= self.concurrency:
+            # Until a release wakes the line
+            return math.inf
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.wait_for(1, now))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_for(tokens, now))
+        return wait
+
+    def take(self, tokens: int):
+        self.in_flight += 1
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "concurrency": self.concurrency,
+            "max_concurrency": self.max_concurrency,
+            "queued": self.queued,
+            "waits": self.waits,
+            "avg_wait_seconds": round(self.total_wait / self.waits, 4) if self.waits else 0.0,
+            "max_wait_seconds": round(self.max_wait, 4),
+            "rate_limited": self.rate_limited,
+            "backoff_seconds": round(max(0.0, self.blocked_until - now), 2),
+        }
+
+
+class _Waiter:
+    """A queued caller; wake() may be called from any thread"""
+
+    def __init__(self, model: str):
+        self.model = model
+        # Whether its last check found the provider's concurrency cap full
+        self.needs_provider_slot = False
+
+    def wake(self):
+        raise NotImplementedError
+
+
+class _ThreadWaiter(_Waiter):
+    def __init__(self, model: str):
+        super().__init__(model)
+        self._event = threading.Event()
+
+    def wake(self):
+        self._event.set()
+
+    def wait(self, timeout: float):
+        self._event.wait(timeout)
+        # Cleared before the caller re-checks, so a wake during the check is not lost
+        self._event.clear()
+
+
+class _AsyncWaiter(_Waiter):
+    def __init__(self, model: str):
+        super().__init__(model)
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def wake(self):
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            pass  # Loop closed; the caller is gone
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
+
+
+class LLMLimiter:
+    """Shared limiter for all LLM provider calls"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limits: Dict[str, _Limit] = {}
+        # provider -> queued callers, oldest first
+        self._waiters: Dict[str, List[_Waiter]] = {}
+
+    def _limits_for(self, provider: str, model: str) -> List[_Limit]:
+        """[provider limit, model limit], created on first use"""
+        model_key = f"{provider}:{model}"
+        if provider not in self._limits:
+            self._limits[provider] = _Limit(settings.LLM_MAX_CONCURRENCY_PER_PROVIDER)
+        if model_key not in self._limits:
+            self._limits[model_key] = _Limit(
+                settings.LLM_MAX_CONCURRENCY_PER_MODEL,
+                requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+                tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+            )
+        return [self._limits[provider], self._limits[model_key]]
+
+    def _wake(self, provider: str):
+        # Called with the lock held
+        for waiter in self._waiters.get(provider, ()):
+            waiter.wake()
+
+    def _try_acquire(self, provider: str, model: str, tokens: int, waiter: _Waiter) -> float:
+        """
+        Take a slot and budget if all limits allow it and it is the caller's turn
+
+        Otherwise the caller joins (or stays in) the line and gets back how
+        long to wait (inf = until woken).
+        """
+        with self._lock:
+            now = time.monotonic()
+            queue = self._waiters.setdefault(provider, [])
+            ahead = queue[:queue.index(waiter)] if waiter in queue else queue
+            if any(other.model == model or other.needs_provider_slot for other in ahead):
+                wait = math.inf
+                waiter.needs_provider_slot = False
+            else:
+                limits = self._limits_for(provider, model)
+                wait = max(limit.wait_for(tokens, now) for limit in limits)
+                waiter.needs_provider_slot = limits[0].in_flight >= limits[0].concurrency
+            if wait > 0:
+                if waiter not in queue:
+                    queue.append(waiter)
+                return wait
+
+            for limit in limits:
+                limit.take(tokens)
+            if waiter in queue:
+                queue.remove(waiter)
+                # The next in line may be able to go as well
+                self._wake(provider)
+            return 0.0
+
+    def _leave(self, provider: str, waiter: _Waiter):
+        """Drop a caller that stopped waiting (e.g. cancelled) from the line"""
+        with self._lock:
+            queue = self._waiters.get(provider, [])
+            if waiter in queue:
+                queue.remove(waiter)
+                self._wake(provider)
+
+    def _set_queued(self, provider: str, model: str, delta: int):
+        with self._lock:
+            for limit in self._limits_for(provider, model):
+                limit.queued += delta
+
+    def _record_wait(self, provider: str, model: str, waited: float):
+        with self._lock:
+            for limit in self._limits_for(provider, model):
+                limit.waits += 1
+                limit.total_wait += waited
+                limit.max_wait = max(limit.max_wait, waited)
+
+    def acquire(self, provider: str, model: str, tokens: int):
+        """Block the calling thread until the call may start"""
+        started = time.monotonic()
+        waiter = _ThreadWaiter(model)
+        wait = self._try_acquire(provider, model, tokens, waiter)
+        if wait:
+            self._set_queued(provider, model, 1)
+            try:
+                while wait:
+                    waiter.wait(min(wait, _MAX_WAIT_SECONDS))
+                    wait = self._try_acquire(provider, model, tokens, waiter)
+            finally:
+                self._set_queued(provider, model, -1)
+                self._leave(provider, waiter)
+        self._record_wait(provider, model, time.monotonic() - started)
+
+    async def acquire_async(self, provider: str, model: str, tokens: int):
+        """Wait (without blocking the event loop) until the call may start"""
+        started = time.monotonic()
+        waiter = _AsyncWaiter(model)
+        wait = self._try_acquire(provider, model, tokens, waiter)
+        if wait:
+            self._set_queued(provider, model, 1)
+            try:
+                while wait:
+                    await waiter.wait(min(wait, _MAX_WAIT_SECONDS))
+                    wait = self._try_acquire(provider, model, tokens, waiter)
+            finally:
+                self._set_queued(provider, model, -1)
+                self._leave(provider, waiter)
+        self._record_wait(provider, model, time.monotonic() - started)
+
+    def release(self, provider: str, model: str, rate_limit_error: Optional[Exception] = None):
+        """
+        Free the slot taken by acquire()
+
+        Pass the 429 error if the call was rate limited, to back off that model.
+        """
+        with self._lock:
+            provider_limit, model_limit = self._limits_for(provider, model)
+            provider_limit.in_flight -= 1
+            model_limit.in_flight -= 1
+            self._wake(provider)
+
+            if rate_limit_error is None:
+                model_limit.consecutive_rate_limits = 0
+                model_limit.successes_since_cut += 1
+                # Additive increase: one slot back per `concurrency` successes
+                if model_limit.concurrency < model_limit.max_concurrency and model_limit.successes_since_cut >= model_limit.concurrency:
+                    model_limit.concurrency += 1
+                    model_limit.successes_since_cut = 0
+                return
+
+            # Multiplicative decrease and pause
+            model_limit.rate_limited += 1
+            model_limit.consecutive_rate_limits += 1
+            model_limit.concurrency = max(1, model_limit.concurrency // 2)
+            model_limit.successes_since_cut = 0
+            delay = retry_after_seconds(rate_limit_error)
+            if delay is None:
+                delay = min(settings.LLM_RATE_LIMIT_MAX_BACKOFF_SECONDS, 2 ** (model_limit.consecutive_rate_limits - 1))
+            model_limit.blocked_until = max(model_limit.blocked_until, time.monotonic() + delay)
+
+    def backoff_remaining(self, provider: str, model: str) -> float:
+        """Seconds until a rate-limited model accepts calls again"""
+        with self._lock:
+            return max(0.0, self._limits_for(provider, model)[1].blocked_until - time.monotonic())
+
+    def call(self, provider: str, model: str, tokens: int, fn: Callable[[], Any]) -> Any:
+        """Run fn() within the limits, retrying after backoff when rate limited"""
+        for attempt in range(settings.LLM_RATE_LIMIT_MAX_RETRIES + 1):
+            self.acquire(provider, model, tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    self.release(provider, model)
+                    raise
+                self.release(provider, model, rate_limit_error=e)
+                if attempt == settings.LLM_RATE_LIMIT_MAX_RETRIES:
+                    raise
+                continue
+            self.release(provider, model)
+            return result
+
+    async def call_async(self, provider: str, model: str, tokens: int, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async version of call(); fn is a coroutine factory"""
+        for attempt in range(settings.LLM_RATE_LIMIT_MAX_RETRIES + 1):
+            await self.acquire_async(provider, model, tokens)
+            try:
+                result = await fn()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    self.release(provider, model)
+                    raise
+                self.release(provider, model, rate_limit_error=e)
+                if attempt == settings.LLM_RATE_LIMIT_MAX_RETRIES:
+                    raise
+                continue
+            except BaseException:
+                # Cancelled (e.g. a losing hedge): free the slot
+                self.release(provider, model)
+                raise
+            self.release(provider, model)
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue depth, wait times and backoff state per provider and model"""
+        with self._lock:
+            now = time.monotonic()
+            return {key: limit.snapshot(now) for key, limit in self._limits.items()}
+
+
+# Global limiter instance
+llm_limiter = LLMLimiter()
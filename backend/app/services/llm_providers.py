@@ -0,0 +1,367 @@
+"""
+LLM provider adapters
+
+Each provider wraps one vendor SDK behind the same interface, with a sync
+client (for threadpool endpoints and workers) and a native async client (for
+async endpoints). HTTP clients are created lazily and shared, so connection
+pools and timeouts are configured in one place.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+import weakref
+from typing import AsyncIterator, Dict, List, Optional
+import httpx
+from app.core.config import settings
+
+# Model tiers: "quality" for drafting/analysis, "fast" for chat and summaries
+PROVIDER_MODELS: Dict[str, Dict[str, str]] = {
+    "openai": {"quality": "gpt-4-turbo-preview", "fast": "gpt-3.5-turbo"},
+    "anthropic": {"quality": "claude-3-opus-20240229", "fast": "claude-3-haiku-20240307"},
+    "gemini": {"quality": "gemini-2.5-flash", "fast": "gemini-2.0-flash"},
+    "fake": {"quality": "fake-quality", "fast": "fake-fast"},
+}
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.LLM_REQUEST_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS)
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    )
+
+
+class LLMProvider:
+    """
+    Base class for LLM provider adapters
+
+    Messages use the OpenAI shape: [{"role": "user"|"assistant", "content": str}].
+    The system prompt is passed separately because each vendor places it differently.
+    """
+
+    name: str = ""
+
+    def __init__(self):
+        self.models = PROVIDER_MODELS[self.name]
+        self._client = None
+        # Event loop -> async client; an entry goes away with its loop
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = weakref.WeakKeyDictionary()
+        self._async_lock = threading.Lock()
+
+    def model_for(self, tier: str) -> str:
+        return self.models.get(tier, self.models["quality"])
+
+    @property
+    def client(self):
+        """Shared sync SDK client"""
+        if self._client is None:
+            self._client = self._build_client()
+        return self._client
+
+    @property
+    def async_client(self):
+        """
+        Shared async SDK client
+
+        Async connection pools belong to the event loop that created them,
+        so there is one client per loop (kept until the loop is garbage
+        collected, or until aclose_async_client() is awaited on that loop).
+        """
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            if loop not in self._async_clients:
+                self._async_clients[loop] = self._build_async_client()
+            return self._async_clients[loop]
+
+    async def aclose_async_client(self):
+        """Close the running loop's async client and its connections (call before the loop ends)"""
+        with self._async_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    def _build_client(self):
+        raise NotImplementedError
+
+    def _build_async_client(self):
+        raise NotImplementedError
+
+    def complete(
+        self,
+        messages: List[Dict[str, str]],
+        system: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.3,
+        max_tokens: int = 4096,
+        json_mode: bool = False,
+    ) -> str:
+        """Run a completion and return the response text"""
+        raise NotImplementedError
+
+    async def complete_async(
+        self,
+        messages: List[Dict[str, str]],
+        system: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.3,
+        max_tokens: int = 4096,
+        json_mode: bool = False,
+    ) -> str:
+        """Async version of complete()"""
+        raise NotImplementedError
+
+    async def stream_async(
+        self,
+        messages: List[Dict[str, str]],
+        system: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.3,
+        max_tokens: int = 4096,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a completion as text deltas
+
+        Closing the iterator early (e.g. the client disconnected) closes the
+        underlying provider stream so no further tokens are generated.
+        """
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def _build_client(self):
+        import openai
+        return openai.OpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            timeout=_http_timeout(),
+            http_client=httpx.Client(limits=_http_limits(), timeout=_http_timeout()),
+        )
+
+    def _build_async_client(self):
+        import openai
+        return openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            timeout=_http_timeout(),
+            http_client=httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout()),
+        )
+
+    # Reasoning model families reject max_tokens in favour of max_completion_tokens
+    _COMPLETION_TOKENS_PREFIXES = ("o1", "o3", "o4", "gpt-5")
+
+    def _request(self, messages, system, model, temperature, max_tokens, json_mode) -> dict:
+        chat_messages = []
+        if system:
+            chat_messages.append({"role": "system", "content": system})
+        chat_messages.extend(messages)
+
+        model = model or self.models["quality"]
+        request = {
+            "model": model,
+            "messages": chat_messages,
+            "temperature": temperature,
+        }
+        if model.startswith(self._COMPLETION_TOKENS_PREFIXES):
+            # Not a keyword argument of the pinned SDK version
+            request["extra_body"] = {"max_completion_tokens": max_tokens}
+        else:
+            request["max_tokens"] = max_tokens
+        if json_mode:
+            request["response_format"] = {"type": "json_object"}
+        return request
+
+    def complete(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096, json_mode=False) -> str:
+        response = self.client.chat.completions.create(**self._request(messages, system, model, temperature, max_tokens, json_mode))
+        return response.choices[0].message.content
+
+    async def complete_async(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096, json_mode=False) -> str:
+        response = await self.async_client.chat.completions.create(
+            **self._request(messages, system, model, temperature, max_tokens, json_mode)
+        )
+        return response.choices[0].message.content
+
+    async def stream_async(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096):
+        stream = await self.async_client.chat.completions.create(
+            **self._request(messages, system, model, temperature, max_tokens, False),
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.response.aclose()
+
+
+class AnthropicProvider(LLMProvider):
+    name = "anthropic"
+
+    def _build_client(self):
+        import anthropic
+        return anthropic.Anthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            timeout=_http_timeout(),
+            http_client=httpx.Client(limits=_http_limits(), timeout=_http_timeout()),
+        )
+
+    def _build_async_client(self):
+        import anthropic
+        return anthropic.AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            timeout=_http_timeout(),
+            http_client=httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout()),
+        )
+
+    def _request(self, messages, system, model, temperature, max_tokens) -> dict:
+        request = {
+            "model": model or self.models["quality"],
+            "max_tokens": max_tokens,
+            "messages": messages,
+            "temperature": temperature,
+        }
+        if system:
+            request["system"] = system
+        return request
+
+    def complete(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096, json_mode=False) -> str:
+        response = self.client.messages.create(**self._request(messages, system, model, temperature, max_tokens))
+        return response.content[0].text
+
+    async def complete_async(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096, json_mode=False) -> str:
+        response = await self.async_client.messages.create(
+            **self._request(messages, system, model, temperature, max_tokens)
+        )
+        return response.content[0].text
+
+    async def stream_async(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096):
+        stream = await self.async_client.messages.create(
+            **self._request(messages, system, model, temperature, max_tokens),
+            stream=True,
+        )
+        try:
+            async for event in stream:
+                if event.type == "content_block_delta" and getattr(event.delta, "text", None):
+                    yield event.delta.text
+        finally:
+            await stream.response.aclose()
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self):
+        super().__init__()
+        import google.generativeai as genai
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+
+    def _build_client(self):
+        # Gemini model objects are cheap; the SDK manages its own transport
+        return None
+
+    def _build_async_client(self):
+        return None
+
+    def _model(self, model: Optional[str], system: Optional[str], temperature: float, max_tokens: int, json_mode: bool):
+        import google.generativeai as genai
+        generation_config = {"temperature": temperature, "max_output_tokens": max_tokens}
+        if json_mode:
+            generation_config["response_mime_type"] = "application/json"
+        return genai.GenerativeModel(
+            model or self.models["quality"],
+            system_instruction=system,
+            generation_config=generation_config,
+        )
+
+    @staticmethod
+    def _contents(messages: List[Dict[str, str]]) -> list:
+        """Convert OpenAI-style messages to Gemini contents"""
+        return [
+            {"role": "user" if msg["role"] == "user" else "model", "parts": [msg["content"]]}
+            for msg in messages
+        ]
+
+    def complete(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096, json_mode=False) -> str:
+        response = self._model(model, system, temperature, max_tokens, json_mode).generate_content(
+            self._contents(messages),
+            request_options={"timeout": settings.LLM_REQUEST_TIMEOUT_SECONDS},
+        )
+        return response.text
+
+    async def complete_async(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096, json_mode=False) -> str:
+        response = await self._model(model, system, temperature, max_tokens, json_mode).generate_content_async(
+            self._contents(messages),
+            request_options={"timeout": settings.LLM_REQUEST_TIMEOUT_SECONDS},
+        )
+        return response.text
+
+    async def stream_async(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096):
+        response = await self._model(model, system, temperature, max_tokens, False).generate_content_async(
+            self._contents(messages),
+            stream=True,
+            request_options={"timeout": settings.LLM_REQUEST_TIMEOUT_SECONDS},
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeProvider(LLMProvider):
+    """
+    Offline provider for development and tests
+
+    Echoes the last user message back without any network access. Latency
+    and failure rate are configurable (LLM_FAKE_LATENCY_SECONDS,
+    LLM_FAKE_ERROR_RATE) to exercise routing, hedging and failover.
+    """
+
+    name = "fake"
+
+    def _build_client(self):
+        return None
+
+    def _build_async_client(self):
+        return None
+
+    def _respond(self, messages, model, json_mode) -> str:
+        if random.random() < settings.LLM_FAKE_ERROR_RATE:
+            raise RuntimeError("Fake provider error")
+        prompt = messages[-1]["content"] if messages else ""
+        text = f"[{model or self.models['quality']}] {prompt[:200]}"
+        if json_mode:
+            return json.dumps({"summary": text})
+        return text
+
+    def complete(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096, json_mode=False) -> str:
+        time.sleep(settings.LLM_FAKE_LATENCY_SECONDS)
+        return self._respond(messages, model, json_mode)
+
+    async def complete_async(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096, json_mode=False) -> str:
+        await asyncio.sleep(settings.LLM_FAKE_LATENCY_SECONDS)
+        return self._respond(messages, model, json_mode)
+
+    async def stream_async(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096):
+        await asyncio.sleep(settings.LLM_FAKE_LATENCY_SECONDS)
+        for word in self._respond(messages, model, False).split(" "):
+            yield word + " "
+
+
+PROVIDER_CLASSES = {
+    "openai": OpenAIProvider,
+    "anthropic": AnthropicProvider,
+    "gemini": GeminiProvider,
+    "fake": FakeProvider,
+}
+
+
+def get_provider(name: str) -> LLMProvider:
+    """Instantiate the adapter for a provider name"""
+    provider_class = PROVIDER_CLASSES.get(name)
+    if provider_class is None:
+        raise ValueError(f"Unsupported LLM provider: {name}")
+    return provider_class()
@@ -0,0 +1,408 @@
+"""
+Latency-aware LLM routing
+
+Holds an adapter for every configured provider and tracks rolling latency
+(p50/p95) and error rate per provider. Each call goes to the fastest healthy
+provider and fails over to the next one on errors. Interactive calls can be
+hedged: if the first provider has not answered after its p95 latency, the
+same request is sent to the next provider and whichever finishes first wins.
+
+Providers are taken out of rotation for LLM_ROUTER_COOLDOWN_SECONDS after
+repeated errors and tried again afterwards. Every provider call goes through
+the shared LLM limiter (app.services.llm_limiter), so calls queue for
+concurrency and rate budgets, and 429s are retried after backoff.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+from app.core.config import settings
+from app.services.llm_limiter import estimate_tokens, is_rate_limit_error, llm_limiter
+from app.services.llm_providers import LLMProvider, PROVIDER_CLASSES, get_provider
+
+# Settings attribute holding each provider's API key
+PROVIDER_API_KEYS = {
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+    "gemini": "GEMINI_API_KEY",
+}
+
+
+@dataclass
+class RoutedCompletion:
+    """A completion plus the provider/model that produced it"""
+    text: str
+    provider: str
+    model: str
+
+
+class ProviderStats:
+    """Rolling latency and error window for one provider (thread-safe)"""
+
+    def __init__(self, window: int):
+        self._lock = threading.Lock()
+        # tier -> recent successful latencies in seconds
+        self._latencies: Dict[str, deque] = {}
+        # tier -> recent times to first token of streams; kept apart because
+        # routing and hedge delays are based on full-completion latency
+        self._first_token: Dict[str, deque] = {}
+        # Recent outcomes (True = success), across tiers
+        self._outcomes: deque = deque(maxlen=window)
+        self._window = window
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def record_success(self, tier: str, latency: float):
+        with self._lock:
+            self._latencies.setdefault(tier, deque(maxlen=self._window)).append(latency)
+            self._record_ok()
+
+    def record_first_token(self, tier: str, latency: float):
+        """A stream started delivering (counts as a success; latency goes to the first-token window)"""
+        with self._lock:
+            self._first_token.setdefault(tier, deque(maxlen=self._window)).append(latency)
+            self._record_ok()
+
+    def _record_ok(self):
+        self._outcomes.append(True)
+        self.consecutive_errors = 0
+        self.calls += 1
+
+    def record_error(self):
+        with self._lock:
+            self._outcomes.append(False)
+            self.consecutive_errors += 1
+            self.calls += 1
+            self.errors += 1
+            if (
+                self.consecutive_errors >= settings.LLM_ROUTER_MAX_CONSECUTIVE_ERRORS
+                or (
+                    len(self._outcomes) >= settings.LLM_ROUTER_MIN_SAMPLES
+                    and self._error_rate() > settings.LLM_ROUTER_MAX_ERROR_RATE
+                )
+            ):
+                self.cooldown_until = time.monotonic() + settings.LLM_ROUTER_COOLDOWN_SECONDS
+                # Start from a clean slate once the cooldown ends
+                self._outcomes.clear()
+                self.consecutive_errors = 0
+
+    def _error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def samples(self, tier: str) -> int:
+        with self._lock:
+            return len(self._latencies.get(tier, ()))
+
+    def percentile(self, tier: str, pct: float, first_token: bool = False) -> Optional[float]:
+        """Completion (or, with first_token, stream first-token) latency percentile for a tier, or None without samples"""
+        with self._lock:
+            latencies = sorted((self._first_token if first_token else self._latencies).get(tier, ()))
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(round(pct / 100 * (len(latencies) - 1))))
+        return latencies[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            tiers = list(self._latencies)
+            stream_tiers = list(self._first_token)
+            error_rate = self._error_rate()
+        return {
+            "healthy": self.healthy(),
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(error_rate, 4),
+            "latency": {
+                tier: {"p50": self.percentile(tier, 50), "p95": self.percentile(tier, 95)}
+                for tier in tiers
+            },
+            "first_token_latency": {
+                tier: {"p50": self.percentile(tier, 50, first_token=True), "p95": self.percentile(tier, 95, first_token=True)}
+                for tier in stream_tiers
+            },
+        }
+
+
+class LLMRouter:
+    """
+    Routes completions across providers by observed latency and health
+
+    Exposes the same call shapes as LLMProvider, but takes a model tier
+    ("quality" or "fast") instead of a model name since every provider
+    maps the tier to its own model.
+    """
+
+    def __init__(self, provider_names: Optional[List[str]] = None):
+        names = provider_names or self._configured_provider_names()
+        self.providers: Dict[str, LLMProvider] = {name: get_provider(name) for name in names}
+        self.primary = names[0]
+        self.stats: Dict[str, ProviderStats] = {
+            name: ProviderStats(settings.LLM_ROUTER_WINDOW) for name in names
+        }
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @staticmethod
+    def _configured_provider_names() -> List[str]:
+        """LLM_PROVIDERS if set, else every provider with an API key; primary first"""
+        if settings.LLM_PROVIDERS:
+            names = [name.strip() for name in settings.LLM_PROVIDERS.split(",") if name.strip()]
+        else:
+            names = [name for name, key in PROVIDER_API_KEYS.items() if getattr(settings, key)]
+
+        primary = settings.PRIMARY_LLM_PROVIDER
+        names = [primary] + [name for name in names if name != primary]
+        for name in names:
+            if name not in PROVIDER_CLASSES:
+                raise ValueError(f"Unsupported LLM provider: {name}")
+        return names
+
+    def model_for(self, tier: str, provider: Optional[str] = None) -> str:
+        return self.providers[provider or self.primary].model_for(tier)
+
+    def route(self, tier: str) -> List[List[str]]:
+        """Every [provider, model] a call on this tier can be routed to, in configured order"""
+        return [[name, provider.model_for(tier)] for name, provider in self.providers.items()]
+
+    def ranked(self, tier: str) -> List[str]:
+        """
+        Providers in the order they should be tried
+
+        Healthy providers that still need latency samples come first (in
+        configured order), then measured ones by p50. Providers backing off
+        from a 429 go after those, and providers in cooldown are kept at the
+        end as a last resort.
+        """
+        healthy = [name for name in self.providers if self.stats[name].healthy()]
+        unhealthy = [name for name in self.providers if name not in healthy]
+
+        def sort_key(name: str):
+            stats = self.stats[name]
+            rate_limited = llm_limiter.backoff_remaining(name, self.providers[name].model_for(tier)) > 0
+            if stats.samples(tier) < settings.LLM_ROUTER_MIN_SAMPLES:
+                return (rate_limited, 0, 0.0)
+            return (rate_limited, 1, stats.percentile(tier, 50))
+
+        return sorted(healthy, key=sort_key) + unhealthy
+
+    def _hedge_delay(self, provider: str, tier: str) -> float:
+        p95 = self.stats[provider].percentile(tier, 95)
+        return max(settings.LLM_HEDGE_MIN_DELAY_SECONDS, p95 or 0.0)
+
+    def complete_routed(
+        self,
+        messages: List[Dict[str, str]],
+        system: Optional[str] = None,
+        tier: str = "quality",
+        temperature: float = 0.3,
+        max_tokens: int = 4096,
+        json_mode: bool = False,
+    ) -> RoutedCompletion:
+        """Run a completion on the best provider, failing over in order"""
+        tokens = estimate_tokens(messages, system, max_tokens)
+        last_error: Optional[Exception] = None
+        for name in self.ranked(tier):
+            provider = self.providers[name]
+            model = provider.model_for(tier)
+
+            def timed_call():
+                # Time the provider only, not the wait in the limiter queue
+                started = time.monotonic()
+                text = provider.complete(
+                    messages, system=system, model=model, temperature=temperature,
+                    max_tokens=max_tokens, json_mode=json_mode,
+                )
+                return text, time.monotonic() - started
+
+            try:
+                text, latency = llm_limiter.call(name, model, tokens, timed_call)
+            except Exception as e:
+                self.stats[name].record_error()
+                print(f"⚠️  LLM provider {name} failed, trying next: {e}")
+                last_error = e
+                continue
+            self.stats[name].record_success(tier, latency)
+            return RoutedCompletion(text, name, model)
+        raise last_error or RuntimeError("No LLM providers configured")
+
+    def complete(self, messages, system=None, tier="quality", temperature=0.3, max_tokens=4096, json_mode=False) -> str:
+        return self.complete_routed(messages, system, tier, temperature, max_tokens, json_mode).text
+
+    async def _attempt_async(self, name: str, tier: str, request: Dict[str, Any]) -> RoutedCompletion:
+        """One timed call to one provider; records the outcome (cancellation is not an error)"""
+        provider = self.providers[name]
+        model = provider.model_for(tier)
+        tokens = estimate_tokens(request["messages"], request["system"], request["max_tokens"])
+
+        async def timed_call():
+            started = time.monotonic()
+            text = await provider.complete_async(model=model, **request)
+            return text, time.monotonic() - started
+
+        try:
+            text, latency = await llm_limiter.call_async(name, model, tokens, timed_call)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stats[name].record_error()
+            raise
+        self.stats[name].record_success(tier, latency)
+        return RoutedCompletion(text, name, model)
+
+    async def complete_routed_async(
+        self,
+        messages: List[Dict[str, str]],
+        system: Optional[str] = None,
+        tier: str = "quality",
+        temperature: float = 0.3,
+        max_tokens: int = 4096,
+        json_mode: bool = False,
+        hedge: bool = False,
+    ) -> RoutedCompletion:
+        """
+        Async completion with failover, optionally hedged
+
+        With hedge=True, if the current provider has not answered within its
+        hedge delay, the next provider is started as well; the first success
+        wins and the other request is cancelled. Errors fail over immediately.
+        """
+        request = {
+            "messages": messages,
+            "system": system,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "json_mode": json_mode,
+        }
+        candidates = self.ranked(tier)
+        in_flight: Dict[asyncio.Task, str] = {}
+        hedged_tasks = set()
+        last_error: Optional[Exception] = None
+
+        def start_next() -> Optional[asyncio.Task]:
+            if not candidates:
+                return None
+            name = candidates.pop(0)
+            task = asyncio.create_task(self._attempt_async(name, tier, request))
+            in_flight[task] = name
+            return task
+
+        start_next()
+        try:
+            while in_flight:
+                timeout = None
+                if hedge and candidates and len(in_flight) == 1:
+                    timeout = self._hedge_delay(next(iter(in_flight.values())), tier)
+                done, _ = await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Slow response: hedge on the next provider
+                    self.hedges += 1
+                    hedged_tasks.add(start_next())
+                    continue
+
+                for task in done:
+                    name = in_flight.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        print(f"⚠️  LLM provider {name} failed, trying next: {e}")
+                        last_error = e
+                        continue
+                    if task in hedged_tasks:
+                        self.hedge_wins += 1
+                    return result
+
+                if not in_flight:
+                    start_next()
+        finally:
+            # Wait for the losers so their limiter slots are released and their errors retrieved
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+        raise last_error or RuntimeError("No LLM providers configured")
+
+    async def complete_async(
+        self, messages, system=None, tier="quality", temperature=0.3, max_tokens=4096, json_mode=False, hedge=False
+    ) -> str:
+        result = await self.complete_routed_async(messages, system, tier, temperature, max_tokens, json_mode, hedge)
+        return result.text
+
+    async def stream_async(
+        self,
+        messages: List[Dict[str, str]],
+        system: Optional[str] = None,
+        tier: str = "quality",
+        temperature: float = 0.3,
+        max_tokens: int = 4096,
+    ) -> AsyncIterator[str]:
+        """
+        Stream from the best provider
+
+        Fails over only until the first delta has been sent; after that a
+        provider error is raised to the caller.
+        """
+        tokens = estimate_tokens(messages, system, max_tokens)
+        last_error: Optional[Exception] = None
+        for name in self.ranked(tier):
+            provider = self.providers[name]
+            model = provider.model_for(tier)
+            # The slot is held for the whole stream
+            await llm_limiter.acquire_async(name, model, tokens)
+            rate_limit_error = None
+            started = time.monotonic()
+            yielded = False
+            deltas = provider.stream_async(
+                messages, system=system, model=model,
+                temperature=temperature, max_tokens=max_tokens,
+            )
+            try:
+                async for delta in deltas:
+                    if not yielded:
+                        # Time to first token is what users feel when streaming
+                        self.stats[name].record_first_token(tier, time.monotonic() - started)
+                        yielded = True
+                    yield delta
+                return
+            except Exception as e:
+                if yielded:
+                    raise
+                if is_rate_limit_error(e):
+                    rate_limit_error = e
+                self.stats[name].record_error()
+                print(f"⚠️  LLM provider {name} failed, trying next: {e}")
+                last_error = e
+            finally:
+                await deltas.aclose()
+                llm_limiter.release(name, model, rate_limit_error=rate_limit_error)
+        raise last_error or RuntimeError("No LLM providers configured")
+
+    async def aclose(self):
+        """Close every provider's async client for the running loop (on shutdown)"""
+        for provider in self.providers.values():
+            try:
+                await provider.aclose_async_client()
+            except Exception as e:
+                print(f"⚠️  Failed to close {provider.name} client: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-provider health and latency for /metrics"""
+        return {
+            "primary": self.primary,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "providers": {name: stats.snapshot() for name, stats in self.stats.items()},
+        }
+
+
+# Global router instance
+llm_router = LLMRouter()
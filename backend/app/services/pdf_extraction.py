@@ -0,0 +1,308 @@
+"""
+Page-parallel PDF text extraction in a process pool
+
+Documents are split into page ranges of PDF_EXTRACTION_PAGES_PER_TASK pages
+and the ranges are extracted in a shared ProcessPoolExecutor, so a large
+patent uses every core and parsing never holds the API process's GIL.
+
+Backends are pluggable (see PDF_BACKENDS). They are tried in the order of
+PDF_EXTRACTION_BACKENDS: PyMuPDF is the fast path, pdfplumber the fallback
+for ranges PyMuPDF cannot read (or when it is not installed).
+
+Each document gets PDF_EXTRACTION_TIMEOUT_SECONDS overall. On timeout the
+ranges that have not started are cancelled; a range already running in a
+worker finishes in the background (ranges are small, so this is bounded).
+
+PDFs given as bytes (e.g. an upload being analyzed) are never written to
+disk: they are placed in shared memory once and every worker reads them from
+there.
+
+For previews that only need the first few pages, iter_pdf_pages() reads
+pages lazily in the calling thread instead.
+"""
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Optional, Tuple, Type, Union
+from app.core.config import settings
+
+
+class PDFExtractionError(Exception):
+    """No backend could extract the document"""
+
+
+class PDFExtractionTimeout(PDFExtractionError):
+    """Extraction took longer than PDF_EXTRACTION_TIMEOUT_SECONDS"""
+
+
+# A PDF given as a file path or as its bytes
+PDFSource = Union[str, bytes]
+
+
+class PDFBackend:
+    """Base class for PDF text extraction backends (run inside pool workers)"""
+    name = "base"
+
+    @classmethod
+    def available(cls) -> bool:
+        raise NotImplementedError
+
+    @classmethod
+    def page_count(cls, source: PDFSource) -> int:
+        raise NotImplementedError
+
+    @classmethod
+    def extract_pages(cls, source: PDFSource, start: int, end: int) -> List[str]:
+        """Text of pages [start, end)"""
+        raise NotImplementedError
+
+    @classmethod
+    def iter_pages(cls, source: PDFSource) -> Iterator[str]:
+        """Yield page texts one at a time, parsing each page only when it is requested"""
+        raise NotImplementedError
+
+
+class PyMuPDFBackend(PDFBackend):
+    name = "pymupdf"
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            import fitz  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    @staticmethod
+    def _open(source: PDFSource):
+        import fitz
+        return fitz.open(stream=source, filetype="pdf") if isinstance(source, bytes) else fitz.open(source)
+
+    @classmethod
+    def page_count(cls, source: PDFSource) -> int:
+        with cls._open(source) as doc:
+            return doc.page_count
+
+    @classmethod
+    def extract_pages(cls, source: PDFSource, start: int, end: int) -> List[str]:
+        with cls._open(source) as doc:
+            return [doc[number].get_text() for number in range(start, min(end, doc.page_count))]
+
+    @classmethod
+    def iter_pages(cls, source: PDFSource) -> Iterator[str]:
+        with cls._open(source) as doc:
+            for page in doc:
+                yield page.get_text()
+
+
+class PdfPlumberBackend(PDFBackend):
+    name = "pdfplumber"
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            import pdfplumber  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    @staticmethod
+    def _open(source: PDFSource):
+        import pdfplumber
+        return pdfplumber.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+    @classmethod
+    def page_count(cls, source: PDFSource) -> int:
+        with cls._open(source) as pdf:
+            return len(pdf.pages)
+
+    @classmethod
+    def extract_pages(cls, source: PDFSource, start: int, end: int) -> List[str]:
+        with cls._open(source) as pdf:
+            # pdfplumber omits the trailing newline PyMuPDF adds per page
+            return [(page.extract_text() or "") + "\n" for page in pdf.pages[start:end]]
+
+    @classmethod
+    def iter_pages(cls, source: PDFSource) -> Iterator[str]:
+        with cls._open(source) as pdf:
+            for page in pdf.pages:
+                yield (page.extract_text() or "") + "\n"
+                page.close()  # Drop the parsed page model before moving on
+
+
+PDF_BACKENDS: Dict[str, Type[PDFBackend]] = {
+    PyMuPDFBackend.name: PyMuPDFBackend,
+    PdfPlumberBackend.name: PdfPlumberBackend,
+}
+
+
+def _configured_backends() -> List[Type[PDFBackend]]:
+    names = [name.strip() for name in settings.PDF_EXTRACTION_BACKENDS.split(",") if name.strip()]
+    backends = [PDF_BACKENDS[name] for name in names if name in PDF_BACKENDS]
+    return [backend for backend in backends if backend.available()]
+
+
+def _read_shared(name: str, size: int) -> bytes:
+    """Copy a PDF out of shared memory created by PDFExtractionEngine"""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(block.buf[:size])
+    finally:
+        block.close()
+
+
+def _extract_range(source: Union[str, Tuple[str, int]], start: int, end: int, backend_names: List[str]) -> Tuple[List[str], str]:
+    """Pool task: extract pages [start, end) with the first backend that succeeds"""
+    # (shared memory name, size) for PDFs passed as bytes
+    data = _read_shared(*source) if isinstance(source, tuple) else source
+    errors = []
+    for name in backend_names:
+        try:
+            return PDF_BACKENDS[name].extract_pages(data, start, end), name
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+    raise PDFExtractionError(f"Pages {start + 1}-{end}: " + "; ".join(errors))
+
+
+def iter_pdf_pages(source: PDFSource) -> Iterator[str]:
+    """
+    Yield page texts lazily in the calling thread (stop iterating to stop parsing)
+
+    Uses the first configured backend that can open the document; falls back
+    to the next one only if the first fails before yielding anything.
+
+    Raises:
+        PDFExtractionError: If no backend can read the document
+    """
+    errors = []
+    for backend in _configured_backends():
+        pages = backend.iter_pages(source)
+        try:
+            first = next(pages)
+        except StopIteration:
+            return
+        except Exception as e:
+            errors.append(f"{backend.name}: {e}")
+            continue
+        try:
+            yield first
+            yield from pages
+        finally:
+            pages.close()
+        return
+    raise PDFExtractionError("Could not open PDF: " + ("; ".join(errors) or "no PDF backend installed"))
+
+
+class PDFExtractionEngine:
+    """Shared process pool for PDF extraction (created on first use)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs threads (uvicorn, the AI worker) is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=settings.PDF_EXTRACTION_PROCESSES or os.cpu_count() or 1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _page_count(self, source: PDFSource, backends: List[Type[PDFBackend]]) -> Tuple[int, List[str]]:
+        """Page count from the first backend that can open the document, plus the backends to try"""
+        errors = []
+        for index, backend in enumerate(backends):
+            try:
+                return backend.page_count(source), [b.name for b in backends[index:]]
+            except Exception as e:
+                errors.append(f"{backend.name}: {e}")
+        raise PDFExtractionError("Could not open PDF: " + "; ".join(errors))
+
+    def extract_pages(self, source: PDFSource, max_pages: Optional[int] = None) -> Tuple[List[str], str]:
+        """
+        Extract the text of each page
+
+        Args:
+            source: File path or the PDF bytes
+            max_pages: Only read the first N pages (all pages if None)
+
+        Returns:
+            (page texts in order, backend name(s) used)
+
+        Raises:
+            PDFExtractionError: If no backend can read the document
+            PDFExtractionTimeout: If the document exceeds PDF_EXTRACTION_TIMEOUT_SECONDS
+        """
+        backends = _configured_backends()
+        if not backends:
+            raise PDFExtractionError("No PDF backend installed (pip install pymupdf)")
+        page_count, backend_names = self._page_count(source, backends)
+        if max_pages is not None:
+            page_count = min(page_count, max_pages)
+        if page_count == 0:
+            return [], backend_names[0]
+
+        if not isinstance(source, bytes):
+            return self._extract_ranges(source, page_count, backend_names)
+
+        # Share the bytes with the workers instead of pickling a copy into every task
+        block = shared_memory.SharedMemory(create=True, size=len(source))
+        try:
+            block.buf[:len(source)] = source
+            return self._extract_ranges((block.name, len(source)), page_count, backend_names)
+        finally:
+            block.close()
+            block.unlink()
+
+    def _extract_ranges(
+        self, source: Union[str, Tuple[str, int]], page_count: int, backend_names: List[str]
+    ) -> Tuple[List[str], str]:
+        step = settings.PDF_EXTRACTION_PAGES_PER_TASK
+        pool = self._get_pool()
+        futures = [
+            pool.submit(_extract_range, source, start, min(start + step, page_count), backend_names)
+            for start in range(0, page_count, step)
+        ]
+        done, pending = wait(futures, timeout=settings.PDF_EXTRACTION_TIMEOUT_SECONDS, return_when=FIRST_EXCEPTION)
+        failed = next((future for future in done if future.exception()), None)
+        for future in pending:
+            future.cancel()
+        if failed:
+            if isinstance(failed.exception(), BrokenProcessPool):
+                # A worker died (e.g. crashed on a malformed PDF); start a fresh pool next time
+                self._discard_pool(pool)
+            raise failed.exception()
+        if pending:
+            raise PDFExtractionTimeout(
+                f"PDF extraction exceeded {settings.PDF_EXTRACTION_TIMEOUT_SECONDS}s ({page_count} pages)"
+            )
+
+        pages, used = [], []
+        for future in futures:
+            range_pages, name = future.result()
+            pages.extend(range_pages)
+            if name not in used:
+                used.append(name)
+        return pages, "+".join(used)
+
+
+# Global engine instance
+pdf_extraction_engine = PDFExtractionEngine()
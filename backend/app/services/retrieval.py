@@ -0,0 +1,178 @@
+"""
+Per-disclosure BM25 retrieval for chat grounding
+
+Each disclosure gets an in-memory index of chunks from its sources (draft
+text, latest disclosure version, extracted file text). Sources carry a
+fingerprint; sync() only re-chunks sources whose fingerprint changed, and
+loaders for unchanged sources are never called, so expensive work such as
+PDF extraction happens once per file.
+
+Pure Python: tokens are lowercase words, plus single characters and bigrams
+for CJK text (which has no spaces).
+"""
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.utils.text_chunking import chunk_text
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Chunks scoring below this fraction of the best match are dropped as noise
+MIN_RELATIVE_SCORE = 0.3
+
+_WORD = re.compile(r"[a-z0-9]+(?:[-_][a-z0-9]+)*")
+_CJK_RUN = re.compile(r"[㐀-鿿豈-﫿]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "of", "on", "or", "the", "this", "that", "to", "what", "which", "with",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, plus CJK unigrams and bigrams"""
+    text = text.lower()
+    tokens = [word for word in _WORD.findall(text) if word not in STOPWORDS]
+    for run in _CJK_RUN.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+@dataclass
+class Chunk:
+    source: str
+    label: str
+    text: str
+    term_freqs: Counter = field(repr=False)
+    length: int = 0
+
+
+# source key -> (fingerprint, loader returning the source text, label)
+SourceSpec = Tuple[str, Callable[[], Optional[str]], str]
+
+
+class DisclosureIndex:
+    """BM25 index over the chunks of one disclosure's sources"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fingerprints: Dict[str, str] = {}
+        self.chunks: Dict[str, List[Chunk]] = {}
+        self.doc_freqs: Counter = Counter()
+        self.total_length = 0
+        self.chunk_count = 0
+
+    def _add_source(self, key: str, label: str, text: str):
+        chunks = []
+        for piece in chunk_text(text, settings.RETRIEVAL_CHUNK_CHARS):
+            term_freqs = Counter(tokenize(piece.text))
+            if not term_freqs:
+                continue
+            chunk_label = f"{label} / {piece.section.title()}" if piece.section else label
+            chunk = Chunk(key, chunk_label, piece.text, term_freqs, sum(term_freqs.values()))
+            chunks.append(chunk)
+            self.doc_freqs.update(term_freqs.keys())
+            self.total_length += chunk.length
+        self.chunks[key] = chunks
+        self.chunk_count += len(chunks)
+
+    def _remove_source(self, key: str):
+        for chunk in self.chunks.pop(key, []):
+            self.doc_freqs.subtract(chunk.term_freqs.keys())
+            self.total_length -= chunk.length
+            self.chunk_count -= 1
+        self.doc_freqs += Counter()  # Drop terms whose count reached zero
+        self.fingerprints.pop(key, None)
+
+    def sync(self, sources: Dict[str, SourceSpec]) -> int:
+        """
+        Bring the index in line with the given sources
+
+        Returns:
+            Number of sources (re)indexed
+        """
+        for key in list(self.fingerprints):
+            if key not in sources:
+                self._remove_source(key)
+
+        updated = 0
+        for key, (fingerprint, load, label) in sources.items():
+            if self.fingerprints.get(key) == fingerprint:
+                continue
+            self._remove_source(key)
+            text = load()
+            if text:
+                self._add_source(key, label, text)
+            self.fingerprints[key] = fingerprint
+            updated += 1
+        return updated
+
+    def search(self, query: str, k: int) -> List[Tuple[float, Chunk]]:
+        """Top-k chunks for the query by BM25 score"""
+        terms = set(tokenize(query))
+        if not terms or not self.chunk_count:
+            return []
+
+        avg_length = self.total_length / self.chunk_count
+        idf = {
+            term: math.log(1 + (self.chunk_count - self.doc_freqs[term] + 0.5) / (self.doc_freqs[term] + 0.5))
+            for term in terms if self.doc_freqs[term]
+        }
+        if not idf:
+            return []
+
+        scored = []
+        for chunks in self.chunks.values():
+            for chunk in chunks:
+                score = 0.0
+                for term, term_idf in idf.items():
+                    tf = chunk.term_freqs.get(term)
+                    if tf:
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * chunk.length / avg_length)
+                        score += term_idf * tf * (BM25_K1 + 1) / (tf + norm)
+                if score > 0:
+                    scored.append((score, chunk))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        if scored:
+            cutoff = scored[0][0] * MIN_RELATIVE_SCORE
+            scored = [item for item in scored if item[0] >= cutoff]
+        return scored[:k]
+
+
+class RetrievalIndex:
+    """Per-disclosure indexes, least recently used ones dropped past RETRIEVAL_MAX_INDEXES"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes: "OrderedDict[int, DisclosureIndex]" = OrderedDict()
+
+    def _index_for(self, disclosure_id: int) -> DisclosureIndex:
+        index = self._indexes.get(disclosure_id)
+        if index is None:
+            index = self._indexes[disclosure_id] = DisclosureIndex()
+            while len(self._indexes) > settings.RETRIEVAL_MAX_INDEXES:
+                self._indexes.popitem(last=False)
+        self._indexes.move_to_end(disclosure_id)
+        return index
+
+    def search(self, disclosure_id: int, sources: Dict[str, SourceSpec], query: str, k: Optional[int] = None) -> List[Chunk]:
+        """Sync the disclosure's index with its current sources, then return the top-k chunks"""
+        with self._lock:
+            index = self._index_for(disclosure_id)
+        # Per-disclosure lock: indexing one disclosure never blocks chat on another
+        with index.lock:
+            index.sync(sources)
+            return [chunk for _, chunk in index.search(query, k or settings.RETRIEVAL_TOP_K)]
+
+    def drop(self, disclosure_id: int):
+        """Forget a disclosure's index (e.g. when it is deleted)"""
+        with self._lock:
+            self._indexes.pop(disclosure_id, None)
+
+
+# Global index instance
+retrieval_index = RetrievalIndex()
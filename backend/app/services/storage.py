@@ -0,0 +1,385 @@
+"""
+Attachment storage backends
+
+Files are stored once per content under "blobs/<xx>/<sha256>" (see
+app.services.blobs; older uploads under "<disclosure_id>/<File.s3_key>")
+in either the local uploads directory or an S3-compatible bucket (AWS S3,
+or MinIO / LocalStack via S3_ENDPOINT_URL). STORAGE_BACKEND picks where new uploads go;
+existing files are always read from where they were written, which
+File.s3_bucket records ("local" or the bucket name), so switching backends
+does not orphan earlier uploads.
+
+S3 also accepts presigned POSTs, so browsers can upload attachments without
+the bytes passing through the API (see /files/upload-url).
+
+Writes go through a StorageWriter so uploads can be streamed in chunks: the
+S3 writer sends parts of S3_MULTIPART_CHUNK_MB as a multipart upload (a
+single PUT for smaller files). Reads support byte ranges, which S3 serves as
+ranged GETs.
+"""
+import os
+import shutil
+import threading
+import uuid
+from typing import Dict, Iterator, Optional
+from app.core.config import settings
+from app.models.file import File
+
+# File.s3_bucket value for files on local disk
+LOCAL_BUCKET = "local"
+
+
+class StorageError(Exception):
+    """A storage operation failed"""
+
+
+class StorageWriter:
+    """Receives an object's bytes in order; exactly one of commit() or abort() ends it"""
+
+    def write(self, chunk: bytes):
+        raise NotImplementedError
+
+    def commit(self):
+        raise NotImplementedError
+
+    def abort(self):
+        """Discard everything written so far"""
+        raise NotImplementedError
+
+
+class Storage:
+    """Base class for storage backends (all methods are blocking)"""
+
+    # Stored in File.s3_bucket
+    bucket = ""
+
+    def open_writer(self, key: str) -> StorageWriter:
+        raise NotImplementedError
+
+    def put_bytes(self, key: str, data: bytes):
+        writer = self.open_writer(key)
+        try:
+            writer.write(data)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Bytes [start, end) of an object (to the end if end is None)"""
+        raise NotImplementedError
+
+    def iter_bytes(self, key: str, start: int = 0, end: Optional[int] = None, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Stream bytes [start, end) of an object in chunks"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        """Remove an object (no error if it does not exist)"""
+        raise NotImplementedError
+
+    def copy(self, source_key: str, dest_key: str):
+        """Copy an object to dest_key (an existing object there is replaced or, locally, kept as is)"""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of an object, if this backend keeps one"""
+        return None
+
+    def presigned_post(self, key: str, content_type: str, size: int, expires_in: int) -> Optional[dict]:
+        """
+        Form upload a browser can send straight to storage ({"url", "fields"})
+
+        The upload is limited to this key, content type and exact size.
+        Returns None if the backend does not accept direct uploads.
+        """
+        return None
+
+    def presigned_get(self, key: str, expires_in: int, content_type: str, content_disposition: str) -> Optional[str]:
+        """
+        Temporary URL serving the object directly from storage
+
+        Returns None if the backend cannot serve objects itself.
+        """
+        return None
+
+
+class _LocalWriter(StorageWriter):
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._file = open(path, "wb")
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+
+    def commit(self):
+        self._file.close()
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class LocalStorage(Storage):
+    """Files under LOCAL_STORAGE_DIR (relative paths are relative to the working directory)"""
+
+    bucket = LOCAL_BUCKET
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or settings.LOCAL_STORAGE_DIR)
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def open_writer(self, key: str) -> StorageWriter:
+        return _LocalWriter(self.local_path(key))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.local_path(key))
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self.local_path(key))
+
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        with open(self.local_path(key), "rb") as fh:
+            fh.seek(start)
+            return fh.read() if end is None else fh.read(max(end - start, 0))
+
+    def iter_bytes(self, key: str, start: int = 0, end: Optional[int] = None, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        with open(self.local_path(key), "rb") as fh:
+            fh.seek(start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                chunk = fh.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key: str):
+        path = self.local_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def copy(self, source_key: str, dest_key: str):
+        # Only used for content-addressed keys, so an existing destination already has the same bytes
+        source, dest = self.local_path(source_key), self.local_path(dest_key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            # A hard link costs no I/O
+            os.link(source, dest)
+        except FileExistsError:
+            pass
+        except OSError:
+            partial = f"{dest}.{uuid.uuid4().hex}.part"
+            shutil.copyfile(source, partial)
+            os.replace(partial, dest)
+
+
+class _S3MultipartWriter(StorageWriter):
+    """Buffers up to one part; starts a multipart upload only once a full part is buffered"""
+
+    def __init__(self, storage: "S3Storage", key: str):
+        self.storage = storage
+        self.key = key
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts = []
+
+    def _send_part(self, data: bytes):
+        client = self.storage.client
+        if self._upload_id is None:
+            self._upload_id = client.create_multipart_upload(Bucket=self.storage.bucket, Key=self.key)["UploadId"]
+        number = len(self._parts) + 1
+        response = client.upload_part(
+            Bucket=self.storage.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=number, Body=data,
+        )
+        self._parts.append({"PartNumber": number, "ETag": response["ETag"]})
+
+    def write(self, chunk: bytes):
+        self._buffer += chunk
+        part_size = self.storage.part_size
+        while len(self._buffer) >= part_size:
+            self._send_part(bytes(self._buffer[:part_size]))
+            del self._buffer[:part_size]
+
+    def commit(self):
+        client = self.storage.client
+        if self._upload_id is None:
+            # Smaller than one part: a single PUT
+            client.put_object(Bucket=self.storage.bucket, Key=self.key, Body=bytes(self._buffer))
+            return
+        if self._buffer:
+            self._send_part(bytes(self._buffer))
+        client.complete_multipart_upload(
+            Bucket=self.storage.bucket, Key=self.key, UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+
+    def abort(self):
+        if self._upload_id is not None:
+            try:
+                self.storage.client.abort_multipart_upload(
+                    Bucket=self.storage.bucket, Key=self.key, UploadId=self._upload_id,
+                )
+            except Exception as e:
+                print(f"⚠️  Failed to abort multipart upload of {self.key}: {e}")
+        self._buffer.clear()
+
+
+class S3Storage(Storage):
+    """Objects in an S3-compatible bucket"""
+
+    def __init__(self, bucket: Optional[str] = None):
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = bucket or settings.S3_BUCKET_NAME
+        if not self.bucket:
+            raise StorageError("S3_BUCKET_NAME is not set")
+        # S3 requires parts of at least 5MB (except the last)
+        self.part_size = max(settings.S3_MULTIPART_CHUNK_MB, 5) * 1024 * 1024
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            region_name=settings.AWS_REGION,
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            # MinIO/LocalStack serve buckets by path, not by subdomain
+            config=Config(s3={"addressing_style": "path"}) if settings.S3_ENDPOINT_URL else None,
+        )
+
+    def open_writer(self, key: str) -> StorageWriter:
+        return _S3MultipartWriter(self, key)
+
+    def _head(self, key: str) -> Optional[dict]:
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def size(self, key: str) -> int:
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head["ContentLength"]
+
+    def _get(self, key: str, start: int, end: Optional[int]):
+        args = {"Bucket": self.bucket, "Key": key}
+        if start or end is not None:
+            # HTTP ranges are inclusive
+            args["Range"] = f"bytes={start}-" + ("" if end is None else str(end - 1))
+        return self.client.get_object(**args)["Body"]
+
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        if end is not None and end <= start:
+            return b""
+        body = self._get(key, start, end)
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    def iter_bytes(self, key: str, start: int = 0, end: Optional[int] = None, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        if end is not None and end <= start:
+            return
+        body = self._get(key, start, end)
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def copy(self, source_key: str, dest_key: str):
+        # Server-side copy (uploads are far below the 5GB single-copy limit)
+        self.client.copy_object(Bucket=self.bucket, Key=dest_key, CopySource={"Bucket": self.bucket, "Key": source_key})
+
+    def presigned_post(self, key: str, content_type: str, size: int, expires_in: int) -> Optional[dict]:
+        return self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=key,
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", size, size]],
+            ExpiresIn=expires_in,
+        )
+
+    def presigned_get(self, key: str, expires_in: int, content_type: str, content_disposition: str) -> Optional[str]:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "ResponseContentType": content_type,
+                "ResponseContentDisposition": content_disposition,
+            },
+            ExpiresIn=expires_in,
+        )
+
+
+_storages: Dict[str, Storage] = {}
+_storages_lock = threading.Lock()
+
+
+def storage_for_bucket(bucket: Optional[str]) -> Storage:
+    """Backend for a File.s3_bucket value"""
+    bucket = bucket or LOCAL_BUCKET
+    with _storages_lock:
+        if bucket not in _storages:
+            _storages[bucket] = LocalStorage() if bucket == LOCAL_BUCKET else S3Storage(bucket)
+        return _storages[bucket]
+
+
+def get_storage() -> Storage:
+    """Backend for new uploads (STORAGE_BACKEND)"""
+    if settings.STORAGE_BACKEND == "s3":
+        if not settings.S3_BUCKET_NAME:
+            raise StorageError("STORAGE_BACKEND=s3 requires S3_BUCKET_NAME")
+        return storage_for_bucket(settings.S3_BUCKET_NAME)
+    return storage_for_bucket(LOCAL_BUCKET)
+
+
+def storage_for(f: File) -> Storage:
+    """Backend holding an uploaded file"""
+    return storage_for_bucket(f.s3_bucket)
+
+
+def object_key(disclosure_id: int, name: str) -> str:
+    return f"{disclosure_id}/{name}"
+
+
+def blob_key(content_hash: str) -> str:
+    """Storage key of shared content (see app.services.blobs)"""
+    return f"blobs/{content_hash[:2]}/{content_hash}"
+
+
+def file_key(f: File) -> str:
+    """Storage key of an uploaded file"""
+    if f.blob_hash:
+        return blob_key(f.blob_hash)
+    return object_key(f.disclosure_id, f.s3_key)
+
+
+def file_key_is_final(f: File) -> bool:
+    """
+    Whether file_key(f) can no longer change
+
+    Direct uploads (always S3) arrive without a hash and move to their blob key
+    once the ingestion job has hashed them.
+    """
+    return bool(f.content_hash) or (f.s3_bucket or LOCAL_BUCKET) == LOCAL_BUCKET
@@ -0,0 +1,77 @@
+"""
+Chunked upload writing
+
+Uploads are copied to storage (a StorageWriter) UPLOAD_CHUNK_SIZE_KB at a time: the
+size limit is checked as each chunk arrives (so an oversized upload stops at
+the first chunk past the limit, not after it has been read whole), the
+SHA-256 is computed along the way, and the blocking hash/write work runs in
+the threadpool so concurrent uploads don't stall the event loop. Memory per
+upload is one chunk.
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.storage import StorageWriter
+
+
+class UploadTooLarge(Exception):
+    """The upload exceeded the size limit (nothing is left at the destination)"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class SavedUpload:
+    size: int
+    content_hash: str  # SHA-256 hex digest, same as compute_content_hash()
+
+
+def _write_chunk(writer: StorageWriter, digest, chunk: bytes):
+    digest.update(chunk)
+    writer.write(chunk)
+
+
+async def save_upload(
+    upload: UploadFile,
+    writer: StorageWriter,
+    max_bytes: int,
+    chunk_size: Optional[int] = None,
+) -> SavedUpload:
+    """
+    Stream an upload to storage in chunks, enforcing max_bytes and hashing on the fly
+
+    Args:
+        upload: Incoming file
+        writer: Destination (committed on success, aborted on any error)
+        max_bytes: Maximum accepted size
+        chunk_size: Bytes per read (default UPLOAD_CHUNK_SIZE_KB)
+
+    Raises:
+        UploadTooLarge: If the upload is larger than max_bytes (nothing is stored)
+    """
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE_KB * 1024
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        # Reject up front when the size is known
+        if upload.size is not None and upload.size > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            await run_in_threadpool(_write_chunk, writer, digest, chunk)
+        await run_in_threadpool(writer.commit)
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+
+    return SavedUpload(size=size, content_hash=digest.hexdigest())
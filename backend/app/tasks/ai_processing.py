@@ -1,69 +1,326 @@
+import asyncio
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
 from sqlalchemy.orm import Session
-from app.models.disclosure import Disclosure, DisclosureStatus
+from sqlalchemy.sql import func
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.ai_job import AIJob, AIJobStatus, AIJobType
+from app.models.disclosure import Disclosure, DisclosureStatus, DisclosureVersion
 from app.models.patent_draft import PatentDraft, AIProcessingStatus
-from app.services.ai_service import ai_service
+from app.services.ai_service import ai_service, DRAFT_SECTIONS
+from app.services.disclosure_context import disclosure_context_cache
+from app.tasks.job_queue import JobSuperseded, enqueue_job, find_pending_job, request_cancellation
 
 
-def process_disclosure_async(disclosure_id: int, db: Session):
+def _merge_sections(a: Optional[List[str]], b: Optional[List[str]]) -> Optional[List[str]]:
+    """Union of two section lists, where None means "all sections" """
+    if a is None or b is None:
+        return None
+    merged = set(a) | set(b)
+    return [section for section in DRAFT_SECTIONS if section in merged]
+
+
+def unfinished_draft_sections(db: Session, disclosure_id: int) -> Optional[List[str]]:
+    """
+    Draft sections that a failed or cancelled job left stale and no later job regenerated
+
+    Walks the disclosure's finished draft jobs from newest to oldest: sections
+    a completed job covered are up to date, anything a failed or cancelled job
+    was asked for before that is still owed.
+
+    Returns:
+        The sections in document order ([] if none, None if every section)
+    """
+    all_sections = set(DRAFT_SECTIONS)
+    covered, unfinished = set(), set()
+    jobs = (
+        db.query(AIJob.status, AIJob.payload)
+        .filter(
+            AIJob.job_type == AIJobType.GENERATE_DRAFT,
+            AIJob.disclosure_id == disclosure_id,
+            AIJob.status.in_([AIJobStatus.COMPLETED, AIJobStatus.FAILED, AIJobStatus.CANCELLED]),
+        )
+        .order_by(AIJob.id.desc())
+        .all()
+    )
+    for status, payload in jobs:
+        # No sections in the payload means the job regenerated everything
+        job_sections = set((payload or {}).get("sections") or DRAFT_SECTIONS)
+        if status == AIJobStatus.COMPLETED:
+            covered |= job_sections
+            if covered >= all_sections:
+                break
+        else:
+            unfinished |= job_sections - covered
+
+    if unfinished >= all_sections:
+        return None
+    return [section for section in DRAFT_SECTIONS if section in unfinished]
+
+
+def enqueue_disclosure_processing(
+    db: Session,
+    disclosure_id: int,
+    sections: Optional[List[str]] = None,
+    content_version: Optional[int] = None,
+    debounce: bool = True,
+) -> AIJob:
     """
-    Background task to process disclosure with AI
+    Queue patent draft generation for a disclosure
+
+    The job is picked up by the AI worker pool (see app.tasks.worker),
+    which opens its own database sessions.
 
-    This function runs asynchronously to generate a patent draft
-    from the disclosure content.
+    Rapid edits are coalesced: while a job for the disclosure is still
+    waiting, it is updated in place (sections merged, start pushed back by
+    AI_REPROCESS_DEBOUNCE_SECONDS) instead of queueing another one. A job
+    already running on older content is cancelled and its sections folded
+    into the queued job. Sections that an earlier failed or cancelled job
+    never got to (see unfinished_draft_sections) are carried over as well,
+    so the draft does not keep mixing old and new content.
 
     Args:
-        disclosure_id: ID of the disclosure to process
         db: Database session
+        disclosure_id: Disclosure to process
+        sections: Only regenerate these draft sections (all sections if None)
+        content_version: DisclosureVersion.version_number the job is for
+        debounce: Delay the start to absorb further edits
+
+    Returns:
+        The queued job (new or coalesced)
     """
-    # Get disclosure
-    disclosure = db.query(Disclosure).filter(Disclosure.id == disclosure_id).first()
-    if not disclosure:
+    delay_seconds = settings.AI_REPROCESS_DEBOUNCE_SECONDS if debounce else 0
+    sections = _merge_sections(sections, unfinished_draft_sections(db, disclosure_id))
+
+    # In-flight generations are working from stale content
+    for superseded in request_cancellation(db, AIJobType.GENERATE_DRAFT, disclosure_id):
+        sections = _merge_sections(sections, (superseded.payload or {}).get("sections"))
+
+    pending = find_pending_job(db, AIJobType.GENERATE_DRAFT, disclosure_id)
+    if pending:
+        sections = _merge_sections(sections, (pending.payload or {}).get("sections"))
+        pending.payload = {"sections": sections} if sections else {}
+        pending.content_version = content_version
+        pending.run_after = func.now() + timedelta(seconds=delay_seconds)
+        db.commit()
+        db.refresh(pending)
+        return pending
+
+    payload = {"sections": sections} if sections else {}
+    return enqueue_job(
+        db,
+        AIJobType.GENERATE_DRAFT,
+        disclosure_id=disclosure_id,
+        payload=payload,
+        delay_seconds=delay_seconds,
+        content_version=content_version,
+    )
+
+
+def _ensure_current(db: Session, disclosure_id: int, content_version: Optional[int]):
+    """
+    Raise JobSuperseded if the disclosure has a newer version than the job was queued for
+    """
+    if content_version is None:
         return
+    latest_version = db.query(func.max(DisclosureVersion.version_number)).filter(
+        DisclosureVersion.disclosure_id == disclosure_id
+    ).scalar()
+    if latest_version is not None and latest_version > content_version:
+        raise JobSuperseded(
+            f"Disclosure {disclosure_id} moved to version {latest_version}; dropping results for version {content_version}"
+        )
 
+
+def _start_processing(disclosure_id: int) -> Optional[Dict[str, Any]]:
+    """Mark disclosure and draft as processing; returns the inputs for generation"""
+    db = SessionLocal()
     try:
+        disclosure = db.query(Disclosure).filter(Disclosure.id == disclosure_id).first()
+        if not disclosure:
+            return None
+
         # Update disclosure status
         disclosure.status = DisclosureStatus.AI_PROCESSING
-        db.commit()
 
         # Check if draft already exists
         draft = db.query(PatentDraft).filter(PatentDraft.disclosure_id == disclosure_id).first()
-
         if not draft:
             # Create new draft record
             draft = PatentDraft(
                 disclosure_id=disclosure_id,
                 ai_processing_status=AIProcessingStatus.PROCESSING,
+                sections={},
+                figure_index={},
             )
             db.add(draft)
-            db.commit()
-            db.refresh(draft)
         else:
             # Update existing draft status
             draft.ai_processing_status = AIProcessingStatus.PROCESSING
-            db.commit()
 
-        # Generate patent draft using AI
-        sections = ai_service.generate_patent_draft(disclosure.content)
+        db.commit()
+        disclosure_context_cache.invalidate(disclosure_id)
+        return {
+            "content": dict(disclosure.content or {}),
+            "draft_id": draft.id,
+            "existing_sections": list((draft.sections or {}).keys()),
+        }
+    finally:
+        db.close()
 
-        # Update draft with generated content
+
+def _save_section(disclosure_id: int, draft_id: int, section: str, content: Any, content_version: Optional[int]):
+    """Persist a single generated section as soon as it is available"""
+    db = SessionLocal()
+    try:
+        # Row lock so concurrently finishing sections don't overwrite each other
+        draft = db.query(PatentDraft).filter(PatentDraft.id == draft_id).with_for_update().first()
+        if not draft:
+            return
+        _ensure_current(db, disclosure_id, content_version)
+        sections = dict(draft.sections or {})
+        sections[section] = content
         draft.sections = sections
+        db.commit()
+        disclosure_context_cache.invalidate(disclosure_id)
+    finally:
+        db.close()
+
+
+def _models_used(previous: Optional[str], models: Dict[str, str], partial: bool) -> Optional[str]:
+    """
+    Value for PatentDraft.ai_model_used: the models that wrote the sections, comma-separated
+
+    After a partial regeneration the models recorded for the kept sections stay listed.
+    """
+    names = [name.strip() for name in (previous or "").split(",") if name.strip()] if partial else []
+    for section in DRAFT_SECTIONS:
+        if section in models and models[section] not in names:
+            names.append(models[section])
+    return ", ".join(names) or previous
+
+
+def _finish_processing(
+    disclosure_id: int,
+    draft_id: int,
+    sections: Dict[str, Any],
+    content_version: Optional[int],
+    models: Dict[str, str],
+):
+    """Store the generated draft and hand the disclosure over for review"""
+    db = SessionLocal()
+    try:
+        draft = db.query(PatentDraft).filter(PatentDraft.id == draft_id).with_for_update().first()
+        disclosure = db.query(Disclosure).filter(Disclosure.id == disclosure_id).first()
+        if not draft or not disclosure:
+            return
+        _ensure_current(db, disclosure_id, content_version)
+
+        # Update draft with generated content
+        merged = dict(draft.sections or {})
+        partial = not set(DRAFT_SECTIONS) <= set(sections)
+        merged.update(sections)
+        draft.sections = merged
         draft.ai_processing_status = AIProcessingStatus.COMPLETED
-        draft.ai_model_used = ai_service.model
+        # The router may have failed over or hedged, so record what actually answered
+        draft.ai_model_used = _models_used(draft.ai_model_used, models, partial)
+        draft.processing_error = None
 
         # Update disclosure status
         disclosure.status = DisclosureStatus.READY_FOR_REVIEW
 
         db.commit()
+        disclosure_context_cache.invalidate(disclosure_id)
+    finally:
+        db.close()
 
-        # TODO: Send notification to inventor and assigned lawyer
 
-    except Exception as e:
-        # Handle errors
+def _fail_processing(disclosure_id: int, draft_id: int, error: str):
+    """Record a generation failure on the draft"""
+    db = SessionLocal()
+    try:
+        draft = db.query(PatentDraft).filter(PatentDraft.id == draft_id).first()
         if draft:
             draft.ai_processing_status = AIProcessingStatus.FAILED
-            draft.processing_error = str(e)
+            draft.processing_error = error
 
-        disclosure.status = DisclosureStatus.DRAFT
+        disclosure = db.query(Disclosure).filter(Disclosure.id == disclosure_id).first()
+        if disclosure:
+            disclosure.status = DisclosureStatus.DRAFT
         db.commit()
+        disclosure_context_cache.invalidate(disclosure_id)
+    finally:
+        db.close()
+
+
+async def process_disclosure_async(
+    disclosure_id: int,
+    sections: Optional[List[str]] = None,
+    content_version: Optional[int] = None,
+):
+    """
+    Process disclosure with AI
+
+    Executed by the AI worker pool to generate a patent draft from the
+    disclosure content. With AI_DRAFT_PARALLEL_SECTIONS the sections are
+    generated concurrently and each one is saved as soon as it completes.
+    Database work runs in threads with short-lived sessions so the event
+    loop stays free for the LLM calls.
+
+    Args:
+        disclosure_id: ID of the disclosure to process
+        sections: Only regenerate these sections and keep the rest of the
+            existing draft (ignored if the draft has no sections yet)
+        content_version: Disclosure version being drafted; nothing is saved
+            once a newer version exists
+
+    Raises:
+        JobSuperseded: If the disclosure changed while generating
+        Exception: If generation fails (the draft is marked FAILED first,
+            and the job queue decides whether to retry)
+    """
+    state = await asyncio.to_thread(_start_processing, disclosure_id)
+    if state is None:
+        return
+    draft_id = state["draft_id"]
+
+    # Partial regeneration needs a complete draft to merge into
+    if sections and not set(DRAFT_SECTIONS) <= set(state["existing_sections"]):
+        sections = None
+
+    models: Dict[str, str] = {}
+    try:
+        # Generate patent draft using AI
+        if settings.AI_DRAFT_PARALLEL_SECTIONS:
+            async def save_section(section: str, content: Any):
+                await asyncio.to_thread(_save_section, disclosure_id, draft_id, section, content, content_version)
+
+            generated = await ai_service.generate_patent_draft_sections_async(
+                state["content"], sections=sections, on_section=save_section, models_used=models
+            )
+        else:
+            generated = await ai_service.generate_patent_draft_async(state["content"], models_used=models)
+            if sections:
+                generated = {section: generated.get(section) for section in sections}
+
+        await asyncio.to_thread(_finish_processing, disclosure_id, draft_id, generated, content_version, models)
+
+        # TODO: Send notification to inventor and assigned lawyer
+
+    except JobSuperseded:
+        # The newer job owns the draft status from here on
+        raise
+    except Exception as e:
+        # Handle errors
+        await asyncio.to_thread(_fail_processing, disclosure_id, draft_id, str(e))
+        raise
+
 
-        # TODO: Log error and notify user
+async def handle_generate_draft(job: AIJob):
+    """Job handler for AIJobType.GENERATE_DRAFT"""
+    await process_disclosure_async(
+        job.disclosure_id,
+        sections=(job.payload or {}).get("sections"),
+        content_version=job.content_version,
+    )
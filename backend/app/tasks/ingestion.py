@@ -0,0 +1,49 @@
+"""
+Document ingestion jobs
+
+After an upload, an EXTRACT_TEXT job parses the file once and stores its
+text (see app.services.document_text), so requests never parse documents.
+Files uploaded straight to storage (/files/upload-url) arrive without a
+content hash; the same job computes it by streaming the stored object and
+stores the file as its shared blob (see app.services.blobs).
+"""
+import hashlib
+from sqlalchemy.orm import Session
+from app.models.ai_job import AIJob, AIJobType
+from app.models.file import File
+from app.services.blobs import adopt_upload
+from app.services.document_text import get_document_text, ingest_file, is_extractable
+from app.services.storage import file_key, storage_for
+from app.tasks.job_queue import enqueue_job
+
+
+def enqueue_file_ingestion(db: Session, f: File):
+    """Queue hashing/text extraction for a new upload (skipped if there is nothing left to do)"""
+    if f.content_hash and (not is_extractable(f.file_extension) or get_document_text(db, f.content_hash)):
+        return
+    enqueue_job(db, AIJobType.EXTRACT_TEXT, disclosure_id=f.disclosure_id, payload={"file_id": f.id})
+
+
+def _hash_stored_file(f: File) -> str:
+    digest = hashlib.sha256()
+    for chunk in storage_for(f).iter_bytes(file_key(f)):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def handle_extract_text(job: AIJob, db: Session):
+    """Job handler for AIJobType.EXTRACT_TEXT"""
+    f = db.query(File).filter(File.id == (job.payload or {}).get("file_id")).first()
+    if not f:
+        return  # Deleted before we got to it
+    if not f.content_hash:
+        storage, key = storage_for(f), file_key(f)
+        if not storage.exists(key):
+            return
+        # Direct upload: hash it, then store it as (or point it at) the shared blob
+        f.content_hash = _hash_stored_file(f)
+        blob = adopt_upload(db, storage, key, f.content_hash, f.file_size)
+        f.blob_hash = blob.content_hash
+        f.s3_bucket = blob.bucket
+        db.commit()
+    ingest_file(db, f)
@@ -0,0 +1,238 @@
+from datetime import timedelta
+from typing import Optional, Dict, Any
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from app.core.config import settings
+from app.models.ai_job import AIJob, AIJobStatus
+from app.models.disclosure import Disclosure, DisclosureStatus
+
+
+class JobSuperseded(Exception):
+    """Raised by a handler when newer work makes its result obsolete"""
+
+
+def enqueue_job(
+    db: Session,
+    job_type: str,
+    disclosure_id: Optional[int] = None,
+    payload: Optional[Dict[str, Any]] = None,
+    delay_seconds: float = 0,
+    content_version: Optional[int] = None,
+) -> AIJob:
+    """
+    Persist a new job for the worker pool
+
+    The job is committed immediately so it survives an API restart.
+
+    Args:
+        db: Database session
+        job_type: One of AIJobType
+        disclosure_id: Disclosure the job works on (optional)
+        payload: Job-specific arguments
+        delay_seconds: Earliest start, relative to now
+        content_version: Disclosure version the job is for (optional)
+
+    Returns:
+        The created AIJob
+    """
+    run_after = func.now()
+    if delay_seconds:
+        run_after = func.now() + timedelta(seconds=delay_seconds)
+
+    job = AIJob(
+        job_type=job_type,
+        disclosure_id=disclosure_id,
+        payload=payload or {},
+        status=AIJobStatus.PENDING,
+        attempts=0,
+        max_attempts=settings.AI_JOB_MAX_ATTEMPTS,
+        run_after=run_after,
+        content_version=content_version,
+        cancel_requested=False,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def find_pending_job(db: Session, job_type: str, disclosure_id: int) -> Optional[AIJob]:
+    """Lock and return the queued (not yet started) job of this type for a disclosure, if any"""
+    return (
+        db.query(AIJob)
+        .filter(
+            AIJob.job_type == job_type,
+            AIJob.disclosure_id == disclosure_id,
+            AIJob.status == AIJobStatus.PENDING,
+        )
+        .order_by(AIJob.id.desc())
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+
+
+def request_cancellation(db: Session, job_type: str, disclosure_id: int) -> list[AIJob]:
+    """
+    Flag running jobs of this type for a disclosure as superseded
+
+    The worker polls the flag and cancels the job. Returns the flagged jobs
+    (not committed, so callers can fold this into their own transaction).
+    """
+    running_jobs = db.query(AIJob).filter(
+        AIJob.job_type == job_type,
+        AIJob.disclosure_id == disclosure_id,
+        AIJob.status == AIJobStatus.RUNNING,
+        AIJob.cancel_requested.is_(False),
+    ).all()
+    for job in running_jobs:
+        job.cancel_requested = True
+    return running_jobs
+
+
+def is_cancel_requested(db: Session, job_id: int) -> bool:
+    """Check whether a running job has been superseded"""
+    return bool(db.query(AIJob.cancel_requested).filter(AIJob.id == job_id).scalar())
+
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[AIJob]:
+    """
+    Atomically claim the oldest runnable job
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers never
+    claim the same row and never block on each other.
+
+    Returns:
+        The claimed job (now RUNNING), or None if the queue is empty
+    """
+    job = (
+        db.query(AIJob)
+        .filter(AIJob.status == AIJobStatus.PENDING, AIJob.run_after <= func.now())
+        .order_by(AIJob.run_after.asc(), AIJob.id.asc())
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if not job:
+        db.rollback()
+        return None
+
+    job.status = AIJobStatus.RUNNING
+    job.locked_by = worker_id
+    job.locked_at = func.now()
+    job.attempts += 1
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def heartbeat_jobs(db: Session, job_ids: list[int], worker_id: str) -> None:
+    """Refresh locked_at for jobs still held by this worker"""
+    if not job_ids:
+        return
+    db.query(AIJob).filter(
+        AIJob.id.in_(job_ids),
+        AIJob.locked_by == worker_id,
+        AIJob.status == AIJobStatus.RUNNING,
+    ).update({AIJob.locked_at: func.now()}, synchronize_session=False)
+    db.commit()
+
+
+def complete_job(db: Session, job_id: int) -> None:
+    """Mark a job as successfully finished"""
+    db.query(AIJob).filter(AIJob.id == job_id).update(
+        {
+            AIJob.status: AIJobStatus.COMPLETED,
+            AIJob.locked_by: None,
+            AIJob.completed_at: func.now(),
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def cancel_job(db: Session, job_id: int) -> None:
+    """Mark a superseded job as cancelled"""
+    db.query(AIJob).filter(AIJob.id == job_id).update(
+        {
+            AIJob.status: AIJobStatus.CANCELLED,
+            AIJob.locked_by: None,
+            AIJob.completed_at: func.now(),
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def fail_job(db: Session, job_id: int, error: str) -> None:
+    """
+    Record a job failure
+
+    Jobs with attempts left go back to PENDING with exponential backoff;
+    otherwise they are marked FAILED.
+    """
+    job = db.query(AIJob).filter(AIJob.id == job_id).first()
+    if not job:
+        return
+
+    job.last_error = error
+    job.locked_by = None
+    if job.attempts < job.max_attempts:
+        job.status = AIJobStatus.PENDING
+        job.run_after = func.now() + timedelta(seconds=30 * (2 ** (job.attempts - 1)))
+    else:
+        job.status = AIJobStatus.FAILED
+        job.completed_at = func.now()
+    db.commit()
+
+
+def recover_stuck_jobs(db: Session) -> int:
+    """
+    Requeue jobs whose worker died mid-run
+
+    A RUNNING job whose heartbeat is older than AI_JOB_STALE_AFTER_SECONDS
+    is returned to PENDING (or FAILED once out of attempts). Disclosures left
+    in AI_PROCESSING with no live job and no job activity within
+    AI_JOB_STALE_AFTER_SECONDS are reset to DRAFT; a job that has just
+    finished may still be committing the disclosure's new status.
+
+    Returns:
+        Number of jobs recovered
+    """
+    stale_before = func.now() - timedelta(seconds=settings.AI_JOB_STALE_AFTER_SECONDS)
+    stuck_jobs = (
+        db.query(AIJob)
+        .filter(AIJob.status == AIJobStatus.RUNNING, AIJob.locked_at < stale_before)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+    for job in stuck_jobs:
+        job.locked_by = None
+        job.last_error = "Worker stopped responding; job recovered"
+        if job.cancel_requested:
+            # Superseded anyway; the newer job covers its work
+            job.status = AIJobStatus.CANCELLED
+            job.completed_at = func.now()
+        elif job.attempts < job.max_attempts:
+            job.status = AIJobStatus.PENDING
+            job.run_after = func.now()
+        else:
+            job.status = AIJobStatus.FAILED
+            job.completed_at = func.now()
+    db.commit()
+
+    # Disclosures stuck in AI_PROCESSING without a pending/running or recently active job
+    active_jobs = select(AIJob.disclosure_id).where(
+        AIJob.disclosure_id.isnot(None),
+        or_(
+            AIJob.status.in_([AIJobStatus.PENDING, AIJobStatus.RUNNING]),
+            func.coalesce(AIJob.completed_at, AIJob.locked_at, AIJob.created_at) >= stale_before,
+        ),
+    )
+    db.query(Disclosure).filter(
+        Disclosure.status == DisclosureStatus.AI_PROCESSING,
+        Disclosure.id.notin_(active_jobs),
+    ).update({Disclosure.status: DisclosureStatus.DRAFT}, synchronize_session=False)
+    db.commit()
+
+    return len(stuck_jobs)
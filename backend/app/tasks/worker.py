@@ -0,0 +1,222 @@
+"""
+AI worker pool
+
+Executes jobs from the ai_jobs table with bounded concurrency. Async handlers
+run on the worker's event loop (sharing the async LLM connection pools); sync
+handlers run in a thread with their own database session. Either way the API
+never shares request-scoped sessions with long-running LLM work.
+
+Running async jobs are watched for cancel requests (set when newer work
+supersedes them) and stopped promptly; they end up CANCELLED, not FAILED.
+
+Run standalone (recommended for production):
+    python -m app.tasks.worker
+
+Or inside the API process by setting AI_WORKER_IN_PROCESS=True.
+"""
+import asyncio
+import os
+import signal
+import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.ai_job import AIJob, AIJobType
+from app.services.llm_router import llm_router
+from app.tasks.ai_processing import handle_generate_draft
+from app.tasks.ingestion import handle_extract_text
+from app.tasks.job_queue import (
+    JobSuperseded,
+    cancel_job,
+    claim_next_job,
+    complete_job,
+    fail_job,
+    heartbeat_jobs,
+    is_cancel_requested,
+    recover_stuck_jobs,
+)
+
+# job_type -> handler: `async def handler(job)` or `def handler(job, db)`
+JOB_HANDLERS: Dict[str, Callable] = {
+    AIJobType.GENERATE_DRAFT: handle_generate_draft,
+    AIJobType.EXTRACT_TEXT: handle_extract_text,
+}
+
+
+class JobWorker:
+    """Polls the job table and runs up to `concurrency` jobs at once"""
+
+    def __init__(self, concurrency: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.concurrency = concurrency or settings.AI_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.AI_WORKER_POLL_INTERVAL_SECONDS
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency + 1, thread_name_prefix="ai-worker")
+        self._running_job_ids: set[int] = set()
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        """Run until stop() is called"""
+        await self._in_thread(self._recover)
+        print(f"🤖 AI worker {self.worker_id} started (concurrency={self.concurrency})")
+
+        tasks = [asyncio.create_task(self._slot_loop()) for _ in range(self.concurrency)]
+        tasks.append(asyncio.create_task(self._heartbeat_loop()))
+        tasks.append(asyncio.create_task(self._recovery_loop()))
+        try:
+            await self._stopping.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._executor.shutdown(wait=False)
+            print(f"🤖 AI worker {self.worker_id} stopped")
+
+    def stop(self):
+        self._stopping.set()
+
+    async def _in_thread(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def _slot_loop(self):
+        """One concurrency slot: claim a job, run it, repeat"""
+        while not self._stopping.is_set():
+            try:
+                ran_job = await self._run_next_job()
+            except Exception as e:
+                print(f"⚠️  AI worker error: {e}")
+                ran_job = False
+            if not ran_job:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _heartbeat_loop(self):
+        """Keep claimed jobs alive"""
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=settings.AI_JOB_HEARTBEAT_SECONDS)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self._in_thread(self._heartbeat)
+            except Exception as e:
+                print(f"⚠️  AI worker heartbeat failed: {e}")
+
+    async def _recovery_loop(self):
+        """Periodically recover jobs from dead workers (a full table scan, so much less often than heartbeats)"""
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=settings.AI_JOB_RECOVERY_INTERVAL_SECONDS)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self._in_thread(self._recover)
+            except Exception as e:
+                print(f"⚠️  AI job recovery failed: {e}")
+
+    async def _run_next_job(self) -> bool:
+        """Claim and execute a single job. Returns False if the queue was empty."""
+        job = await self._in_thread(self._claim)
+        if not job:
+            return False
+
+        self._running_job_ids.add(job.id)
+        try:
+            handler = JOB_HANDLERS.get(job.job_type)
+            if handler is None:
+                raise ValueError(f"Unknown job type: {job.job_type}")
+            if asyncio.iscoroutinefunction(handler):
+                await self._run_cancellable(handler, job)
+            else:
+                await self._in_thread(self._run_sync_handler, handler, job)
+            await self._in_thread(self._with_session, complete_job, job.id)
+        except JobSuperseded as e:
+            print(f"⏭️  AI job {job.id} superseded: {e}")
+            await self._in_thread(self._with_session, cancel_job, job.id)
+        except Exception as e:
+            await self._in_thread(self._with_session, fail_job, job.id, str(e))
+        finally:
+            self._running_job_ids.discard(job.id)
+        return True
+
+    async def _run_cancellable(self, handler, job: AIJob):
+        """
+        Await an async handler, cancelling it if the job gets a cancel request
+
+        Raises:
+            JobSuperseded: If the job was cancelled through the queue
+        """
+        task = asyncio.create_task(handler(job))
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=settings.AI_JOB_CANCEL_POLL_SECONDS)
+                if done:
+                    return task.result()
+                if await self._in_thread(self._with_session, is_cancel_requested, job.id):
+                    raise JobSuperseded("cancel requested")
+        finally:
+            # Also reached when this slot is cancelled on shutdown: never leave the handler running
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    def _claim(self) -> Optional[AIJob]:
+        return self._with_session(claim_next_job, self.worker_id)
+
+    def _run_sync_handler(self, handler, job: AIJob):
+        db = SessionLocal()
+        try:
+            handler(job, db)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _with_session(fn, *args):
+        """Call a job_queue helper as fn(db, *args) with a fresh session"""
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    def _heartbeat(self):
+        db = SessionLocal()
+        try:
+            heartbeat_jobs(db, list(self._running_job_ids), self.worker_id)
+        finally:
+            db.close()
+
+    def _recover(self):
+        db = SessionLocal()
+        try:
+            recovered = recover_stuck_jobs(db)
+            if recovered:
+                print(f"♻️  Recovered {recovered} stuck AI job(s)")
+        finally:
+            db.close()
+
+
+def main():
+    worker = JobWorker()
+
+    async def _run():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        try:
+            await worker.run()
+        finally:
+            # LLM connection pools belong to this loop
+            await llm_router.aclose()
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
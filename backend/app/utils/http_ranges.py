@@ -0,0 +1,67 @@
+"""
+HTTP conditional and range request helpers (RFC 9110)
+
+Used by the file download/preview endpoints, whose bytes never change for a
+given URL, so a strong ETag can be derived from the content hash.
+"""
+from typing import Optional, Tuple
+
+
+class RangeNotSatisfiable(Exception):
+    """The Range header does not overlap the content"""
+
+
+def make_etag(content_hash: Optional[str]) -> Optional[str]:
+    return f'"{content_hash}"' if content_hash else None
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison, as the RFC requires for it)"""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def parse_range(header: Optional[str], size: int, if_range: Optional[str] = None, etag: Optional[str] = None) -> Optional[Tuple[int, int]]:
+    """
+    Byte range requested by a Range header
+
+    Only single ranges are served; multiple ranges, malformed headers and
+    an If-Range that does not match the strong ETag all mean "send the whole
+    file" (None), as the RFC allows.
+
+    Returns:
+        (start, end) with end exclusive, or None for the full content
+
+    Raises:
+        RangeNotSatisfiable: If the range lies entirely past the end
+    """
+    if not header or size == 0:
+        return None
+    if if_range is not None and (etag is None or if_range.strip() != etag):
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size
+        start = int(first)
+        end = int(last) + 1 if last else size
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end <= start:
+        return None
+    return start, min(end, size)
@@ -0,0 +1,176 @@
+"""
+Structural parser for patent documents
+
+Splits extracted patent text into its standard sections (abstract, field,
+background, summary, drawings, detailed description, claims) and the claims
+section into numbered claims with their dependencies. Everything is stored
+as character offsets into the text, so the index stays small enough to keep
+on the disclosure (Disclosure.patent_index) and any section can be sliced
+back out of the stored document text.
+
+Index format:
+    {
+        "version": 1,
+        "text_length": 48211,
+        "sections": {"abstract": [120, 980], "claims": [40210, 48211], ...},
+        "claims": [{"number": 1, "start": 40250, "end": 41020, "depends_on": []}, ...],
+        "claim_counts": {"total": 20, "independent": 3, "dependent": 17}
+    }
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from app.utils.text_chunking import SECTION_HEADING_PATTERN
+
+INDEX_VERSION = 1
+
+# Section keys in the order they are sent to the model for analysis
+SECTION_ORDER = ["abstract", "claims", "summary", "field", "background", "detailed_description", "drawings"]
+
+_HEADINGS = re.compile(SECTION_HEADING_PATTERN.pattern, re.IGNORECASE | re.MULTILINE)
+
+# Claims intro that shares its line with the first claim ("What is claimed is: 1. A method ...")
+_CLAIMS_INTRO = re.compile(r"(?:what is claimed is|we claim|i claim|the invention claimed is)\s*:", re.IGNORECASE)
+
+# A claim starts a line: "1. A device ..." / "12 . The method ..."
+_CLAIM_START = re.compile(r"^[ \t]*(\d{1,3})[ \t]*\.[ \t]+(?=\S)", re.MULTILINE)
+
+# "claim 3", "claims 1 or 2", "any one of claims 1 to 4", "claims 1-3, 5 and 7"
+_CLAIM_REFERENCE = re.compile(
+    r"\bclaims?\s+(\d{1,3}(?:\s*(?:,|or|and|to|through|-|–)\s*(?:claim\s+)?\d{1,3})*)",
+    re.IGNORECASE,
+)
+_REFERENCE_RANGE = re.compile(r"(\d{1,3})\s*(?:to|through|-|–)\s*(\d{1,3})")
+
+# How far into a claim to look for its dependency ("The method of claim 1, ...")
+_DEPENDENCY_WINDOW = 250
+
+
+def _section_key(heading: str) -> str:
+    heading = heading.lower()
+    if heading.startswith("abstract"):
+        return "abstract"
+    if "field" in heading:
+        return "field"
+    if heading.startswith("background"):
+        return "background"
+    if "drawing" in heading:
+        return "drawings"
+    if "summary" in heading:
+        return "summary"
+    if "description" in heading:
+        return "detailed_description"
+    return "claims"
+
+
+def _find_sections(text: str) -> Dict[str, Tuple[int, int]]:
+    """(start, end) of each section body; the first occurrence of a repeated heading wins"""
+    headings = [(match.start(), match.end(), _section_key(match.group(1))) for match in _HEADINGS.finditer(text)]
+
+    # Claims introduced mid-line are only used when there is no claims heading
+    if not any(key == "claims" for _, _, key in headings):
+        intros = list(_CLAIMS_INTRO.finditer(text))
+        if intros:
+            last = intros[-1]
+            headings.append((last.start(), last.end(), "claims"))
+            headings.sort()
+
+    sections: Dict[str, Tuple[int, int]] = {}
+    for i, (_, body_start, key) in enumerate(headings):
+        body_end = headings[i + 1][0] if i + 1 < len(headings) else len(text)
+        if key not in sections and text[body_start:body_end].strip():
+            sections[key] = (body_start, body_end)
+    return sections
+
+
+def _parse_references(text: str) -> List[int]:
+    """Claim numbers referred to in text, with ranges expanded"""
+    numbers: List[int] = []
+    for match in _CLAIM_REFERENCE.finditer(text):
+        refs = match.group(1)
+        for low, high in _REFERENCE_RANGE.findall(refs):
+            low, high = int(low), int(high)
+            if low < high <= low + 200:
+                numbers.extend(range(low, high + 1))
+        numbers.extend(int(number) for number in re.findall(r"\d{1,3}", refs))
+    return sorted(set(numbers))
+
+
+def parse_claims(text: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """
+    Numbered claims in text[start:end] with their dependencies
+
+    Claim numbers must run 1, 2, 3, ... so numbered lists inside a claim
+    ("2. a second member" in claim 7) are not mistaken for new claims.
+    """
+    starts = []
+    expected = 1
+    # Match on the slice so the first claim may directly follow "What is claimed is:"
+    for match in _CLAIM_START.finditer(text[start:end]):
+        if int(match.group(1)) == expected:
+            starts.append((expected, start + match.start()))
+            expected += 1
+
+    claims = []
+    for i, (number, claim_start) in enumerate(starts):
+        claim_end = starts[i + 1][1] if i + 1 < len(starts) else end
+        head = text[claim_start:min(claim_end, claim_start + _DEPENDENCY_WINDOW)]
+        depends_on = [ref for ref in _parse_references(head) if ref < number]
+        claims.append({"number": number, "start": claim_start, "end": claim_end, "depends_on": depends_on})
+    return claims
+
+
+def parse_patent(text: str) -> Dict[str, Any]:
+    """
+    Build the section and claim index for a patent's text
+
+    Args:
+        text: Full extracted patent text
+
+    Returns:
+        Index dict (see module docstring)
+    """
+    sections = _find_sections(text)
+    claims = parse_claims(text, *sections["claims"]) if "claims" in sections else []
+    independent = sum(1 for claim in claims if not claim["depends_on"])
+    return {
+        "version": INDEX_VERSION,
+        "text_length": len(text),
+        "sections": {key: list(span) for key, span in sections.items()},
+        "claims": claims,
+        "claim_counts": {
+            "total": len(claims),
+            "independent": independent,
+            "dependent": len(claims) - independent,
+        },
+    }
+
+
+def section_text(text: str, index: Dict[str, Any], key: str) -> Optional[str]:
+    """Text of one section, or None if the patent has no such section"""
+    span = (index.get("sections") or {}).get(key)
+    return text[span[0]:span[1]].strip() if span else None
+
+
+def claim_tree(index: Dict[str, Any]) -> str:
+    """One line per independent claim listing its dependents, e.g. "Claim 1 (independent): 2, 3, 5" """
+    claims = index.get("claims") or []
+    children: Dict[int, List[int]] = {claim["number"]: [] for claim in claims}
+    roots = []
+    for claim in claims:
+        if claim["depends_on"]:
+            children.setdefault(claim["depends_on"][0], []).append(claim["number"])
+        else:
+            roots.append(claim["number"])
+
+    def descendants(number: int) -> List[int]:
+        found = []
+        for child in children.get(number, []):
+            found.append(child)
+            found.extend(descendants(child))
+        return found
+
+    lines = []
+    for root in roots:
+        dependents = sorted(descendants(root))
+        lines.append(f"Claim {root} (independent): " + (", ".join(map(str, dependents)) if dependents else "no dependents"))
+    return "\n".join(lines)
@@ -0,0 +1,119 @@
+"""
+Structure-aware text chunking for long documents (patents in particular)
+
+Text is split at section headings first (BACKGROUND, SUMMARY, CLAIMS, ...),
+then at paragraph breaks, and paragraphs are packed into chunks of at most
+`max_chars`. Only paragraphs longer than a whole chunk are cut mid-text, at
+sentence boundaries where possible.
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+# Common patent section headings (matched case-insensitively on their own line)
+SECTION_HEADING_PATTERN = re.compile(
+    r"^\s*(?:\d+\.?\s*)?("
+    r"technical field|field(?: of the (?:invention|disclosure))?|"
+    r"background(?: of the (?:invention|disclosure))?|"
+    r"(?:brief )?summary(?: of the (?:invention|disclosure))?|"
+    r"brief description of (?:the )?drawings?|"
+    r"detailed description(?: of (?:the )?(?:invention|preferred embodiments?|embodiments?))?|"
+    r"description of (?:the )?(?:preferred )?embodiments?|"
+    r"claims|what is claimed is|we claim|i claim|"
+    r"abstract(?: of the disclosure)?"
+    r")\s*:?\s*$",
+    re.IGNORECASE,
+)
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.;:!?])\s+")
+
+
+@dataclass
+class TextChunk:
+    """A piece of a document with the section it came from"""
+    index: int
+    section: Optional[str]
+    text: str
+
+
+def split_sections(text: str) -> List[tuple]:
+    """
+    Split text at recognized section headings
+
+    Returns:
+        List of (heading or None, body) in document order
+    """
+    sections = []
+    heading: Optional[str] = None
+    lines: List[str] = []
+    for line in text.splitlines():
+        match = SECTION_HEADING_PATTERN.match(line)
+        if match:
+            if any(part.strip() for part in lines):
+                sections.append((heading, "\n".join(lines).strip()))
+            heading = match.group(1).upper()
+            lines = []
+        else:
+            lines.append(line)
+    if any(part.strip() for part in lines):
+        sections.append((heading, "\n".join(lines).strip()))
+    return sections
+
+
+def _split_long_paragraph(paragraph: str, max_chars: int) -> List[str]:
+    """Cut an oversized paragraph at sentence boundaries (hard cut as a last resort)"""
+    pieces: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END.split(paragraph):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text: str, max_chars: int = 12000) -> List[TextChunk]:
+    """
+    Split a document into chunks on structural boundaries
+
+    Chunks never span two sections, so each one can be labelled with the
+    section it belongs to.
+
+    Args:
+        text: Full document text
+        max_chars: Upper bound on chunk length
+
+    Returns:
+        Chunks in document order
+    """
+    chunks: List[TextChunk] = []
+
+    def emit(section: Optional[str], body: str):
+        chunks.append(TextChunk(index=len(chunks), section=section, text=body))
+
+    for section, body in split_sections(text):
+        current = ""
+        for paragraph in _PARAGRAPH_BREAK.split(body):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            parts = [paragraph] if len(paragraph) <= max_chars else _split_long_paragraph(paragraph, max_chars)
+            for part in parts:
+                if current and len(current) + 2 + len(part) > max_chars:
+                    emit(section, current)
+                    current = part
+                else:
+                    current = f"{current}\n\n{part}" if current else part
+        if current:
+            emit(section, current)
+    return chunks
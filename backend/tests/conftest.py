@@ -0,0 +1,24 @@
+import os
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+# Settings are read when app modules are imported; tests run offline on SQLite and the fake LLM provider
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("PRIMARY_LLM_PROVIDER", "fake")
+os.environ.setdefault("LLM_PROVIDERS", "fake")
+
+
+@pytest.fixture
+def db():
+    """Session on a fresh in-memory database with every table"""
+    import app.models  # noqa: F401  (registers every table)
+    from app.core.database import Base
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    yield session
+    session.close()
+    engine.dispose()
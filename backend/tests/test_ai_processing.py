@@ -0,0 +1,50 @@
+"""Carrying draft sections owed by failed or cancelled jobs into the next enqueue"""
+from app.models.ai_job import AIJob, AIJobStatus, AIJobType
+from app.tasks.ai_processing import enqueue_disclosure_processing, unfinished_draft_sections
+
+DISCLOSURE_ID = 1
+
+
+def _job(db, status, sections=None):
+    db.add(AIJob(
+        job_type=AIJobType.GENERATE_DRAFT,
+        disclosure_id=DISCLOSURE_ID,
+        payload={"sections": sections} if sections else {},
+        status=status,
+    ))
+    db.commit()
+
+
+def test_nothing_owed_after_completed_jobs(db):
+    _job(db, AIJobStatus.COMPLETED)
+    _job(db, AIJobStatus.COMPLETED, ["summary"])
+    assert unfinished_draft_sections(db, DISCLOSURE_ID) == []
+
+
+def test_failed_and_cancelled_sections_are_owed(db):
+    _job(db, AIJobStatus.COMPLETED)
+    _job(db, AIJobStatus.FAILED, ["claims"])
+    _job(db, AIJobStatus.CANCELLED, ["abstract", "background"])
+    assert unfinished_draft_sections(db, DISCLOSURE_ID) == ["background", "claims", "abstract"]
+
+
+def test_later_completion_covers_earlier_failure(db):
+    _job(db, AIJobStatus.FAILED, ["claims", "summary"])
+    _job(db, AIJobStatus.COMPLETED, ["claims"])
+    assert unfinished_draft_sections(db, DISCLOSURE_ID) == ["summary"]
+
+
+def test_failed_full_generation_owes_everything(db):
+    _job(db, AIJobStatus.COMPLETED)
+    _job(db, AIJobStatus.FAILED)
+    assert unfinished_draft_sections(db, DISCLOSURE_ID) is None
+
+
+def test_enqueue_merges_owed_sections(db):
+    _job(db, AIJobStatus.COMPLETED)
+    _job(db, AIJobStatus.FAILED, ["claims"])
+
+    job = enqueue_disclosure_processing(db, DISCLOSURE_ID, sections=["summary"], content_version=2, debounce=False)
+
+    assert job.payload == {"sections": ["summary", "claims"]}
+    assert job.status == AIJobStatus.PENDING
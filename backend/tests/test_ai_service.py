@@ -0,0 +1,33 @@
+"""Response cache keys and cacheability for routed completions"""
+from app.services.ai_service import AIService
+from app.services.llm_providers import FakeProvider, PROVIDER_MODELS
+from app.services.llm_router import LLMRouter, RoutedCompletion
+
+MESSAGES = [{"role": "user", "content": "draft"}]
+
+
+def _service(*names: str) -> AIService:
+    service = AIService()
+    service.llm = LLMRouter(["fake"])
+    service.llm.providers = {name: FakeProvider() for name in names}
+    service.llm.primary = names[0]
+    return service
+
+
+def test_cache_key_changes_with_the_tiers_providers_and_models(monkeypatch):
+    service = _service("fake")
+    key = service._cache_key(MESSAGES, "system", "quality", 0.3)
+    assert key == service._cache_key(MESSAGES, "system", "quality", 0.3)
+
+    assert _service("fake", "other")._cache_key(MESSAGES, "system", "quality", 0.3) != key
+
+    # A model upgrade for the tier starts a fresh cache
+    monkeypatch.setitem(PROVIDER_MODELS, "fake", {"quality": "fake-quality-2", "fast": "fake-fast"})
+    assert _service("fake")._cache_key(MESSAGES, "system", "quality", 0.3) != key
+
+
+def test_fake_results_are_cached_only_when_fake_is_primary():
+    fake_result = RoutedCompletion("text", "fake", "fake-quality")
+    assert _service("fake")._cacheable(fake_result)
+    assert not _service("openai-stand-in", "fake")._cacheable(fake_result)
+    assert _service("openai-stand-in", "fake")._cacheable(RoutedCompletion("text", "openai-stand-in", "m"))
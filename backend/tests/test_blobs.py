@@ -0,0 +1,139 @@
+"""
+Storage deletes queued by app.services.blobs run only after the outermost commit
+
+adopt_upload() uses a savepoint, whose release/rollback also fires the
+Session after_commit/after_rollback hooks; neither may touch the outer
+transaction's queue. Deleting an unused blob and adopting the same content
+again are serialized by the content lock.
+"""
+import threading
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+import app.models  # noqa: F401  (registers every mapper)
+from app.models.file_blob import FileBlob
+from app.services import blobs
+from app.services.storage import LocalStorage, blob_key
+
+CONTENT = b"same bytes"
+CONTENT_HASH = "ab" * 32
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    FileBlob.__table__.create(engine)
+    return engine
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    storage.put_bytes("old/object", b"released earlier")
+    storage.put_bytes("incoming/upload", CONTENT)
+    return storage
+
+
+def _queue_earlier_delete(db: Session, storage: LocalStorage):
+    blobs._after_commit(db, lambda: storage.delete("old/object"))
+
+
+def _force_insert_race(monkeypatch, engine):
+    # Another upload of the same bytes commits its blob between our lookup and insert
+    other = Session(engine)
+    other.add(FileBlob(content_hash=CONTENT_HASH, bucket=LocalStorage.bucket, size=len(CONTENT), ref_count=1))
+    other.commit()
+    other.close()
+    real = blobs._locked_blob
+    calls = []
+
+    def locked_blob(db, content_hash):
+        calls.append(content_hash)
+        return None if len(calls) == 1 else real(db, content_hash)
+
+    monkeypatch.setattr(blobs, "_locked_blob", locked_blob)
+
+
+@pytest.mark.parametrize("race", [False, True], ids=["new-blob", "integrity-error"])
+def test_outer_rollback_keeps_queued_objects(engine, storage, monkeypatch, race):
+    if race:
+        _force_insert_race(monkeypatch, engine)
+    db = Session(engine)
+    _queue_earlier_delete(db, storage)
+
+    blobs.adopt_upload(db, storage, "incoming/upload", CONTENT_HASH, len(CONTENT))
+    assert storage.exists("old/object")  # not run by the savepoint release
+
+    db.rollback()
+    db.close()
+    assert storage.exists("old/object")
+    assert storage.exists("incoming/upload")
+
+
+@pytest.mark.parametrize("race", [False, True], ids=["new-blob", "integrity-error"])
+def test_outer_commit_runs_queued_deletes(engine, storage, monkeypatch, race):
+    if race:
+        _force_insert_race(monkeypatch, engine)
+    db = Session(engine)
+    _queue_earlier_delete(db, storage)
+
+    blob = blobs.adopt_upload(db, storage, "incoming/upload", CONTENT_HASH, len(CONTENT))
+    db.commit()
+
+    assert blob.ref_count == (2 if race else 1)
+    db.close()
+    assert not storage.exists("old/object")  # not dropped by the savepoint rollback
+    assert not storage.exists("incoming/upload")
+    assert storage.read(blob_key(CONTENT_HASH)) == CONTENT
+
+
+def test_blob_delete_and_adopt_of_same_content_serialize(tmp_path, storage, monkeypatch):
+    """An upload cannot re-create the blob between the deferred delete's row check and its object delete"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'blobs.db'}", connect_args={"check_same_thread": False})
+    FileBlob.__table__.create(engine)
+    storage.put_bytes(blob_key(CONTENT_HASH), CONTENT)  # Released blob: row gone, object not yet deleted
+
+    # Stand-in for the Postgres advisory lock: held until the session's transaction ends
+    content_lock = threading.Lock()
+
+    def lock_content(db, content_hash):
+        content_lock.acquire()
+        event.listen(db, "after_transaction_end", lambda session, transaction: content_lock.release(), once=True)
+
+    checked, resume = threading.Event(), threading.Event()
+    real_delete = storage.delete
+
+    def delete(key):
+        if key == blob_key(CONTENT_HASH):
+            # The row check has passed; let the upload try to run now
+            checked.set()
+            resume.wait(5)
+        real_delete(key)
+
+    monkeypatch.setattr(blobs, "_lock_content", lock_content)
+    monkeypatch.setattr(blobs, "storage_for_bucket", lambda bucket: storage)
+    monkeypatch.setattr(storage, "delete", delete)
+
+    deleter = threading.Thread(target=blobs._delete_unused_blob, args=(Session(engine), LocalStorage.bucket, CONTENT_HASH))
+    deleter.start()
+    assert checked.wait(5)
+
+    def upload():
+        db = Session(engine)
+        blobs.adopt_upload(db, storage, "incoming/upload", CONTENT_HASH, len(CONTENT))
+        db.commit()
+        db.close()
+
+    uploader = threading.Thread(target=upload)
+    uploader.start()
+    uploader.join(0.3)
+    assert uploader.is_alive()  # waits for the delete to finish
+
+    resume.set()
+    deleter.join(5)
+    uploader.join(5)
+
+    check = Session(engine)
+    assert check.get(FileBlob, CONTENT_HASH).ref_count == 1
+    check.close()
+    assert storage.read(blob_key(CONTENT_HASH)) == CONTENT
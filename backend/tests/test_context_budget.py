@@ -0,0 +1,75 @@
+"""Token estimates, truncation and priority/quota allocation in the context budgeter"""
+from app.services.context_budget import (
+    TRUNCATION_MARKER,
+    ContextBudgeter,
+    estimate_tokens,
+    format_fields,
+    truncate_to_tokens,
+)
+
+
+def _budgeter(budget: int, **sources) -> ContextBudgeter:
+    """Sources given as name=(tokens, priority, quota); text sized to the token count"""
+    budgeter = ContextBudgeter(budget)
+    for name, (tokens, priority, quota) in sources.items():
+        budgeter.add(name, "abcd" * (tokens - 1), priority=priority, quota=quota)
+    return budgeter
+
+
+def _allocated(budgeter: ContextBudgeter) -> dict:
+    budgeter._allocate()
+    return {name: usage["allocated"] for name, usage in budgeter.usage().items()}
+
+
+def test_heuristic_counts_cjk_per_character():
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("專利申請") == 4
+    assert estimate_tokens("") == 0
+
+
+def test_everything_fits():
+    budgeter = _budgeter(100, content=(10, 0, None), draft=(20, 1, None))
+    assert _allocated(budgeter) == {"content": 10, "draft": 20}
+
+
+def test_priority_order_when_over_budget():
+    budgeter = _budgeter(25, draft=(20, 1, None), content=(10, 0, None), files=(10, 2, None))
+    assert _allocated(budgeter) == {"draft": 15, "content": 10, "files": 0}
+
+
+def test_quota_caps_first_pass_and_leftover_goes_back_by_priority():
+    # draft is more important but capped at 10 first, so files get a share;
+    # what is left then tops up draft before files
+    budgeter = _budgeter(40, draft=(30, 0, 10), files=(30, 1, 20))
+    assert _allocated(budgeter) == {"draft": 20, "files": 20}
+
+
+def test_pack_keeps_insertion_order_and_truncates_partial_sources():
+    budgeter = ContextBudgeter(12)
+    budgeter.add("first", "x" * 16, priority=1)  # 4 tokens (+1): kept whole
+    budgeter.add("second", "y" * 80, priority=2)  # 20 tokens (+1): cut to the remaining 7
+    packed = budgeter.pack()
+
+    first, second = packed.split("\n", 1)
+    assert first == "x" * 16
+    assert second.startswith("y") and second.endswith(TRUNCATION_MARKER)
+    assert estimate_tokens(packed) <= 12
+
+
+def test_empty_sources_are_ignored():
+    budgeter = ContextBudgeter(10)
+    budgeter.add("empty", "", priority=0)
+    assert budgeter.pack() == ""
+    assert budgeter.usage() == {}
+
+
+def test_truncate_prefers_a_line_break():
+    text = "line one is here\n" + "z" * 200
+    cut = truncate_to_tokens(text, 10)
+    assert estimate_tokens(cut) <= 10
+    assert cut.endswith(TRUNCATION_MARKER)
+    assert truncate_to_tokens("short", 10) == "short"
+
+
+def test_format_fields_skips_empty_values():
+    assert format_fields({"problem": "heat", "tags": ["a"], "empty": "", "none": None}) == 'problem: heat\ntags: ["a"]'
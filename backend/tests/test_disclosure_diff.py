@@ -0,0 +1,31 @@
+"""Mapping disclosure content edits onto the draft sections to regenerate"""
+from app.services.ai_service import DRAFT_SECTIONS
+from app.services.disclosure_diff import FIELD_SECTION_MAP, affected_sections, changed_fields
+
+CONTENT = {"problem": "Fins are bulky", "solution": "Fold them", "advantages": ["smaller"]}
+
+
+def test_changed_fields_covers_edits_additions_and_removals():
+    new = {"problem": "Fins are heavy", "solution": "Fold them", "prior_art": "US 1"}
+    assert changed_fields(CONTENT, new) == ["advantages", "prior_art", "problem"]
+    assert changed_fields(None, {"problem": "x"}) == ["problem"]
+    assert changed_fields(CONTENT, dict(CONTENT)) == []
+
+
+def test_sections_come_back_in_document_order():
+    new = dict(CONTENT, advantages=["smaller", "cheaper"], problem="Fins are heavy")
+    assert affected_sections(CONTENT, new) == ["background", "summary", "abstract"]
+
+
+def test_unchanged_content_regenerates_nothing():
+    assert affected_sections(CONTENT, dict(CONTENT)) == []
+    assert affected_sections(None, None) == []
+
+
+def test_unknown_field_affects_every_section():
+    assert affected_sections(CONTENT, dict(CONTENT, sketches=["fig1"])) == DRAFT_SECTIONS
+
+
+def test_every_mapped_section_is_a_draft_section():
+    for sections in FIELD_SECTION_MAP.values():
+        assert set(sections) <= set(DRAFT_SECTIONS)
@@ -0,0 +1,124 @@
+"""Token buckets, AIMD concurrency and first-come-first-served queueing in the LLM limiter"""
+import asyncio
+import threading
+import time
+import pytest
+from app.core.config import settings
+from app.services import llm_limiter as limiter_module
+from app.services.llm_limiter import LLMLimiter, _TokenBucket
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY_PER_PROVIDER", 32)
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY_PER_MODEL", 4)
+    monkeypatch.setattr(settings, "LLM_REQUESTS_PER_MINUTE", 6000)
+    monkeypatch.setattr(settings, "LLM_TOKENS_PER_MINUTE", 600000)
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT_MAX_BACKOFF_SECONDS", 60.0)
+    return LLMLimiter()
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = _TokenBucket(per_minute=60)  # one unit per second
+    now = bucket.updated
+    assert bucket.wait_for(60, now) == 0.0
+    bucket.take(60)
+    assert bucket.wait_for(2, now) == pytest.approx(2.0)
+    assert bucket.wait_for(2, now + 2) == 0.0
+    # Requests bigger than a minute's budget only wait for a full bucket
+    assert bucket.wait_for(1000, now + 2) == pytest.approx(58.0)
+
+
+def test_rate_limit_halves_concurrency_and_pauses(limiter):
+    limiter.acquire("p", "m", 10)
+    limiter.release("p", "m", rate_limit_error=RateLimited())
+
+    model = limiter.snapshot()["p:m"]
+    assert model["concurrency"] == 2
+    assert model["rate_limited"] == 1
+    assert 0 < limiter.backoff_remaining("p", "m") <= 1.0  # First backoff without Retry-After: 1s
+
+
+def test_successes_grow_concurrency_back_one_slot_at_a_time(limiter):
+    limiter.acquire("p", "m", 10)
+    limiter.release("p", "m", rate_limit_error=RateLimited())
+    limiter._limits["p:m"].blocked_until = 0.0
+
+    for _ in range(2):
+        limiter.acquire("p", "m", 10)
+        limiter.release("p", "m")
+    assert limiter.snapshot()["p:m"]["concurrency"] == 3
+
+    for _ in range(3):
+        limiter.acquire("p", "m", 10)
+        limiter.release("p", "m")
+    assert limiter.snapshot()["p:m"]["concurrency"] == 4  # Capped at the configured maximum
+
+
+def test_call_retries_after_rate_limit(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT_MAX_RETRIES", 2)
+    attempts = []
+
+    def fn():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RateLimited()
+        return "ok"
+
+    limiter.acquire("p", "m", 1)  # Warm the limits so the backoff can be shortened below
+    limiter.release("p", "m")
+    monkeypatch.setattr(limiter_module, "retry_after_seconds", lambda error: 0.05)
+
+    assert limiter.call("p", "m", 1, fn) == "ok"
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.05
+
+
+def test_waiters_are_served_in_arrival_order(limiter):
+    limiter._limits_for("p", "quality")[0].concurrency = 1  # One provider slot
+    limiter.acquire("p", "quality", 1)
+
+    order = []
+
+    def call(model):
+        limiter.acquire("p", model, 1)
+        order.append(model)
+
+    drafting = threading.Thread(target=call, args=("quality",), daemon=True)
+    drafting.start()
+    time.sleep(0.05)
+    chats = [threading.Thread(target=call, args=("fast",), daemon=True) for _ in range(3)]
+    for chat in chats:
+        chat.start()
+    time.sleep(0.05)
+    assert order == []
+
+    # Each release hands the single provider slot to the next caller in line
+    limiter.release("p", "quality")
+    drafting.join(2)
+    assert order == ["quality"]
+    for _ in chats:
+        limiter.release("p", order[-1])
+        time.sleep(0.05)
+    for chat in chats:
+        chat.join(2)
+    assert order == ["quality", "fast", "fast", "fast"]
+    assert limiter.snapshot()["p"]["queued"] == 0
+
+
+def test_async_waiter_is_woken_by_a_release_from_another_thread(limiter):
+    limiter._limits_for("p", "m")[1].concurrency = 1
+    limiter.acquire("p", "m", 1)
+
+    async def wait_for_slot():
+        threading.Timer(0.05, limiter.release, args=("p", "m")).start()
+        started = time.monotonic()
+        await limiter.acquire_async("p", "m", 1)
+        return time.monotonic() - started
+
+    # Woken by the release, well before the re-check interval
+    assert asyncio.run(wait_for_slot()) < 0.5
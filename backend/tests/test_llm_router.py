@@ -0,0 +1,133 @@
+"""Routing, failover, hedging and cooldown in the LLM router, driven by the offline fake provider"""
+import asyncio
+import pytest
+from app.core.config import settings
+from app.services.llm_limiter import llm_limiter
+from app.services.llm_providers import FakeProvider
+from app.services.llm_router import LLMRouter, ProviderStats
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class ScriptedFake(FakeProvider):
+    """Fake provider with its own latency and failure switch"""
+
+    def __init__(self, latency: float = 0.0, fail: bool = False):
+        super().__init__()
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+
+    def _respond(self, messages, model, json_mode) -> str:
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("scripted failure")
+        return super()._respond(messages, model, json_mode)
+
+    def complete(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096, json_mode=False) -> str:
+        return self._respond(messages, model, json_mode)
+
+    async def complete_async(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096, json_mode=False) -> str:
+        await asyncio.sleep(self.latency)
+        return self._respond(messages, model, json_mode)
+
+
+@pytest.fixture(autouse=True)
+def router_settings(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_FAKE_ERROR_RATE", 0.0)
+    monkeypatch.setattr(settings, "LLM_FAKE_LATENCY_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "LLM_ROUTER_MIN_SAMPLES", 2)
+    monkeypatch.setattr(settings, "LLM_ROUTER_MAX_CONSECUTIVE_ERRORS", 3)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY_SECONDS", 0.05)
+
+
+def make_router(**providers: ScriptedFake) -> LLMRouter:
+    """Router over named fake providers, in the given (configured) order"""
+    router = LLMRouter(["fake"])
+    router.providers = dict(providers)
+    router.stats = {name: ProviderStats(settings.LLM_ROUTER_WINDOW) for name in providers}
+    router.primary = next(iter(providers))
+    return router
+
+
+def test_fails_over_to_next_provider():
+    router = make_router(a=ScriptedFake(fail=True), b=ScriptedFake())
+
+    result = router.complete_routed(MESSAGES, tier="fast")
+
+    assert (result.provider, result.model) == ("b", "fake-fast")
+    assert router.stats["a"].errors == 1
+    assert router.stats["b"].samples("fast") == 1
+
+
+def test_raises_last_error_when_every_provider_fails():
+    router = make_router(a=ScriptedFake(fail=True), b=ScriptedFake(fail=True))
+    with pytest.raises(RuntimeError, match="scripted failure"):
+        router.complete_routed(MESSAGES)
+
+
+def test_ranks_unmeasured_first_then_by_median_latency():
+    router = make_router(a=ScriptedFake(), b=ScriptedFake(), c=ScriptedFake())
+    for latency in (0.5, 0.6):
+        router.stats["a"].record_success("quality", latency)
+    for latency in (0.1, 0.2):
+        router.stats["b"].record_success("quality", latency)
+
+    assert router.ranked("quality") == ["c", "b", "a"]
+
+
+def test_repeated_errors_move_provider_to_the_end():
+    router = make_router(a=ScriptedFake(fail=True), b=ScriptedFake())
+    for _ in range(settings.LLM_ROUTER_MAX_CONSECUTIVE_ERRORS):
+        router.stats["a"].record_error()
+
+    assert not router.stats["a"].healthy()
+    assert router.ranked("quality") == ["b", "a"]
+    assert router.complete_routed(MESSAGES).provider == "b"
+    assert router.providers["a"].calls == 0
+
+
+def test_async_fails_over():
+    router = make_router(a=ScriptedFake(fail=True), b=ScriptedFake())
+    result = asyncio.run(router.complete_routed_async(MESSAGES))
+    assert result.provider == "b"
+
+
+def test_hedge_wins_and_cancelled_request_frees_its_slot():
+    slow, fast = ScriptedFake(latency=1.0), ScriptedFake()
+    router = make_router(slow=slow, fast=fast)
+
+    async def hedged():
+        result = await router.complete_routed_async(MESSAGES, hedge=True)
+        # The losing request was cancelled and awaited before returning
+        return result, llm_limiter.snapshot()["slow"]["in_flight"]
+
+    result, slow_in_flight = asyncio.run(hedged())
+
+    assert result.provider == "fast"
+    assert (router.hedges, router.hedge_wins) == (1, 1)
+    assert slow_in_flight == 0
+    assert router.stats["slow"].errors == 0  # Cancellation is not an error
+
+
+def test_no_hedge_when_first_provider_answers_in_time():
+    router = make_router(a=ScriptedFake(), b=ScriptedFake())
+    result = asyncio.run(router.complete_routed_async(MESSAGES, hedge=True))
+    assert result.provider == "a"
+    assert router.hedges == 0
+    assert router.providers["b"].calls == 0
+
+
+def test_stream_fails_over_before_first_token():
+    class BrokenStream(ScriptedFake):
+        async def stream_async(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096):
+            raise RuntimeError("stream failed")
+            yield  # pragma: no cover
+
+    router = make_router(a=BrokenStream(), b=ScriptedFake())
+
+    async def collect():
+        return "".join([delta async for delta in router.stream_async(MESSAGES, tier="fast")])
+
+    assert asyncio.run(collect()).strip() == "[fake-fast] hello"
+    assert router.stats["a"].errors == 1
@@ -0,0 +1,71 @@
+"""Section offsets, claim numbering and claim dependencies in the patent parser"""
+from app.utils.patent_parser import _parse_references, claim_tree, parse_claims, parse_patent, section_text
+
+PATENT = """ABSTRACT
+A heat sink with folded copper fins.
+
+BACKGROUND OF THE INVENTION
+Heat sinks are bulky.
+
+DETAILED DESCRIPTION
+The fins are folded from one sheet. The steps are:
+1. cut the sheet
+2. fold the sheet
+
+CLAIMS
+1. A heat sink comprising folded fins.
+2. The heat sink of claim 1, wherein the fins are copper.
+3. The heat sink of claim 2, wherein the fins comprise:
+1. a first fold; and
+2. a second fold.
+4. A method of making the heat sink of any one of claims 1 to 3.
+5. The method of claim 4, further comprising brazing.
+"""
+
+
+def test_references_expand_ranges_and_lists():
+    assert _parse_references("The method of claim 3") == [3]
+    assert _parse_references("as in claims 1 or 2") == [1, 2]
+    assert _parse_references("any one of claims 1 to 4") == [1, 2, 3, 4]
+    assert _parse_references("claims 1-3, 5 and 7") == [1, 2, 3, 5, 7]
+    assert _parse_references("A device with 3 arms") == []
+
+
+def test_claims_must_be_numbered_in_sequence():
+    start = PATENT.index("1. A heat sink")
+    claims = parse_claims(PATENT, start, len(PATENT))
+
+    # The numbered list inside claim 3 is not mistaken for claims 1 and 2
+    assert [claim["number"] for claim in claims] == [1, 2, 3, 4, 5]
+    assert PATENT[claims[2]["start"]:claims[2]["end"]].rstrip().endswith("2. a second fold.")
+    assert [claim["depends_on"] for claim in claims] == [[], [1], [2], [1, 2, 3], [4]]
+
+
+def test_claim_dependency_ignores_later_claims():
+    text = "1. A device.\n2. The device of claim 3.\n"
+    assert [claim["depends_on"] for claim in parse_claims(text, 0, len(text))] == [[], []]
+
+
+def test_parse_patent_indexes_sections_and_counts_claims():
+    index = parse_patent(PATENT)
+
+    assert list(index["sections"]) == ["abstract", "background", "detailed_description", "claims"]
+    assert section_text(PATENT, index, "abstract") == "A heat sink with folded copper fins."
+    assert section_text(PATENT, index, "summary") is None
+    # Numbered steps in the description do not start the claims
+    assert index["claims"][0]["start"] > PATENT.index("CLAIMS")
+    assert index["claim_counts"] == {"total": 5, "independent": 1, "dependent": 4}
+    assert index["text_length"] == len(PATENT)
+
+
+def test_inline_claims_intro_without_heading():
+    text = "Field\nHeat sinks.\n\nWhat is claimed is: 1. A heat sink.\n2. The heat sink of claim 1.\n"
+    index = parse_patent(text)
+    assert [claim["number"] for claim in index["claims"]] == [1, 2]
+    assert index["claim_counts"]["independent"] == 1
+
+
+def test_claim_tree_lists_dependents_under_their_independent_claim():
+    assert claim_tree(parse_patent(PATENT)) == "Claim 1 (independent): 2, 3, 4, 5"
+    text = "CLAIMS\n1. A device.\n2. A method.\n3. The method of claim 2.\n"
+    assert claim_tree(parse_patent(text)) == "Claim 1 (independent): no dependents\nClaim 2 (independent): 3"
@@ -0,0 +1,158 @@
+"""Page-range planning, backend fallback and timeouts in PDF extraction
+
+The real backends (PyMuPDF, pdfplumber) are not needed: the tests register
+backends that read a page count from the "PDF" and run ranges in a thread
+pool, which exercises the same planning and merging code.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.core.config import settings
+from app.services import pdf_extraction
+from app.services.pdf_extraction import (
+    PDFBackend,
+    PDFExtractionEngine,
+    PDFExtractionError,
+    PDFExtractionTimeout,
+    iter_pdf_pages,
+)
+
+
+def _read(source) -> bytes:
+    if isinstance(source, bytes):
+        return source
+    with open(source, "rb") as f:
+        return f.read()
+
+
+class CountingBackend(PDFBackend):
+    """A "PDF" is its page count as ASCII; page n reads "page n" """
+    name = "counting"
+    ranges = []
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    @classmethod
+    def page_count(cls, source) -> int:
+        return int(_read(source))
+
+    @classmethod
+    def extract_pages(cls, source, start, end):
+        cls.ranges.append((start, end))
+        return [f"page {number + 1}\n" for number in range(start, min(end, cls.page_count(source)))]
+
+    @classmethod
+    def iter_pages(cls, source):
+        for number in range(cls.page_count(source)):
+            yield f"page {number + 1}\n"
+
+
+class BrokenBackend(CountingBackend):
+    """Opens every document but cannot read pages past 20"""
+    name = "broken"
+
+    @classmethod
+    def extract_pages(cls, source, start, end):
+        if end > 20:
+            raise ValueError("bad xref")
+        return super().extract_pages(source, start, end)
+
+    @classmethod
+    def iter_pages(cls, source):
+        raise ValueError("bad xref")
+        yield  # pragma: no cover
+
+
+class SlowBackend(CountingBackend):
+    name = "slow"
+
+    @classmethod
+    def extract_pages(cls, source, start, end):
+        time.sleep(0.5)
+        return super().extract_pages(source, start, end)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    for backend in (CountingBackend, BrokenBackend, SlowBackend):
+        monkeypatch.setitem(pdf_extraction.PDF_BACKENDS, backend.name, backend)
+    monkeypatch.setattr(settings, "PDF_EXTRACTION_PAGES_PER_TASK", 16)
+    monkeypatch.setattr(settings, "PDF_EXTRACTION_BACKENDS", "counting")
+    CountingBackend.ranges = []
+
+    engine = PDFExtractionEngine()
+    pool = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(engine, "_get_pool", lambda: pool)
+    yield engine
+    pool.shutdown(wait=True)
+
+
+def test_pages_are_split_into_ranges_and_merged_in_order(engine, tmp_path):
+    path = tmp_path / "patent.pdf"
+    path.write_bytes(b"40")
+
+    pages, backend = engine.extract_pages(str(path))
+
+    assert sorted(CountingBackend.ranges) == [(0, 16), (16, 32), (32, 40)]
+    assert pages == [f"page {number}\n" for number in range(1, 41)]
+    assert backend == "counting"
+
+
+def test_max_pages_limits_the_ranges(engine):
+    pages, _ = engine.extract_pages(b"40", max_pages=5)
+    assert CountingBackend.ranges == [(0, 5)]
+    assert len(pages) == 5
+
+
+def test_bytes_are_shared_and_released(engine, monkeypatch):
+    created = []
+    real = pdf_extraction.shared_memory.SharedMemory
+
+    def tracking(*args, **kwargs):
+        block = real(*args, **kwargs)
+        if kwargs.get("create"):
+            created.append(block.name)
+        return block
+
+    monkeypatch.setattr(pdf_extraction.shared_memory, "SharedMemory", tracking)
+    pages, _ = engine.extract_pages(b"3")
+
+    assert pages == ["page 1\n", "page 2\n", "page 3\n"]
+    assert len(created) == 1
+    with pytest.raises(FileNotFoundError):
+        real(name=created[0])  # Unlinked after extraction
+
+
+def test_failing_range_falls_back_to_next_backend(engine, monkeypatch):
+    monkeypatch.setattr(settings, "PDF_EXTRACTION_BACKENDS", "broken,counting")
+    pages, backend = engine.extract_pages(b"40")
+    assert len(pages) == 40
+    assert backend == "broken+counting"
+
+
+def test_unreadable_range_raises(engine, monkeypatch):
+    monkeypatch.setattr(settings, "PDF_EXTRACTION_BACKENDS", "broken")
+    with pytest.raises(PDFExtractionError, match="Pages 17-32"):
+        engine.extract_pages(b"40")
+
+
+def test_slow_document_times_out(engine, monkeypatch):
+    monkeypatch.setattr(settings, "PDF_EXTRACTION_BACKENDS", "slow")
+    monkeypatch.setattr(settings, "PDF_EXTRACTION_TIMEOUT_SECONDS", 0.1)
+    with pytest.raises(PDFExtractionTimeout):
+        engine.extract_pages(b"40")
+
+
+def test_no_backend_installed(engine, monkeypatch):
+    monkeypatch.setattr(settings, "PDF_EXTRACTION_BACKENDS", "missing")
+    with pytest.raises(PDFExtractionError, match="No PDF backend"):
+        engine.extract_pages(b"1")
+
+
+def test_lazy_pages_fall_back_before_first_page(engine, monkeypatch):
+    monkeypatch.setattr(settings, "PDF_EXTRACTION_BACKENDS", "broken,counting")
+    pages = iter_pdf_pages(b"1000")
+    assert [next(pages), next(pages)] == ["page 1\n", "page 2\n"]
+    pages.close()
@@ -0,0 +1,76 @@
+"""Incremental sync and BM25 search in the per-disclosure retrieval index"""
+from app.services.retrieval import DisclosureIndex, RetrievalIndex, tokenize
+
+
+def _source(fingerprint, text, label="Draft", calls=None):
+    def load():
+        if calls is not None:
+            calls.append(fingerprint)
+        return text
+    return (fingerprint, load, label)
+
+
+def test_tokenize_drops_stopwords_and_splits_cjk():
+    assert tokenize("What is the Heat-Sink made of?") == ["heat-sink", "made"]
+    assert tokenize("散熱片") == ["散", "熱", "片", "散熱", "熱片"]
+
+
+def test_sync_only_reloads_changed_sources():
+    index = DisclosureIndex()
+    calls = []
+    sources = {
+        "draft": _source("v1", "A heat sink with copper fins.", calls=calls),
+        "file:1": _source("f1", "Battery cooling test report.", "report.pdf", calls),
+    }
+    assert index.sync(sources) == 2
+    assert index.sync(sources) == 0
+    assert calls == ["v1", "f1"]
+
+    sources["draft"] = _source("v2", "A heat sink with aluminium fins.", calls=calls)
+    assert index.sync(sources) == 1
+    assert calls == ["v1", "f1", "v2"]
+    assert index.chunk_count == 2
+    assert index.doc_freqs["copper"] == 0 and index.doc_freqs["aluminium"] == 1
+
+
+def test_sync_removes_dropped_sources_from_statistics():
+    index = DisclosureIndex()
+    index.sync({
+        "draft": _source("v1", "copper fins"),
+        "file:1": _source("f1", "copper battery"),
+    })
+    assert index.doc_freqs["copper"] == 2
+
+    index.sync({"draft": _source("v1", "copper fins")})
+    assert set(index.chunks) == {"draft"}
+    assert index.doc_freqs["copper"] == 1
+    assert "battery" not in index.doc_freqs
+    assert index.total_length == 2
+
+
+def test_search_ranks_by_bm25_and_drops_weak_matches():
+    index = DisclosureIndex()
+    index.sync({
+        "a": _source("1", "thermal paste between the die and the heat sink heat sink", "A"),
+        "b": _source("1", "the battery pack has a heat shield and a long list of unrelated parts "
+                          "such as screws, brackets, cables, connectors and labels", "B"),
+        "c": _source("1", "user interface colour scheme", "C"),
+    })
+    results = index.search("heat sink", k=5)
+
+    # b only matches "heat" in a long chunk: below MIN_RELATIVE_SCORE of the best
+    assert [chunk.label for _, chunk in results] == ["A"]
+    assert [chunk.label for _, chunk in index.search("heat shield sink", k=5)] == ["A", "B"]
+    assert index.search("nothing matches", k=5) == []
+    assert index.search("the of", k=5) == []
+
+
+def test_retrieval_index_evicts_least_recently_used(monkeypatch):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "RETRIEVAL_MAX_INDEXES", 2)
+    indexes = RetrievalIndex()
+    sources = {"draft": _source("v1", "copper fins")}
+
+    for disclosure_id in (1, 2, 1, 3):
+        assert [chunk.text for chunk in indexes.search(disclosure_id, sources, "copper")] == ["copper fins"]
+    assert list(indexes._indexes) == [1, 3]
@@ -0,0 +1,105 @@
+"""Structure-aware chunking and the map-reduce patent analysis built on it"""
+import asyncio
+import pytest
+from app.core.config import settings
+from app.services.ai_service import AIService
+from app.services.llm_cache import llm_cache
+from app.services.llm_providers import FakeProvider
+from app.services.llm_router import LLMRouter
+from app.utils.text_chunking import chunk_text, split_sections
+
+PATENT = """Front matter
+
+BACKGROUND OF THE INVENTION
+Batteries degrade.
+
+Existing chargers ignore temperature.
+
+SUMMARY
+A charger that reads the cell temperature.
+
+CLAIMS
+1. A charger comprising a sensor.
+"""
+
+
+def test_split_sections_at_headings():
+    sections = split_sections(PATENT)
+    assert [heading for heading, _ in sections] == [None, "BACKGROUND OF THE INVENTION", "SUMMARY", "CLAIMS"]
+    assert sections[1][1] == "Batteries degrade.\n\nExisting chargers ignore temperature."
+
+
+def test_chunks_never_span_sections_and_respect_the_limit():
+    chunks = chunk_text(PATENT, max_chars=30)
+    assert all(len(chunk.text) <= 30 for chunk in chunks)
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+    assert {chunk.section for chunk in chunks} == {None, "BACKGROUND OF THE INVENTION", "SUMMARY", "CLAIMS"}
+    # Paragraphs are kept whole when they fit
+    assert "Batteries degrade." in [chunk.text for chunk in chunks]
+
+
+def test_paragraphs_are_packed_up_to_the_limit():
+    chunks = chunk_text("SUMMARY\nOne.\n\nTwo.\n\nThree.", max_chars=12)
+    assert [chunk.text for chunk in chunks] == ["One.\n\nTwo.", "Three."]
+
+
+def test_long_paragraph_is_cut_at_sentence_boundaries():
+    paragraph = "First sentence here. Second sentence here. " + "x" * 50
+    chunks = chunk_text(paragraph, max_chars=25)
+    texts = [chunk.text for chunk in chunks]
+    assert texts[:2] == ["First sentence here.", "Second sentence here."]
+    assert "".join(texts[2:]) == "x" * 50
+    assert all(len(text) <= 25 for text in texts)
+
+
+class CountingFake(FakeProvider):
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+
+    async def complete_async(self, messages, system=None, model=None, temperature=0.3, max_tokens=4096, json_mode=False) -> str:
+        self.prompts.append(messages[-1]["content"])
+        return self._respond(messages, model, json_mode)
+
+
+@pytest.fixture
+def analysis_service(monkeypatch):
+    monkeypatch.setattr(llm_cache, "enabled", False)
+    monkeypatch.setattr(settings, "LLM_FAKE_ERROR_RATE", 0.0)
+    service = AIService()
+    service.llm = LLMRouter(["fake"])
+    service.llm.providers = {"fake": CountingFake()}
+    return service
+
+
+def test_long_patent_is_analyzed_chunk_by_chunk(analysis_service, monkeypatch):
+    monkeypatch.setattr(settings, "PATENT_ANALYSIS_CHUNK_CHARS", 60)
+    chunks = chunk_text(PATENT, 60)
+    assert len(chunks) > 1
+
+    analysis = asyncio.run(analysis_service.analyze_patent_async(PATENT, "US1"))
+
+    prompts = analysis_service.llm.providers["fake"].prompts
+    map_prompts = [prompt for prompt in prompts if prompt.lstrip().startswith("You are reading part")]
+    assert len(map_prompts) == len(chunks)
+    for chunk in chunks:
+        assert any(chunk.text in prompt for prompt in map_prompts)
+    assert "PATENT NOTES" in prompts[-1]  # Final reduce step works from the notes
+    assert isinstance(analysis, dict)
+
+
+def test_short_patent_takes_a_single_call(analysis_service):
+    # Several sections, but the whole text fits one call
+    asyncio.run(analysis_service.analyze_patent_async(PATENT))
+    prompts = analysis_service.llm.providers["fake"].prompts
+    assert len(prompts) == 1
+    assert "PATENT TEXT" in prompts[0]
+
+
+def test_note_batches_always_shrink(analysis_service, monkeypatch):
+    monkeypatch.setattr(settings, "PATENT_ANALYSIS_CHUNK_CHARS", 40)
+    notes = [{"key_points": [f"fact {i}"]} for i in range(7)]
+    batches = analysis_service._batch_notes(notes)
+    assert len(batches) > 1
+    assert all(len(batch) >= 2 for batch in batches)
+    assert [note for batch in batches for note in batch] == notes
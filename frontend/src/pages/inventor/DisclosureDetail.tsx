@@ -77,6 +77,7 @@ export default function InventorDisclosureDetail() {
   const navigate = useNavigate()
 
   const [disclosure, setDisclosure] = useState<Disclosure | null>(null)
+  const [patentPreviewUrl, setPatentPreviewUrl] = useState<string | null>(null)
   const [isLoading, setIsLoading] = useState(true)
   const [error, setError] = useState('')
 
@@ -130,6 +131,18 @@ export default function InventorDisclosureDetail() {
     chatEndRef.current?.scrollIntoView({ behavior: 'smooth' })
   }, [messages])
 
+  useEffect(() => {
+    // Iframes can't send the auth header, so the PDF is loaded from a signed link
+    const fileId = disclosure?.patent_file_id
+    if (!fileId) {
+      setPatentPreviewUrl(null)
+      return
+    }
+    fileService.getPreviewUrl(fileId)
+      .then(setPatentPreviewUrl)
+      .catch((err) => console.error('Failed to get patent preview link:', err))
+  }, [disclosure?.patent_file_id])
+
   const loadDisclosure = async () => {
     if (!id) return
 
@@ -389,7 +402,7 @@ export default function InventorDisclosureDetail() {
                   <div className="flex-1 overflow-hidden bg-neutral-100 rounded-lg border border-neutral-200 mt-4">
                     {disclosure.patent_file_id ? (
                       <iframe
-                        src={`${import.meta.env.VITE_API_URL || 'http://localhost:8000/api/v1'}/files/${disclosure.patent_file_id}/preview`}
+                        src={patentPreviewUrl ?? undefined}
                         className="w-full h-full"
                         title="Patent PDF"
                       />
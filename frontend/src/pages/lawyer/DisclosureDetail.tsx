@@ -2,9 +2,10 @@ import { useState, useEffect, useRef } from 'react'
 import { useNavigate, useParams } from 'react-router-dom'
 import { useAuth } from '@/context/AuthContext'
 import { disclosureService } from '@/services/disclosureService'
-import { chatService, ChatMessage as APIChatMessage } from '@/services/chatService'
+import { chatService } from '@/services/chatService'
 import { commentService, messageService, Message } from '@/services/commentService'
 import { draftService, PatentDraft } from '@/services/draftService'
+import { fileService } from '@/services/fileService'
 import { Disclosure, DisclosureStatus, DisclosureType, Comment } from '@/types'
 import HighlightableText from '@/components/HighlightableText'
 import CommentThread from '@/components/CommentThread'
@@ -85,6 +86,7 @@ export default function LawyerDisclosureDetail() {
   const navigate = useNavigate()
 
   const [disclosure, setDisclosure] = useState<Disclosure | null>(null)
+  const [patentPreviewUrl, setPatentPreviewUrl] = useState<string | null>(null)
   const [isLoading, setIsLoading] = useState(true)
   const [error, setError] = useState('')
 
@@ -141,6 +143,7 @@ export default function LawyerDisclosureDetail() {
       loadDisclosure()
       loadInventorMessages()
       loadComments()
+      loadAiConversation()
 
       // Poll for new messages and comments every 5 seconds
       const pollingInterval = setInterval(() => {
@@ -180,6 +183,18 @@ export default function LawyerDisclosureDetail() {
     inventorChatEndRef.current?.scrollIntoView({ behavior: 'smooth' })
   }, [inventorMessages])
 
+  useEffect(() => {
+    // Iframes can't send the auth header, so the PDF is loaded from a signed link
+    const fileId = disclosure?.patent_file_id
+    if (!fileId) {
+      setPatentPreviewUrl(null)
+      return
+    }
+    fileService.getPreviewUrl(fileId)
+      .then(setPatentPreviewUrl)
+      .catch((err) => console.error('Failed to get patent preview link:', err))
+  }, [disclosure?.patent_file_id])
+
   const loadDisclosure = async () => {
     if (!id) return
 
@@ -222,6 +237,28 @@ export default function LawyerDisclosureDetail() {
     }
   }
 
+  const loadAiConversation = async () => {
+    if (!id) return
+
+    try {
+      // Restore the stored AI assistant conversation after the greeting
+      const history = await chatService.getConversation(parseInt(id))
+      if (history.messages.length > 0) {
+        setMessages(prev => [
+          prev[0],
+          ...history.messages.map((msg, index) => ({
+            id: index + 2,
+            role: msg.role,
+            content: msg.content,
+            timestamp: msg.created_at ? new Date(msg.created_at) : new Date(),
+          })),
+        ])
+      }
+    } catch (err: any) {
+      console.error('Failed to load AI conversation:', err)
+    }
+  }
+
   const loadComments = async () => {
     if (!id) return
 
@@ -328,30 +365,26 @@ export default function LawyerDisclosureDetail() {
     setIsAiTyping(true)
 
     try {
-      // Convert to API format (exclude id and timestamp)
-      const apiMessages: APIChatMessage[] = [...messages, userMessage].map(msg => ({
-        role: msg.role,
-        content: msg.content,
-      }))
-
-      // Call real AI API with disclosure context
+      // Only the new message is sent; the server keeps the conversation history
       const disclosureId = id ? parseInt(id) : undefined
-      const responseText = await chatService.sendMessage(apiMessages, disclosureId)
-
-      const aiMessage: ChatMessage = {
-        id: messages.length + 2,
-        role: 'assistant',
-        content: responseText,
-        timestamp: new Date(),
-      }
-
-      setMessages(prev => [...prev, aiMessage])
+      const aiMessageId = messages.length + 2
+      let started = false
+
+      await chatService.streamConversationMessage(userMessage.content, (delta) => {
+        if (!started) {
+          started = true
+          setIsAiTyping(false)
+          setMessages(prev => [...prev, { id: aiMessageId, role: 'assistant', content: delta, timestamp: new Date() }])
+        } else {
+          setMessages(prev => prev.map(msg => (msg.id === aiMessageId ? { ...msg, content: msg.content + delta } : msg)))
+        }
+      }, disclosureId)
     } catch (error: any) {
       console.error('Chat error:', error)
 
       // Show error message to user
       const errorMessage: ChatMessage = {
-        id: messages.length + 2,
+        id: messages.length + 3,
         role: 'assistant',
         content: 'Sorry, I encountered an error. Please try again later.',
         timestamp: new Date(),
@@ -522,7 +555,7 @@ export default function LawyerDisclosureDetail() {
                       <div className="flex-1 bg-neutral-100 rounded-lg overflow-hidden">
                         {disclosure.patent_file_id ? (
                           <iframe
-                            src={`${import.meta.env.VITE_API_URL || 'http://localhost:8000/api/v1'}/files/${disclosure.patent_file_id}/preview`}
+                            src={patentPreviewUrl ?? undefined}
                             className="w-full h-full"
                             title="Patent PDF"
                           />
@@ -15,6 +15,18 @@ export interface ChatResponse {
   response: string
 }
 
+export interface ConversationTurn {
+  role: 'user' | 'assistant'
+  content: string
+  created_at?: string
+}
+
+export interface ConversationHistory {
+  conversation_id: number | null
+  summary: string | null
+  messages: ConversationTurn[]
+}
+
 export const chatService = {
   /**
    * Send a message to the AI drafting assistant
@@ -31,4 +43,119 @@ export const chatService = {
     })
     return response.data.response
   },
+
+  /**
+   * Stream a response from the AI drafting assistant (Server-Sent Events)
+   * @param messages - Array of conversation history
+   * @param onDelta - Called with each text chunk as it arrives
+   * @param disclosureId - Optional disclosure ID to include draft and file context
+   * @param signal - Optional AbortSignal; aborting stops generation on the server
+   * @returns Full AI response text
+   */
+  async streamMessage(
+    messages: ChatMessage[],
+    onDelta: (delta: string) => void,
+    disclosureId?: number,
+    signal?: AbortSignal
+  ): Promise<string> {
+    return streamSSE('/chat/assistant/stream', { messages, disclosure_id: disclosureId }, onDelta, signal)
+  },
+
+  /**
+   * Load the stored assistant conversation for a disclosure
+   * @param disclosureId - Disclosure the conversation is about (omit for the general assistant)
+   */
+  async getConversation(disclosureId?: number): Promise<ConversationHistory> {
+    const response = await api.get<ConversationHistory>('/chat/conversation', {
+      params: { disclosure_id: disclosureId },
+    })
+    return response.data
+  },
+
+  /**
+   * Stream a reply in the stored conversation; only the new message is sent,
+   * earlier turns are kept on the server
+   * @param message - The new user message
+   * @param onDelta - Called with each text chunk as it arrives
+   * @param disclosureId - Optional disclosure ID to include draft and file context
+   * @param signal - Optional AbortSignal; aborting stops generation on the server
+   * @returns Full AI response text
+   */
+  async streamConversationMessage(
+    message: string,
+    onDelta: (delta: string) => void,
+    disclosureId?: number,
+    signal?: AbortSignal
+  ): Promise<string> {
+    return streamSSE('/chat/conversation/message/stream', { message, disclosure_id: disclosureId }, onDelta, signal)
+  },
+
+  /**
+   * Delete the stored conversation and start over
+   * @param disclosureId - Disclosure the conversation is about (omit for the general assistant)
+   */
+  async clearConversation(disclosureId?: number): Promise<void> {
+    await api.delete('/chat/conversation', { params: { disclosure_id: disclosureId } })
+  },
+}
+
+/**
+ * POST a JSON body and read a Server-Sent Events stream of `{delta}` messages
+ * @returns Concatenated deltas
+ */
+async function streamSSE(
+  path: string,
+  body: unknown,
+  onDelta: (delta: string) => void,
+  signal?: AbortSignal
+): Promise<string> {
+  const token = localStorage.getItem('access_token')
+  const response = await fetch(`${api.defaults.baseURL}${path}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    },
+    body: JSON.stringify(body),
+    signal,
+  })
+  if (!response.ok || !response.body) {
+    throw new Error(`Chat failed with status ${response.status}`)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let fullText = ''
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    // SSE messages are separated by a blank line
+    let boundary = buffer.indexOf('\n\n')
+    while (boundary >= 0) {
+      const rawEvent = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+      boundary = buffer.indexOf('\n\n')
+
+      let eventName = 'message'
+      let data = ''
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event: ')) eventName = line.slice(7)
+        else if (line.startsWith('data: ')) data += line.slice(6)
+      }
+      if (!data) continue
+
+      const payload = JSON.parse(data)
+      if (eventName === 'error') throw new Error(payload.detail)
+      if (payload.delta) {
+        fullText += payload.delta
+        onDelta(payload.delta)
+      }
+    }
+  }
+
+  return fullText
 }
@@ -6,6 +6,13 @@ export interface FileUploadResponse extends FileMetadata {
   s3_bucket?: string
 }
 
+interface DirectUploadResponse {
+  upload_url: string
+  fields: Record<string, string>
+  upload_token: string
+  expires_in: number
+}
+
 export const fileService = {
   /**
    * Get all files for a disclosure
@@ -17,8 +24,45 @@ export const fileService = {
 
   /**
    * Upload a file to a disclosure
+   *
+   * Sends the file straight to object storage when the backend supports it,
+   * otherwise through the API.
    */
   async uploadFile(disclosureId: number, file: File): Promise<FileUploadResponse> {
+    let direct: DirectUploadResponse
+    try {
+      const response = await api.post<DirectUploadResponse>(`/files/upload-url/${disclosureId}`, {
+        filename: file.name,
+        file_size: file.size,
+        content_type: file.type || 'application/octet-stream',
+      })
+      direct = response.data
+    } catch (error: any) {
+      if (error.response?.status === 501) {
+        return this.uploadFileViaApi(disclosureId, file)
+      }
+      throw error
+    }
+
+    // Fields must come before the file in a presigned POST
+    const formData = new FormData()
+    Object.entries(direct.fields).forEach(([name, value]) => formData.append(name, value))
+    formData.append('file', file)
+    const upload = await fetch(direct.upload_url, { method: 'POST', body: formData })
+    if (!upload.ok) {
+      throw new Error(`Upload to storage failed (${upload.status})`)
+    }
+
+    const response = await api.post<FileUploadResponse>('/files/upload-complete', {
+      upload_token: direct.upload_token,
+    })
+    return response.data
+  },
+
+  /**
+   * Upload a file to a disclosure through the API
+   */
+  async uploadFileViaApi(disclosureId: number, file: File): Promise<FileUploadResponse> {
     const formData = new FormData()
     formData.append('file', file)
 
@@ -51,6 +95,26 @@ export const fileService = {
     await api.delete(`/files/${fileId}`)
   },
 
+  /**
+   * Get a signed, short-lived URL for showing a file in an iframe
+   *
+   * A file uploaded straight to storage gets a link only once it has been
+   * processed (409 until then), so that case is retried a few times.
+   */
+  async getPreviewUrl(fileId: number, attempts = 5): Promise<string> {
+    try {
+      const response = await api.get<{ path: string; expires_in: number }>(`/files/${fileId}/preview-url`)
+      return `${api.defaults.baseURL}${response.data.path}`
+    } catch (error: any) {
+      if (error.response?.status === 409 && attempts > 1) {
+        const retryAfter = Number(error.response.headers?.['retry-after']) || 2
+        await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000))
+        return this.getPreviewUrl(fileId, attempts - 1)
+      }
+      throw error
+    }
+  },
+
   /**
    * Get download URL for a file
    */